@@ -37,7 +37,7 @@ def calculate_bruchs(segmentation, dictParameters):
     """
     #get RPE and set up initial BM (RPE+1)
     result_init_coord_rpe_floor = np.where(segmentation == int(dictParameters['RPE_VALUE']))
-    result = np.zeros((segmentation.shape))
+    result = np.zeros((segmentation.shape), dtype = 'uint8')
     result[result_init_coord_rpe_floor[0],result_init_coord_rpe_floor[1],result_init_coord_rpe_floor[2]] = int(dictParameters['RPE_VALUE'])
     result[result_init_coord_rpe_floor[0],result_init_coord_rpe_floor[1] + 1,result_init_coord_rpe_floor[2]] = int(dictParameters['BM_VALUE'])
     
@@ -78,7 +78,7 @@ def bruchs_algorithm(segmentation, dictParameters):
             the resulting segmentation
             
     """    
-    result = np.zeros((segmentation.shape)).astype('uint8')
+    result = np.zeros((segmentation.shape), dtype = 'uint8')
     bruchs_x = np.arange(segmentation.shape[2]).astype(np.int32).flatten()
     
     #mean filter kernel = 10% of B-scan width
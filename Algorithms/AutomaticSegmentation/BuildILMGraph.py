@@ -15,19 +15,20 @@ PRLEC Framework for OCT Processing and Visualization
 from igraph import *
 import numpy as np
 import cv2
+from Algorithms.GraphCut import TopologyCache
+from Algorithms.GraphCut.WeightTable import expWeights
+from Algorithms.GraphCut.EdgeStencil import getEdgesReference, getStencilWeights, NEIGHBORHOOD_3
 
 w_min = 1e-5
 
-graph_list = {}
-endnodes = {}
-
-def getILMGraph(_slice, scaling, shortest_path , y_offset, isMatFile):
+def getILMBand(_slice, scaling, shortest_path , y_offset, isMatFile, corridor = None):
     """ 
-        Construct the undirected, weighted ILM graph from the weights.
+        Extract the weight band of the ILM graph.
         
-        For the initial slice (center), an extensive calculation is conducted.
-        Afterwards, the shortest path of the predecessor is dilated to
-        speed up the process. Invalid edges are set to np.nan
+        For the initial slice (center), a fixed region above the flattened RPE 
+        is extracted. Afterwards, the shortest path of the predecessor is dilated 
+        to speed up the process. Invalid pixels are set to np.nan. A column is 
+        added at the left (-2) and right (+2) border for start and end points.
         
         Parameters
         ----------
@@ -42,33 +43,35 @@ def getILMGraph(_slice, scaling, shortest_path , y_offset, isMatFile):
         isMatFile: boolean
             true if mat file, false if tiff file
             
+        Optional
+        ----------
+        corridor: scalar, int
+            dilation kernel size of the predecessor's shortest path 
+            (default: 10*scaling, 15*scaling for mat files)
+            
         Returns
         ---------
-        g: graph
-            the resulting segmentation
-        endpoint: scalar, int
-            the endpoint of the graph
+        band: ndarray
+            the weight band including border columns
         y_offset:
             the top row extracted from the predecessor
             
     """
-    
-    start__slice = 0
     #initial slice
     if shortest_path is None:
         _slice_center_y = _slice.shape[0]//2
         #restrict area of search
         
         #mat file vs tiff file
-        start__slice = int((_slice_center_y-300)*scaling)
-        end__slice = int((_slice_center_y-60)*scaling)
+        start__slice = max(_slice_center_y-int(300*scaling), 0)
+        end__slice = _slice_center_y-int(60*scaling)
         if isMatFile == True:
-            start__slice = int((_slice_center_y-200)*scaling)
-            end__slice = int((_slice_center_y-20)*scaling)
+            start__slice = max(_slice_center_y-int(200*scaling), 0)
+            end__slice = _slice_center_y-int(20*scaling)
         _slice_buffer = _slice[start__slice:end__slice,:]
         #add border to left and right
         _slice_buffer = cv2.copyMakeBorder(cv2.copyMakeBorder(_slice_buffer, top=0,bottom=0, left=0, right=1, borderType= cv2.BORDER_CONSTANT, value =  2.0), top=0,bottom=0, left=1, right=0, borderType= cv2.BORDER_CONSTANT, value = -2.0)
-        _slice_1D = _slice_buffer.flatten()
+        return _slice_buffer, start__slice
     #slice has predecessor
     else:
         _slice_buffer = _slice.copy()
@@ -84,7 +87,7 @@ def getILMGraph(_slice, scaling, shortest_path , y_offset, isMatFile):
         min_y = np.amin(path_y[int(start_x):int(end_x)])
         max_y = np.amax(path_y[int(start_x):int(end_x)])
     
-        buffer_result = np.zeros((_slice_buffer.shape)).astype(np.float32)
+        buffer_result = np.zeros((_slice_buffer.shape), dtype = np.float32)
         buffer_result[path_y, path_x] = 1.0
         #dilate predecessors shortest path
         #mat file vs tiff file
@@ -93,79 +96,124 @@ def getILMGraph(_slice, scaling, shortest_path , y_offset, isMatFile):
         if isMatFile == True:
             kernel = np.maximum(int(15*scaling),2)
             y_offset = np.maximum(int(15*scaling),2)
+        if corridor is not None:
+            kernel = corridor
+            y_offset = corridor
 
         buffer_result[:,1:-1] = cv2.dilate(buffer_result[:,1:-1], np.ones((kernel,kernel),np.uint8),iterations = 1)
         
         #set invalid pixels to nan
         buffer_result = np.where(buffer_result == 1.0, _slice_buffer, np.nan)
-        buffer_result = np.where(_slice_buffer[min_y-y_offset:max_y+y_offset] == 0, 0, buffer_result[min_y-y_offset:max_y+y_offset])
+        top = max(min_y-y_offset, 0)
+        buffer_result = np.where(_slice_buffer[top:max_y+y_offset] == 0, 0, buffer_result[top:max_y+y_offset])
         # set borders to -2/+2
         buffer_result[:,0] = -2
         buffer_result[:,-1] = 2
-        _slice_1D = buffer_result.flatten()
+        return buffer_result, top
 
+def getILMGraph(_slice, scaling, shortest_path , y_offset, isMatFile, corridor = None, bits = 0, reference = False):
+    """ 
+        Construct the undirected, weighted ILM graph from the weights.
+        
+        For the initial slice (center), an extensive calculation is conducted.
+        Afterwards, the shortest path of the predecessor is dilated to
+        speed up the process. Invalid edges are set to np.nan
+        
+        Parameters
+        ----------
+        _slice: ndarray
+            weight slice
+        scaling: scalar
+            scaling factor for calculation
+        shortest_path: ndarray
+            the shortest path from the predecessor
+        y_offset: scalar
+            the top row extracted from the predecessor
+        isMatFile: boolean
+            true if mat file, false if tiff file
+            
+        Optional
+        ----------
+        corridor: scalar, int
+            dilation kernel size of the predecessor's shortest path 
+            (default: 10*scaling, 15*scaling for mat files)
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+        reference: boolean
+            true to construct the edges pixel by pixel (reference builder)
+            
+        Returns
+        ---------
+        g: graph
+            the resulting segmentation
+        endpoint: scalar, int
+            the endpoint of the graph
+        y_offset:
+            the top row extracted from the predecessor
+            
+    """
+    band, y_offset = getILMBand(_slice, scaling, shortest_path, y_offset, isMatFile, corridor)
+    
+    if not reference:
+        #reuse the topology of previous bands with the same shape
+        g = TopologyCache.getGraph(getStencilWeights(band, NEIGHBORHOOD_3, lambda v_i, v_j: calculateWeights(v_i, v_j, bits)), NEIGHBORHOOD_3)
+        return g, band.size-1, y_offset
+    
+    _slice_1D = band.flatten()
+    
     # graph construction
     g = Graph(directed=True)
 
     g.add_vertices(_slice_1D.size)
     
-    sx = _slice_buffer.shape[1]
-    edge_list = []
-    weight_list = []
-    
-    for idx in range(_slice_1D.size):
-        if np.isnan(_slice_1D[idx]):
-            continue
-    
-        v_i = idx
+    sx = band.shape[1]
+    edge_list, weight_list = getEdgesReference(_slice_1D, sx, NEIGHBORHOOD_3, calculateWeight)
+
+    g.add_edges(edge_list)
+    g.es['weight'] = weight_list
+
+    return g, _slice_1D.size-1, y_offset
+
+def getILMWeights(_slice, scaling, shortest_path , y_offset, isMatFile, corridor = None, bits = 0):
+    """ 
+        Calculate the stencil weights of the ILM graph without constructing it.
+        
+        Input for the column-sweep solver (compare getILMGraph).
         
-        #pixel is not at the right boundary of the image -> has right neighbors
-        if((v_i+1) % sx != 0 ):
-            v_j = v_i +1
-            if (v_j  >= 0 and v_j  < _slice_1D.shape[0] and np.isnan(_slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeight(_slice_1D[v_i],_slice_1D[v_j]))
-                
-            v_j = v_i - sx +1
-            if (v_j  >= 0 and v_j  < _slice_1D.shape[0] and np.isnan(_slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeight(_slice_1D[v_i],_slice_1D[v_j]))
-            v_j = v_i + sx +1
-            if (v_j  >= 0 and v_j  < _slice_1D.shape[0] and np.isnan(_slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeight(_slice_1D[v_i],_slice_1D[v_j]))
+        Parameters
+        ----------
+        _slice: ndarray
+            weight slice
+        scaling: scalar
+            scaling factor for calculation
+        shortest_path: ndarray
+            the shortest path from the predecessor
+        y_offset: scalar
+            the top row extracted from the predecessor
+        isMatFile: boolean
+            true if mat file, false if tiff file
             
-        #pixel is located at the left/right boundary -> zero weights
-        if(_slice_1D[v_i] > 1.0 or _slice_1D[v_i] < -1.0):
-            _slice_1D[v_i] = 0.0
-            v_j = v_i - sx
-            if (v_j >= 0 and v_j < _slice_1D.shape[0] and np.isnan(_slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(w_min)
-            v_j = v_i + sx
-            if (v_j >= 0 and v_j < _slice_1D.shape[0] and np.isnan(_slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(w_min)
+        Optional
+        ----------
+        corridor: scalar, int
+            dilation kernel size of the predecessor's shortest path 
+            (default: 10*scaling, 15*scaling for mat files)
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
             
-        else:
-            #not a boundary pixel
-            v_j = v_i - sx
-            if (v_j  >= 0 and v_j  < _slice_1D.shape[0] and np.isnan(_slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeight(_slice_1D[v_i],_slice_1D[v_j]))
-                
-            v_j = v_i + sx
-            if (v_j  >= 0 and v_j  < _slice_1D.shape[0] and np.isnan(_slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeight(_slice_1D[v_i],_slice_1D[v_j]))
-                
-    g.add_edges(edge_list)
-    g.es['weight'] = weight_list
-    
-    if shortest_path is None:
-        return g, _slice_1D.shape[0]-1, start__slice
-    else:
-        return g, _slice_1D.size-1, min_y - y_offset
+        Returns
+        ---------
+        weights: ndarray
+            the stencil weights of the weight band
+        endpoint: scalar, int
+            the endpoint of the graph
+        y_offset:
+            the top row extracted from the predecessor
+            
+    """
+    band, y_offset = getILMBand(_slice, scaling, shortest_path, y_offset, isMatFile, corridor)
+    weights = getStencilWeights(band, NEIGHBORHOOD_3, lambda v_i, v_j: calculateWeights(v_i, v_j, bits))
+    return weights, band.size-1, y_offset
 
 def calculateWeight(value_v_i, value_v_j):
     """ 
@@ -190,4 +238,28 @@ def calculateWeight(value_v_i, value_v_j):
     elif(value_v_j == 0) or (value_v_i == 0):
         return np.exp(6.0)
     else:
-        return np.exp(2.0 - (value_v_i + value_v_j) + w_min)
\ No newline at end of file
+        return np.exp(2.0 - (value_v_i + value_v_j) + w_min)
+
+def calculateWeights(values_v_i, values_v_j, bits = 0):
+    """ 
+        Vectorized exponential weight calculation (compare calculateWeight).
+        
+        Parameters
+        ----------
+        values_v_i: ndarray
+            first pixels' intensities
+        values_v_j: ndarray
+            second pixels' intensities
+            
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+            
+        Returns
+        ----------
+        weights: ndarray, float64
+            the edge weights
+    """
+    weights = np.where((values_v_j == 0) | (values_v_i == 0), np.exp(6.0), expWeights(values_v_i, values_v_j, bits))
+    return np.where((values_v_j > 1.0) | (values_v_j < -1.0), expWeights(values_v_i, 0, bits), weights)
@@ -15,16 +15,20 @@ PRLEC Framework for OCT Processing and Visualization
 from igraph import *
 import numpy as np
 import cv2
+from Algorithms.GraphCut import TopologyCache
+from Algorithms.GraphCut.WeightTable import expWeights
+from Algorithms.GraphCut.EdgeStencil import getEdgesReference, getStencilWeights, NEIGHBORHOOD_3
 
 w_min = 1e-5
 
-def getRPEGraph(_slice, scaling, shortest_path,  y_offset, isMatFile):
+def getRPEBand(_slice, scaling, shortest_path,  y_offset, isMatFile, corridor = None):
     """ 
-        Construct the undirected, weighted RPE graph from the calculated.
+        Extract the weight band of the RPE graph.
         
-        For the initial slice (center), an extensive calculation is conducted.
-        Afterwards, the shortest path of the predecessor is dilated to
-        speed up the process. Invalid edges are set to np.nan
+        For the initial slice (center), a fixed region around the flattened RPE 
+        is extracted. Afterwards, the shortest path of the predecessor is dilated 
+        to speed up the process. Invalid pixels are set to np.nan. A column is 
+        added at the left (-2) and right (+2) border for start and end points.
         
         Parameters
         ----------
@@ -39,33 +43,35 @@ def getRPEGraph(_slice, scaling, shortest_path,  y_offset, isMatFile):
         isMatFile: boolean
             true if mat file, false if tiff file
             
+        Optional
+        ----------
+        corridor: scalar, int
+            dilation kernel size of the predecessor's shortest path 
+            (default: 10*scaling, 15*scaling for mat files)
+            
         Returns
         ---------
-        g: graph
-            the resulting segmentation
-        endpoint: scalar, int
-            the endpoint of the graph
+        band: ndarray
+            the weight band including border columns
         y_offset:
             the top row extracted from the predecessor
             
     """   
-    start_slice = 0
     #initial slice
     if shortest_path is None:
         # limit to certain region above/beneath flattened RPE
         slice_center_y = _slice.shape[0]//2
         #tiff data or mat file
-        start_slice = int((slice_center_y-50)*scaling)
-        end_slice = int((slice_center_y+20)*scaling)
+        start_slice = max(slice_center_y-int(50*scaling), 0)
+        end_slice = slice_center_y+int(20*scaling)
         if isMatFile == True:
-            start_slice = int((slice_center_y-50)*scaling)
-            end_slice = int((slice_center_y+20)*scaling)
+            start_slice = max(slice_center_y-int(50*scaling), 0)
+            end_slice = slice_center_y+int(20*scaling)
         slice_buffer = _slice[start_slice:end_slice,:]
         slice_buffer = np.where(slice_buffer == 0, 0.1, slice_buffer)
         #add a column at the left and right border for start and end points (adding value +2.0 to the right border 
         slice_buffer = cv2.copyMakeBorder(cv2.copyMakeBorder(slice_buffer, top=0,bottom=0, left=0, right=1, borderType= cv2.BORDER_CONSTANT, value =  2.0), top=0,bottom=0, left=1, right=0, borderType= cv2.BORDER_CONSTANT, value = -2.0)
-        slice_1D = slice_buffer.flatten()
-        sx = slice_buffer.shape[1]
+        return slice_buffer, start_slice
     #has predecessor
     else:
         slice_buffer = _slice.copy()
@@ -80,7 +86,7 @@ def getRPEGraph(_slice, scaling, shortest_path,  y_offset, isMatFile):
         min_y = np.amin(path_y[int(start_x):int(end_x)])
         max_y = np.amax(path_y[int(start_x):int(end_x)])
     
-        buffer_result = np.zeros((slice_buffer.shape)).astype(np.float32)
+        buffer_result = np.zeros((slice_buffer.shape), dtype = np.float32)
         buffer_result[path_y, path_x] = 1.0
         #dilate shortest path from predecessor
         
@@ -90,77 +96,118 @@ def getRPEGraph(_slice, scaling, shortest_path,  y_offset, isMatFile):
         if isMatFile == True:
             kernel = np.maximum(int(15*scaling),2)
             y_offset = np.maximum(int(15*scaling),2)
+        if corridor is not None:
+            kernel = corridor
+            y_offset = corridor
         buffer_result[:,1:-1] = cv2.dilate(buffer_result[:,1:-1], np.ones((kernel,kernel),np.uint8),iterations = 1)
         buffer_result = np.where(buffer_result == 1, slice_buffer, np.nan)
-        buffer_result = np.where(slice_buffer[min_y-y_offset:max_y+y_offset] == 0, 0, buffer_result[min_y-y_offset:max_y+y_offset])
+        top = max(min_y-y_offset, 0)
+        buffer_result = np.where(slice_buffer[top:max_y+y_offset] == 0, 0, buffer_result[top:max_y+y_offset])
         buffer_result[:,0] = -2
         buffer_result[:,-1] = 2
-        slice_1D = buffer_result.flatten()
-        sx = slice_buffer.shape[1]
+        return buffer_result, top
+
+def getRPEGraph(_slice, scaling, shortest_path,  y_offset, isMatFile, corridor = None, bits = 0, reference = False):
+    """ 
+        Construct the undirected, weighted RPE graph from the calculated.
+        
+        For the initial slice (center), an extensive calculation is conducted.
+        Afterwards, the shortest path of the predecessor is dilated to
+        speed up the process. Invalid edges are set to np.nan
+        
+        Parameters
+        ----------
+        _slice: ndarray
+            weight slice
+        scaling: scalar
+            scaling factor for calculation
+        shortest_path: ndarray
+            the shortest path from the predecessor
+        y_offset: scalar
+            the top row extracted from the predecessor
+        isMatFile: boolean
+            true if mat file, false if tiff file
+            
+        Optional
+        ----------
+        corridor: scalar, int
+            dilation kernel size of the predecessor's shortest path 
+            (default: 10*scaling, 15*scaling for mat files)
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+        reference: boolean
+            true to construct the edges pixel by pixel (reference builder)
+            
+        Returns
+        ---------
+        g: graph
+            the resulting segmentation
+        endpoint: scalar, int
+            the endpoint of the graph
+        y_offset:
+            the top row extracted from the predecessor
+            
+    """   
+    band, y_offset = getRPEBand(_slice, scaling, shortest_path, y_offset, isMatFile, corridor)
+    
+    if not reference:
+        #reuse the topology of previous bands with the same shape
+        weights = getStencilWeights(band, NEIGHBORHOOD_3, lambda v_i, v_j: calculateExpWeights(v_i, v_j, shortest_path, bits))
+        return TopologyCache.getGraph(weights, NEIGHBORHOOD_3), band.size-1, y_offset
+    
+    slice_1D = band.flatten()
+    sx = band.shape[1]
     # construct graph
     g = Graph(directed=True)
     g.add_vertices(slice_1D.size)
     
-    edge_list = []
-    weight_list = []
-
-    for idx in range(slice_1D.size):
-        if np.isnan(slice_1D[idx]):
-            continue
-    
-        v_i = idx
-        
-        #pixel is not at the right boundary of the image -> has right neighbors
-        if((v_i+1) % sx != 0 ):
-            v_j = v_i +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
-            v_j = v_i - sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
+    edge_list, weight_list = getEdgesReference(slice_1D, sx, NEIGHBORHOOD_3, lambda v_i, v_j: calculateExpWeight(v_i, v_j, shortest_path))
 
-            v_j = v_i + sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
-                    
-        #pixel is located at the left/right boundary -> zero weights
-        if(slice_1D[v_i] > 1.0 or slice_1D[v_i] < -1.0):
-            slice_1D[v_i] = 0.0
-            v_j = v_i - sx
-            if (v_j >= 0 and v_j < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(w_min)
-            v_j = v_i + sx
-            if (v_j >= 0 and v_j < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(w_min)
-            
-        else:
-            #not a boundary pixel
-            v_j = v_i - sx
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
-                
-            v_j = v_i + sx
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
-                
     g.add_edges(edge_list)
     g.es['weight'] = weight_list
     
-    if shortest_path is None:
-        return g, slice_1D.shape[0]-1, start_slice
-    else:
-        return g, slice_1D.size-1, min_y - y_offset
+    return g, slice_1D.size-1, y_offset
+
+def getRPEWeights(_slice, scaling, shortest_path,  y_offset, isMatFile, corridor = None, bits = 0):
+    """ 
+        Calculate the stencil weights of the RPE graph without constructing it.
+        
+        Input for the column-sweep solver (compare getRPEGraph).
+        
+        Parameters
+        ----------
+        _slice: ndarray
+            weight slice
+        scaling: scalar
+            scaling factor for calculation
+        shortest_path: ndarray
+            the shortest path from the predecessor
+        y_offset: scalar
+            the top row extracted from the predecessor
+        isMatFile: boolean
+            true if mat file, false if tiff file
+            
+        Optional
+        ----------
+        corridor: scalar, int
+            dilation kernel size of the predecessor's shortest path 
+            (default: 10*scaling, 15*scaling for mat files)
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+            
+        Returns
+        ---------
+        weights: ndarray
+            the stencil weights of the weight band
+        endpoint: scalar, int
+            the endpoint of the graph
+        y_offset:
+            the top row extracted from the predecessor
+            
+    """   
+    band, y_offset = getRPEBand(_slice, scaling, shortest_path, y_offset, isMatFile, corridor)
+    weights = getStencilWeights(band, NEIGHBORHOOD_3, lambda v_i, v_j: calculateExpWeights(v_i, v_j, shortest_path, bits))
+    return weights, band.size-1, y_offset
 
 def calculateExpWeight(value_v_i, value_v_j, shortest_path):
     """ 
@@ -188,4 +235,34 @@ def calculateExpWeight(value_v_i, value_v_j, shortest_path):
     elif shortest_path is not None and (value_v_j == 0 or value_v_i == 0):
         return np.exp(6.0)
     else:
-        return np.exp(2.0 - (value_v_i + value_v_j) + w_min)
\ No newline at end of file
+        return np.exp(2.0 - (value_v_i + value_v_j) + w_min)
+
+def calculateExpWeights(values_v_i, values_v_j, shortest_path, bits = 0):
+    """ 
+        Vectorized exponential weight calculation (compare calculateExpWeight).
+        
+        Parameters
+        ----------
+        values_v_i: ndarray
+            first pixels' intensities
+        values_v_j: ndarray
+            second pixels' intensities
+        shortest_path: ndarray
+            when initial slice (shortest path = None), different behavior
+        
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+            
+        Returns
+        ----------
+        weights: ndarray, float64
+            the edge weights
+    """
+    if shortest_path is None:
+        dark = (values_v_j < 0.4) | (values_v_i < 0.4)
+    else:
+        dark = (values_v_j == 0) | (values_v_i == 0)
+    weights = np.where(dark, np.exp(6.0), expWeights(values_v_i, values_v_j, bits))
+    return np.where((values_v_j > 1.0) | (values_v_j < -1.0), expWeights(values_v_i, 0, bits), weights)
@@ -13,27 +13,56 @@ PRLEC Framework for OCT Processing and Visualization
 # Copyright (C) 2018-2019 - Daniel Stromer
 # PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
 import numpy as np
+import os
 import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
 import Algorithms.AutomaticSegmentation.BuildRPEGraph as gm_rpe
 import Algorithms.AutomaticSegmentation.BuildILMGraph as gm_vitnfl
 from Algorithms.AutomaticSegmentation.InpaintSegmentation import inpaint
-#dicts to store values
-shortestPath={}
-y_offset_dict = {}
+from Algorithms.GraphCut import ShortestPath
+from Algorithms.GraphCut.EdgeStencil import NEIGHBORHOOD_3
 
-class thread_pipeline (threading.Thread):
+#adaptive corridor: minimum half width (pixels at scaling 1), widening factor and number of retries
+MIN_MARGIN = 1
+WIDENING = 2
+MAX_RETRIES = 2
+
+#propagation executors (Parameters.txt: AUTO_EXECUTOR)
+EXECUTORS = ('thread', 'process')
+
+class PropagationContext:
     """
-        Threaded Graph-Cut pipeline
+        State of one Graph-Cut propagation run (one per execute_graphcut 
+        call, such that several volumes can be segmented concurrently).
         
-        Global Parameters
+        The dicts are indexed by the direction: 1 (down) and -1 (up).
+        
+        Attributes
         ----------------
         shortestPath: dict
             storing the latest shortest path as input for next iteration
         y_offset_dict: dict
             storing the latest y_offset as input for next iteration -> runtime minimization
+        displacement_dict: dict
+            storing the latest slice-to-slice displacement (None: unknown) for the corridor width
+    """
+    def __init__(self):
+        """
+            Initializing empty state.
+        """
+        self.shortestPath = {}
+        self.y_offset_dict = {}
+        self.displacement_dict = {}
+
+class thread_pipeline (threading.Thread):
+    """
+        Threaded Graph-Cut pipeline
         
+        The state of the run (latest shortest path, y_offset and displacement
+        per direction) is read from and stored to a PropagationContext.
     """
-    def __init__(self, threadID , isMatFile, volume_slice, gradient_slice, prior_shortest_path, scaling, UPORDOWN, mode, dictParameters):
+    def __init__(self, threadID , isMatFile, volume_slice, gradient_slice, prior_shortest_path, scaling, UPORDOWN, mode, dictParameters, context, solver = 'igraph'):
         """
             Initializing Pipeline.
             
@@ -58,8 +87,16 @@ class thread_pipeline (threading.Thread):
                 'RPE', or 'ILM' 
             dictParameters: dictionary
                 Parameters from parameters.txt
+            context: PropagationContext
+                state of the run
+            
+            Optional
+            ----------
+            solver: string
+                'igraph', 'scipy' or 'sweep' (compare ShortestPath.getShortestPath)
         """
         threading.Thread.__init__(self)
+        self.context = context
         self.threadID = threadID
         self.volume_slice = volume_slice
         self.gradient_slice = gradient_slice
@@ -69,6 +106,7 @@ class thread_pipeline (threading.Thread):
         self.mode = mode
         self.dictParameters = dictParameters
         self.isMatFile = isMatFile
+        self.solver = solver
         
     def run(self):
         """
@@ -88,35 +126,356 @@ class thread_pipeline (threading.Thread):
             Pipeline implementation
         """
         
-        #restore y_offset
-        y_offset = y_offset_dict[-1]
+        #restore y_offset and displacement
+        prior_y_offset = self.context.y_offset_dict[-1]
+        displacement = self.context.displacement_dict[-1]
         if('down' is self.UPORDOWN):
-            y_offset = y_offset_dict[1]
+            prior_y_offset = self.context.y_offset_dict[1]
+            displacement = self.context.displacement_dict[1]
         
-        #Calculate graph
-        if(self.mode is 'RPE'):
-            graph, endnode, y_offset = gm_rpe.getRPEGraph(self.gradient_slice, self.scaling, self.prior_shortest_path, y_offset,self.isMatFile)
-        else:
-            graph, endnode, y_offset = gm_vitnfl.getILMGraph(self.gradient_slice, self.scaling, self.prior_shortest_path, y_offset,self.isMatFile)
-            
-        #calculate shortest path - if invalid, take predecessor's
-        shortest_path = np.asarray(graph.get_shortest_paths(v=0, to=endnode, weights = 'weight'))
-        if(shortest_path.size == 0):
-            shortest_path = self.prior_shortest_path
+        shortest_path, y_offset, displacement = propagateSlice(self.gradient_slice, self.prior_shortest_path, prior_y_offset, displacement, self.scaling, self.mode, self.isMatFile, self.solver, self.dictParameters.get('WEIGHT_BITS', 0))
         
         #Inpaint segmentation  
         self.segmentation = inpaint(self.volume_slice,shortest_path, y_offset,self.mode, self.dictParameters)
 
         #store variables for next iteration
         if('down' is self.UPORDOWN):
-            shortestPath[1] = shortest_path.flatten()
-            y_offset_dict[1] = y_offset
+            self.context.shortestPath[1] = shortest_path.flatten()
+            self.context.y_offset_dict[1] = y_offset
+            self.context.displacement_dict[1] = displacement
         else:
-            shortestPath[-1] = shortest_path.flatten()
-            y_offset_dict[-1] = y_offset
+            self.context.shortestPath[-1] = shortest_path.flatten()
+            self.context.y_offset_dict[-1] = y_offset
+            self.context.displacement_dict[-1] = displacement
 
+
+def propagateSlice(gradient_slice, prior_shortest_path, prior_y_offset, displacement, scaling, mode, isMatFile, solver, bits = 0):
+    """
+        Segment a slice in the adaptive corridor around the predecessor's path.
+        
+        If the corridor contains no path, it is widened up to MAX_RETRIES 
+        times, afterwards the predecessor's path is taken.
+        
+        Parameters
+        ----------
+        gradient_slice: numpy array 2D
+            preprocessed gradient slice
+        prior_shortest_path: numpy array 1D
+            shortest path of predecessor
+        prior_y_offset: scalar
+            y_offset of predecessor
+        displacement: scalar
+            last slice-to-slice displacement (None if unknown)
+        scaling: scalar
+            scaling factor of image up or downscaling
+        mode: string
+            'RPE', or 'ILM' 
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        solver: string
+            'igraph', 'scipy' or 'sweep' (compare ShortestPath.getShortestPath)
+        
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+        
+        Return
+        ------
+        shortest_path: numpy array 1D
+            shortest path
+        y_offset: scalar
+            the top row of the graph
+        displacement: scalar
+            displacement to the predecessor (unchanged if the predecessor's path was taken)
+    """
+    #calculate shortest path in an adaptive corridor - if invalid, retry with a wider corridor
+    width = gradient_slice.shape[1] + 2
+    corridor = getCorridor(prior_shortest_path, prior_y_offset, width, displacement, scaling, isMatFile)
+    for retry in range(MAX_RETRIES + 1):
+        shortest_path, y_offset = getShortestPath(gradient_slice, scaling, prior_shortest_path, prior_y_offset, mode, isMatFile, solver, corridor, bits)
+        if(shortest_path.size != 0):
+            break
+        corridor = corridor*WIDENING
     
-def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters,isMatFile):
+    #still invalid, take predecessor's
+    if(shortest_path.size == 0):
+        return prior_shortest_path, prior_y_offset, displacement
+    displacement = np.percentile(np.abs(getPathRows(shortest_path, y_offset, width) - getPathRows(prior_shortest_path, prior_y_offset, width)), 95)
+    return shortest_path, y_offset, displacement
+
+def propagateChain(gradient_volume, slices, shortest_path, y_offset, scaling, mode, isMatFile, solver, bits = 0):
+    """
+        Propagate the segmentation along a chain of slices.
+        
+        Parameters
+        ----------
+        gradient_volume: numpy array 2D/3D
+            preprocessed gradient_volume 
+        slices: list of int
+            the slices in order of propagation
+        shortest_path: numpy array 1D
+            shortest path of the slice the chain starts from
+        y_offset: scalar
+            y_offset of the slice the chain starts from
+        scaling: scalar
+            scaling factor of image up or downscaling
+        mode: string
+            'RPE', or 'ILM' 
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        solver: string
+            'igraph', 'scipy' or 'sweep' (compare ShortestPath.getShortestPath)
+        
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+        
+        Return
+        ------
+        paths: list of numpy arrays 1D, int32
+            shortest path of every slice of the chain
+        y_offsets: list of scalars
+            y_offset of every slice of the chain
+    """
+    paths = []
+    y_offsets = []
+    displacement = None
+    for i in slices:
+        shortest_path, y_offset, displacement = propagateSlice(gradient_volume[i], shortest_path, y_offset, displacement, scaling, mode, isMatFile, solver, bits)
+        paths.append(shortest_path.astype(np.int32))
+        y_offsets.append(y_offset)
+    return paths, y_offsets
+
+def propagateSharedChain(shared_name, shape, dtype, slices, shortest_path, y_offset, scaling, mode, isMatFile, solver, bits = 0):
+    """
+        Propagate the segmentation along a chain of slices (worker process).
+        
+        The gradient volume is read from shared memory instead of being 
+        pickled (compare propagateChain for the remaining parameters). 
+        
+        Parameters
+        ----------
+        shared_name: string
+            name of the shared memory block of the gradient volume
+        shape: tuple
+            shape of the gradient volume
+        dtype: numpy dtype
+            data type of the gradient volume
+        
+        Return
+        ------
+        paths: list of numpy arrays 1D, int32
+            shortest path of every slice of the chain
+        y_offsets: list of scalars
+            y_offset of every slice of the chain
+    """
+    shared = shared_memory.SharedMemory(name = shared_name)
+    gradient_volume = np.ndarray(shape, dtype = dtype, buffer = shared.buf)
+    try:
+        return propagateChain(gradient_volume, slices, shortest_path, y_offset, scaling, mode, isMatFile, solver, bits)
+    finally:
+        del gradient_volume
+        shared.close()
+
+def runChains(gradient_volume, chains, scaling, mode, isMatFile, solver, bits = 0, executor = 'process'):
+    """
+        Propagate several independent chains of slices in parallel.
+        
+        With the 'process' executor, every chain runs in a worker process 
+        (not limited by the GIL). The gradient volume is shared with the 
+        workers through shared memory, only the paths are sent back.
+        
+        Parameters
+        ----------
+        gradient_volume: numpy array 2D/3D
+            preprocessed gradient_volume 
+        chains: list of tuples
+            (slices, shortest_path, y_offset) of every chain (compare propagateChain)
+        scaling: scalar
+            scaling factor of image up or downscaling
+        mode: string
+            'RPE', or 'ILM' 
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        solver: string
+            'igraph', 'scipy' or 'sweep' (compare ShortestPath.getShortestPath)
+        
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+        executor: string
+            'process' (default) or 'thread'
+        
+        Return
+        ------
+        results: list of tuples
+            (paths, y_offsets) of every chain
+    """
+    chains = [chain for chain in chains if len(chain[0])]
+    workers = min(max(len(chains), 1), max(os.cpu_count() or 1, 2))
+    if executor != 'process':
+        with ThreadPoolExecutor(max_workers = workers) as pool:
+            futures = {pool.submit(propagateChain, gradient_volume, slices, shortest_path, y_offset, scaling, mode, isMatFile, solver, bits): slices for slices, shortest_path, y_offset in chains}
+            return [(futures[future], future.result()) for future in futures]
+    
+    volume = np.asarray(gradient_volume)
+    shared = shared_memory.SharedMemory(create = True, size = max(volume.nbytes, 1))
+    try:
+        np.ndarray(volume.shape, dtype = volume.dtype, buffer = shared.buf)[:] = volume
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            futures = {pool.submit(propagateSharedChain, shared.name, volume.shape, volume.dtype, slices, shortest_path, y_offset, scaling, mode, isMatFile, solver, bits): slices for slices, shortest_path, y_offset in chains}
+            return [(futures[future], future.result()) for future in futures]
+    finally:
+        shared.close()
+        shared.unlink()
+
+def getInitialPath(gradient_slice, scaling, mode, isMatFile, solver, bits = 0):
+    """
+        Calculate the shortest path of an initial slice (no predecessor).
+        
+        If the band contains no path, the band is enlarged up to 
+        MAX_RETRIES times.
+        
+        Parameters
+        ----------
+        gradient_slice: numpy array 2D
+            preprocessed gradient slice
+        scaling: scalar
+            scaling factor of image up or downscaling
+        mode: string
+            'RPE', or 'ILM' 
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        solver: string
+            'igraph', 'scipy' or 'sweep' (compare ShortestPath.getShortestPath)
+        
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+        
+        Return
+        ------
+        shortest_path: numpy array 1D
+            shortest path
+        y_offset: scalar
+            the top row of the graph
+    """
+    for retry in range(MAX_RETRIES + 1):
+        shortest_path, y_offset = getShortestPath(gradient_slice, scaling*WIDENING**retry, None, None, mode, isMatFile, solver, None, bits)
+        if(shortest_path.size != 0):
+            return shortest_path, y_offset
+    raise Exception('no path found')
+
+def getShortestPath(gradient_slice, scaling, prior_shortest_path, y_offset, mode, isMatFile, solver, corridor = None, bits = 0):
+    """
+        Calculate the shortest path through the graph of a slice.
+        
+        Parameters
+        ----------
+        gradient_slice: numpy array 2D
+            preprocessed gradient slice
+        scaling: scalar
+            scaling factor of image up or downscaling
+        prior_shortest_path: numpy array 1D
+            shortest path of predecessor (None for the initial slice)
+        y_offset: scalar
+            y_offset of predecessor (None for the initial slice)
+        mode: string
+            'RPE', or 'ILM' 
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        solver: string
+            'igraph', 'scipy' or 'sweep' (compare ShortestPath.getShortestPath)
+        
+        Optional
+        ----------
+        corridor: scalar, int
+            dilation kernel size of the predecessor's shortest path (compare getCorridor)
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+        
+        Return
+        ------
+        shortest_path: numpy array 1D
+            shortest path (empty if no path was found)
+        y_offset: scalar
+            the top row of the graph
+    """
+    if mode == 'RPE':
+        weights, endnode, y_offset = gm_rpe.getRPEWeights(gradient_slice, scaling, prior_shortest_path, y_offset, isMatFile, corridor, bits)
+    else:
+        weights, endnode, y_offset = gm_vitnfl.getILMWeights(gradient_slice, scaling, prior_shortest_path, y_offset, isMatFile, corridor, bits)
+    return ShortestPath.getShortestPath(weights, NEIGHBORHOOD_3, solver), y_offset
+
+def getPathRows(shortest_path, y_offset, width):
+    """
+        Row of a shortest path in every image column (mean of vertical runs).
+        
+        Parameters
+        ----------
+        shortest_path: numpy array 1D
+            shortest path (flattened pixel indices of the band)
+        y_offset: scalar
+            the top row of the band
+        width: scalar, int
+            width of the band (including border columns)
+        
+        Return
+        ------
+        rows: numpy array 1D
+            path row of the columns 1...width-2
+    """
+    path_x = shortest_path % width
+    path_y = shortest_path // width + y_offset
+    counts = np.bincount(path_x, minlength = width)
+    return np.bincount(path_x, weights = path_y, minlength = width)[1:-1]/np.maximum(counts[1:-1], 1)
+
+def getCorridor(prior_shortest_path, y_offset, width, displacement, scaling, isMatFile):
+    """
+        Adaptive dilation kernel size of the predecessor's shortest path.
+        
+        The corridor has to contain the displacement between neighboring
+        slices (95th percentile of the last step) and the local bending of
+        the path (95th percentile of its second difference), plus a margin
+        of MIN_MARGIN pixels. The fixed kernel size (10*scaling, 15*scaling
+        for mat files) is the upper limit and used if the displacement is
+        unknown (first slices after the central slice).
+        
+        Parameters
+        ----------
+        prior_shortest_path: numpy array 1D
+            shortest path of predecessor
+        y_offset: scalar
+            y_offset of predecessor
+        width: scalar, int
+            width of the band (including border columns)
+        displacement: scalar
+            last slice-to-slice displacement (None if unknown)
+        scaling: scalar
+            scaling factor of image up or downscaling
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        
+        Return
+        ------
+        corridor: scalar, int
+            dilation kernel size
+    """
+    kernel = max(int(10*scaling),2)
+    if isMatFile == True:
+        kernel = max(int(15*scaling),2)
+    if displacement is None:
+        return kernel
+    rows = getPathRows(prior_shortest_path, y_offset, width)
+    curvature = np.percentile(np.abs(np.diff(rows, 2)), 95) if rows.size > 2 else 0
+    margin = int(np.ceil(displacement + curvature)) + max(int(MIN_MARGIN*scaling),1)
+    return min(2*margin + 1, kernel)
+    
+def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters,isMatFile, solver = None, executor = None):
     """
         Execute Graph-Cut algorithm.
         
@@ -134,6 +493,13 @@ def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters,
             Parameters from parameters.txt
         isMatFile: boolean
             true if mat file, false if tiff file
+        solver: string, optional
+            shortest path solver: 'igraph', 'scipy' or 'sweep' (compare 
+            ShortestPath.getShortestPath), default: GRAPHCUT_SOLVER of parameters.txt
+        executor: string, optional
+            'thread' (up and down propagation step by step in two threads) or
+            'process' (up and down propagation in two worker processes,
+            compare runChains), default: AUTO_EXECUTOR of parameters.txt
         Return
         ------
         result: numpy array 2D/3D
@@ -141,8 +507,15 @@ def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters,
         
     """
     
+    if solver is None:
+        solver = dictParameters.get('GRAPHCUT_SOLVER', 'igraph')
+    if executor is None:
+        executor = dictParameters.get('AUTO_EXECUTOR', 'thread')
+    
+    context = PropagationContext()
+    
     #result array
-    result = np.zeros((len(oct_volume),oct_volume[0].shape[0], oct_volume[0].shape[1])).astype("uint8")
+    result = np.zeros((len(oct_volume),oct_volume[0].shape[0], oct_volume[0].shape[1]), dtype = "uint8")
 
     index = 0
     center_slice = int(len(gradient_volume)/2)
@@ -152,23 +525,26 @@ def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters,
 
         #process initial slice (central)
         if index == 0:
-            #compute graph and shortest path
-            if(mode is 'RPE'):
-                initial_graph, endnode, y_offset = gm_rpe.getRPEGraph(gradient_volume[center_slice], scaling, None, None,isMatFile)
-            else:
-                initial_graph, endnode, y_offset = gm_vitnfl.getILMGraph(gradient_volume[center_slice], scaling, None, None,isMatFile)
-                
-            shortestPath[1] = np.asarray(initial_graph.get_shortest_paths(v=0, to=endnode, weights = 'weight')).flatten()  
-            shortestPath[-1] = shortestPath[1]
+            #compute graph and shortest path - if invalid, retry with a higher band
+            context.shortestPath[1], y_offset = getInitialPath(gradient_volume[center_slice], scaling, mode, isMatFile, solver, dictParameters.get('WEIGHT_BITS', 0))
+            context.shortestPath[-1] = context.shortestPath[1]
             
-            if(shortestPath[1].size == 0):
-                raise Exception('no path found')
             #store offset
-            y_offset_dict[1] = y_offset
-            y_offset_dict[-1] = y_offset
+            context.y_offset_dict[1] = y_offset
+            context.y_offset_dict[-1] = y_offset
+            context.displacement_dict[1] = None
+            context.displacement_dict[-1] = None
 
             #inpaint shortest path
-            result[center_slice] = inpaint(oct_volume[center_slice],shortestPath[1], y_offset, mode, dictParameters)
+            result[center_slice] = inpaint(oct_volume[center_slice],context.shortestPath[1], y_offset, mode, dictParameters)
+
+            #up and down propagation in two worker processes
+            if executor == 'process':
+                chains = [(range(center_slice - 1, -1, -1), context.shortestPath[1], y_offset), (range(center_slice + 1, len(gradient_volume)), context.shortestPath[1], y_offset)]
+                for slices, (paths, y_offsets) in runChains(gradient_volume, chains, scaling, mode, isMatFile, solver, dictParameters.get('WEIGHT_BITS', 0)):
+                    for i, shortest_path, path_y_offset in zip(slices, paths, y_offsets):
+                        result[i] = inpaint(oct_volume[i], shortest_path, path_y_offset, mode, dictParameters)
+                break
 
             index += 1
             continue
@@ -176,11 +552,11 @@ def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters,
         #multithreaded pipeline execution
         threads = []
         if (center_slice-index) >= 0:
-            thread = thread_pipeline((center_slice-index),isMatFile, oct_volume[(center_slice-index)], gradient_volume[(center_slice-index)], shortestPath[1],scaling, 'down', mode, dictParameters)
+            thread = thread_pipeline((center_slice-index),isMatFile, oct_volume[(center_slice-index)], gradient_volume[(center_slice-index)], context.shortestPath[1],scaling, 'down', mode, dictParameters, context, solver)
             thread.start()
             threads.append(thread)
         if (center_slice+index) < len(gradient_volume):
-            thread = thread_pipeline((center_slice+index),isMatFile, oct_volume[(center_slice+index)], gradient_volume[(center_slice+index)], shortestPath[-1],scaling, 'up', mode, dictParameters)
+            thread = thread_pipeline((center_slice+index),isMatFile, oct_volume[(center_slice+index)], gradient_volume[(center_slice+index)], context.shortestPath[-1],scaling, 'up', mode, dictParameters, context, solver)
             thread.start()
             threads.append(thread)
         
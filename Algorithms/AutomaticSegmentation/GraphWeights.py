@@ -14,14 +14,24 @@ PRLEC Framework for OCT Processing and Visualization
 # PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
 import numpy as np
 import cv2
+import threading
 from skimage import exposure
+from Algorithms.GraphCut.PreprocessingCache import getCached, getFingerprint, CACHE_MB
+from Algorithms.GraphCut.ParallelSlices import mapSlices
+from Algorithms.GraphCut.EdgePreservingFilters import getSupport, smoothSlices, smoothVolume
 
-def runWeightCalculation(volume, mode, dictParameters, isMatFile):
+#number of slices smoothed together in the en-face plane (streaming)
+TILE_SIZE = 16
+
+def runWeightCalculation(volume, mode, dictParameters, isMatFile, workers = None, smoothing = None):
     """
         Calculating weights for modes
         
         The volume is bilateral filter in the en-face plane. 
-        Next, each B-scan is bilateral filtered again.
+        Next, each B-scan is bilateral filtered again. Both smoothed volumes
+        are cached (PreprocessingCache, keyed by the volume and the filter 
+        values), so ILM and RPE share the en-face smoothing if their values
+        are equal, and reruns skip unchanged stages.
         
         RPE: The result of this is returned as weights
         ILM: The gradient is calculated (Dark-to-bright) and the resulting
@@ -42,28 +52,235 @@ def runWeightCalculation(volume, mode, dictParameters, isMatFile):
         dictParameters: dictionary
             Parameters from parameters.txt
         
+        Optional
+        ----------
+        workers: scalar, int
+            number of filter threads (0: number of CPU cores, compare 
+            ParallelSlices), default: FILTER_WORKERS of parameters.txt
+        smoothing: string
+            'bilateral' (exact), 'guided', 'domain' or 'guided3d' (compare 
+            EdgePreservingFilters), default: AUTO_FILTER of parameters.txt
+        
         Return
         ------
         volume: list of numpy arrays
             list of volume slices that were preprocessed
         
     """
-    if mode is 'ILM':
-        BF_enface = dictParameters['AUTO_ILM_BF_ENFACE']
-        BF_bscan = dictParameters['AUTO_ILM_BF_BSCAN']
+    if workers is None:
+        workers = dictParameters.get('FILTER_WORKERS', 1)
+    if smoothing is None:
+        smoothing = dictParameters.get('AUTO_FILTER', 'bilateral')
+    BF_enface, BF_bscan = getFilterValues(mode, dictParameters)
+    cache_mb = dictParameters.get('CACHE_MB', CACHE_MB)
+    #no fingerprint (hash of the volume) if the cache is disabled
+    key = (getFingerprint(volume) if cache_mb else None, smoothing, tuple(int(v) for v in BF_enface))
+    
+    if smoothing == 'guided3d':
+        #single 3D pass instead of en-face and B-scan filter
+        volume_smoothed = getCached(('volume',) + key + (tuple(int(v) for v in BF_bscan),), lambda: smoothVolume(volume, BF_enface, BF_bscan), cache_mb)
     else:
-        BF_enface = dictParameters['AUTO_RPE_BF_ENFACE']
-        BF_bscan = dictParameters['AUTO_RPE_BF_BSCAN']
+        volume_smoothed = getCached(('enface',) + key, lambda: smoothEnface(volume, BF_enface, workers = workers, smoothing = smoothing), cache_mb)
+        
+        volume_smoothed = getCached(('bscan',) + key + (tuple(int(v) for v in BF_bscan),), lambda: smoothSlices(volume_smoothed, BF_bscan, smoothing, workers), cache_mb)
+    
+    volume_res = mapSlices(lambda _slice: getGradient(_slice, mode, isMatFile), volume_smoothed, workers)
     
-    volume_smoothed = np.swapaxes(volume, axis1 = 1, axis2 = 0)
+    return volume_res
 
-    volume_smoothed = np.array([cv2.bilateralFilter(_slice,BF_enface[0],BF_enface[1],BF_enface[2]) for _slice in volume_smoothed])
+def getFilterValues(mode, dictParameters):
+    """
+        Bilateral filter values of a mode
+        
+        Parameters
+        ----------
+        mode: string
+            'RPE' or 'ILM'
+        dictParameters: dictionary
+            Parameters from parameters.txt
+        
+        Return
+        ------
+        BF_enface: ndarray, int, size 3
+            en-face plane smoothing values
+        BF_bscan: ndarray, int, size 3
+            B-scan smoothing values
+    """
+    if mode == 'ILM':
+        return dictParameters['AUTO_ILM_BF_ENFACE'], dictParameters['AUTO_ILM_BF_BSCAN']
+    return dictParameters['AUTO_RPE_BF_ENFACE'], dictParameters['AUTO_RPE_BF_BSCAN']
 
-    volume_smoothed = np.swapaxes(volume_smoothed, axis1 = 0, axis2 = 1)
+def smoothEnface(volume, BF_enface, start = 0, end = None, workers = 1, smoothing = 'bilateral'):
+    """
+        Filter the en-face planes of a range of slices.
+        
+        Only the slices start...end plus the filter support on both sides
+        are filtered, the result equals the one of filtering the complete
+        volume (the domain transform is always applied to all slices).
+        
+        Parameters
+        ----------
+        volume: numpy array 3D or list of 2D arrays
+            oct input volume
+        BF_enface: ndarray, int, size 3
+            Bilateral filter values for smoothing
+        
+        Optional
+        ----------
+        start: scalar, int
+            first slice
+        end: scalar, int
+            last slice + 1 (default: number of slices)
+        workers: scalar, int
+            number of filter threads (0: number of CPU cores)
+        smoothing: string
+            'bilateral' (default), 'guided' or 'domain' (compare 
+            EdgePreservingFilters.smoothSlices)
+        
+        Return
+        ------
+        volume_smoothed: numpy array 3D
+            the smoothed slices start...end
+    """
+    if end is None:
+        end = len(volume)
+    support = len(volume) if smoothing == 'domain' else getSupport(BF_enface, smoothing)
+    first = max(start - support, 0)
+    last = min(end + support, len(volume))
+    
+    volume_smoothed = np.swapaxes(np.asarray(volume[first:last]), axis1 = 1, axis2 = 0)
+
+    volume_smoothed = np.array(smoothSlices(volume_smoothed, BF_enface, smoothing, workers))
+
+    return np.swapaxes(volume_smoothed, axis1 = 0, axis2 = 1)[start - first:end - first]
+
+class WeightStream:
+    """
+        Graph weights produced in the background in propagation order.
+        
+        A producer thread smooths the volume tile by tile (TILE_SIZE 
+        slices, starting at the central slice and alternating outwards, 
+        compare execute_graphcut) and calculates the gradients of every 
+        slice. Slices are handed out once: reading a slice waits until it 
+        is produced and releases it. The producer waits while 'window' 
+        slices are ready, so only a window of slices is held in memory.
+        Drop-in replacement for the list of runWeightCalculation in the
+        slice-by-slice propagation. The consumer calls close() when it is
+        done (or fails), which stops the producer.
+    """
+    def __init__(self, volume, mode, dictParameters, isMatFile, tile = TILE_SIZE, window = None, workers = None, smoothing = None):
+        """
+            Initializing and starting the producer.
+            
+            Parameters
+            ----------
+            volume: numpy array 3D or list of 2D arrays
+                oct input volume
+            mode: string
+                'RPE' or 'ILM' mode setter to detect filter values
+            dictParameters: dictionary
+                Parameters from parameters.txt
+            isMatFile: boolean
+                true if mat file, false if tiff file
+            
+            Optional
+            ----------
+            tile: scalar, int
+                number of slices smoothed together
+            window: scalar, int
+                maximum number of slices ready (default: 2*tile + 1, 
+                smaller windows can stall the propagation)
+            workers: scalar, int
+                number of filter threads (0: number of CPU cores), 
+                default: FILTER_WORKERS of parameters.txt
+            smoothing: string
+                'bilateral' or 'guided' (filters of a finite support), 
+                default: AUTO_FILTER of parameters.txt
+        """
+        self.volume = volume
+        self.mode = mode
+        self.isMatFile = isMatFile
+        self.BF_enface, self.BF_bscan = getFilterValues(mode, dictParameters)
+        self.tile = max(int(tile), 1)
+        self.window = 2*self.tile + 1 if window is None else window
+        self.workers = dictParameters.get('FILTER_WORKERS', 1) if workers is None else workers
+        self.smoothing = dictParameters.get('AUTO_FILTER', 'bilateral') if smoothing is None else smoothing
+        self.ready = {}
+        self.error = None
+        self.closed = False
+        self.condition = threading.Condition()
+        self.producer = threading.Thread(target = self.produce, daemon = True)
+        self.producer.start()
+        
+    def __len__(self):
+        return len(self.volume)
     
-    volume_res = [calculateGradients(_slice, mode, BF_bscan,isMatFile) for _slice in volume_smoothed]
+    def __getitem__(self, index):
+        """
+            Wait for a slice and release it.
+        """
+        with self.condition:
+            while index not in self.ready and self.error is None and not self.closed:
+                self.condition.wait()
+            if index not in self.ready:
+                raise self.error if self.error is not None else ValueError('weight stream is closed')
+            self.condition.notify_all()
+            return self.ready.pop(index)
     
-    return volume_res
+    def close(self):
+        """
+            Stop the producer and release the slices ready.
+        """
+        with self.condition:
+            self.closed = True
+            self.ready.clear()
+            self.condition.notify_all()
+    
+    def getTiles(self):
+        """
+            Slice ranges of the tiles in order of production.
+            
+            Return
+            ------
+            tiles: list of tuples
+                (start, end) of every tile
+        """
+        n_slices = len(self.volume)
+        start = max(int(n_slices/2) - self.tile//2, 0)
+        tiles = [(start, min(start + self.tile, n_slices))]
+        down, up = tiles[0]
+        while down > 0 or up < n_slices:
+            if down > 0:
+                tiles.append((max(down - self.tile, 0), down))
+                down = tiles[-1][0]
+            if up < n_slices:
+                tiles.append((up, min(up + self.tile, n_slices)))
+                up = tiles[-1][1]
+        return tiles
+    
+    def produce(self):
+        """
+            Producer: smoothing and gradient calculation tile by tile.
+        """
+        try:
+            for start, end in self.getTiles():
+                if self.closed:
+                    return
+                volume_smoothed = smoothEnface(self.volume, self.BF_enface, start, end, self.workers, self.smoothing)
+                volume_smoothed = smoothSlices(volume_smoothed, self.BF_bscan, self.smoothing, self.workers)
+                gradients = mapSlices(lambda _slice: getGradient(_slice, self.mode, self.isMatFile), volume_smoothed, self.workers)
+                for index, gradient in zip(range(start, end), gradients):
+                    with self.condition:
+                        while len(self.ready) >= self.window and not self.closed:
+                            self.condition.wait()
+                        if self.closed:
+                            return
+                        self.ready[index] = gradient
+                        self.condition.notify_all()
+        except Exception as e:
+            with self.condition:
+                self.error = e
+                self.condition.notify_all()
 
 def calculateGradients(_slice, mode, BF_bscan,isMatFile):
     """
@@ -81,13 +298,31 @@ def calculateGradients(_slice, mode, BF_bscan,isMatFile):
         result: numpy array 2D
             resulting gradient image
     """
-    result = cv2.bilateralFilter(_slice,BF_bscan[0],BF_bscan[1],BF_bscan[2])
+    return getGradient(cv2.bilateralFilter(_slice,BF_bscan[0],BF_bscan[1],BF_bscan[2]), mode, isMatFile)
 
+def getGradient(result, mode, isMatFile):
+    """
+        Helper to calculate the gradient of a B-scan filtered slice
+        
+        Parameters
+        ----------
+        result: numpy array 2D
+            B-scan filtered slice
+        mode: string
+            'RPE' (slice returned unchanged) or 'ILM'
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        
+        Return
+        ------
+        result: numpy array 2D
+            resulting gradient image
+    """
     if(mode is 'ILM'):
         grad = cv2.filter2D(result,-1, np.array([[-1],[1]]))
         grad = np.where(grad > 0 , grad, 0)
     
-        img_center = _slice.shape[0]//2
+        img_center = result.shape[0]//2
         #mat file vs MIT file
         if isMatFile:
             p2, p98 = np.percentile(grad[img_center-200:img_center-20,:], (2, 98))
@@ -38,7 +38,7 @@ def inpaint(_slice, shortest_path, y_offset, mode, dictParameters):
     
     """
     #add border columns to image
-    segmentation = np.zeros((_slice.shape[0], _slice.shape[1]+2)).astype('uint8')
+    segmentation = np.zeros((_slice.shape[0], _slice.shape[1]+2), dtype = 'uint8')
     #convert shortest path from flattened 1-D to 2-D (x and y coordinate)
     path_x = (shortest_path % segmentation.shape[1]).astype(np.int32)
     path_y = (shortest_path / segmentation.shape[1]).astype(np.int32) + y_offset
@@ -0,0 +1,206 @@
+"""
+MultiSeedSegmentation: Graph-Cut propagation from several seed slices
+-------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+from Algorithms.AutomaticSegmentation.GraphCutSegmentation import getInitialPath, getCorridor, getPathRows, propagateSlice, runChains
+from Algorithms.AutomaticSegmentation.InpaintSegmentation import inpaint
+from Algorithms.AutomaticSegmentation.PyramidSegmentation import getCorridorPath
+
+#maximum row difference (pixels) of two paths of a slice that agree
+AGREEMENT = 1
+
+def getChunks(n_slices, seeds):
+    """
+        Split the volume into chunks of consecutive slices, one per seed.
+
+        Parameters
+        ----------
+        n_slices: scalar, int
+            number of slices
+        seeds: scalar, int
+            number of seeds
+
+        Return
+        ------
+        bounds: numpy array 1D, int
+            first slice of every chunk, followed by n_slices
+        seed_slices: numpy array 1D, int
+            the seed (central slice) of every chunk
+    """
+    seeds = max(1, min(int(seeds), n_slices))
+    bounds = np.linspace(0, n_slices, seeds + 1).astype(np.int64)
+    return bounds, (bounds[:-1] + bounds[1:])//2
+
+def reconcileSlice(gradient_slice, neighbours, scaling, mode, isMatFile, solver, bits = 0):
+    """
+        Segment a slice with both neighboring slices as priors.
+
+        The corridor covers the paths of all neighbors plus half the fixed
+        dilation kernel (compare getCorridor), such that the shortest path
+        decides between the neighbors where they disagree.
+
+        Parameters
+        ----------
+        gradient_slice: numpy array 2D
+            preprocessed gradient slice
+        neighbours: list of tuples
+            (shortest_path, y_offset) of the neighboring slices
+        scaling: scalar
+            scaling factor of image up or downscaling
+        mode: string
+            'RPE', or 'ILM'
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        solver: string
+            'igraph', 'scipy' or 'sweep' (compare ShortestPath.getShortestPath)
+
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+
+        Return
+        ------
+        shortest_path: numpy array 1D
+            shortest path (empty if no path was found)
+        y_offset: scalar
+            the top row of the graph
+    """
+    width = gradient_slice.shape[1] + 2
+    rows = np.array([getPathRows(shortest_path, y_offset, width) for shortest_path, y_offset in neighbours])
+    lower = rows.min(axis = 0)
+    upper = rows.max(axis = 0)
+    margin = getCorridor(neighbours[0][0], neighbours[0][1], width, None, scaling, isMatFile)//2
+    return getCorridorPath(gradient_slice, (lower + upper)/2, (upper - lower)/2 + margin, mode, solver, bits)
+
+def repropagate(gradient_volume, paths, start, step, scaling, mode, isMatFile, solver, bits = 0):
+    """
+        Propagate a reconciled slice into its neighbors until the paths agree.
+
+        Every slice is segmented again from its (new) predecessor, until the
+        new path agrees with the existing one (AGREEMENT) or the end of the
+        volume is reached. A chunk that started from a wrong seed is thus
+        corrected, a chunk in agreement costs a single slice.
+
+        Parameters
+        ----------
+        gradient_volume: numpy array 2D/3D
+            preprocessed gradient_volume
+        paths: dict
+            (shortest_path, y_offset) of every slice, updated in place
+        start: scalar, int
+            the reconciled slice
+        step: scalar, int
+            direction of propagation (-1 or 1)
+        scaling: scalar
+            scaling factor of image up or downscaling
+        mode: string
+            'RPE', or 'ILM'
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        solver: string
+            'igraph', 'scipy' or 'sweep' (compare ShortestPath.getShortestPath)
+
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+    """
+    width = gradient_volume[start].shape[1] + 2
+    shortest_path, y_offset = paths[start]
+    displacement = None
+    i = start + step
+    while 0 <= i < len(gradient_volume):
+        shortest_path, y_offset, displacement = propagateSlice(gradient_volume[i], shortest_path, y_offset, displacement, scaling, mode, isMatFile, solver, bits)
+        deviation = np.abs(getPathRows(shortest_path, y_offset, width) - getPathRows(paths[i][0], paths[i][1], width)).max()
+        paths[i] = (shortest_path, y_offset)
+        if deviation <= AGREEMENT:
+            break
+        i += step
+
+def execute_seeds(oct_volume, gradient_volume, scaling, mode, dictParameters, isMatFile, seeds, solver = None, executor = None):
+    """
+        Execute Graph-Cut algorithm from several seed slices.
+
+        The volume is split into one chunk per seed. The central slice of
+        every chunk is segmented with the band of the initial slice, then
+        the segmentation is propagated up and down within the chunk. All
+        chains run in parallel (compare runChains), so the critical path is
+        half the chunk length instead of half the volume length. Where two
+        chunks meet, both boundary slices are segmented again with both
+        neighbors as priors (compare reconcileSlice) and propagated into
+        the chunks until the paths agree (compare repropagate).
+
+        Parameters
+        ----------
+        oct_volume: numpy array 2D/3D
+            list of original volume slices for inpainting the results
+        gradient_volume: numpy array 2D/3D
+            preprocessed gradient_volume
+        scaling: scalar
+            scale factor for image down or upscaling
+        mode = string
+            mode ='RPE' segments RPE, 'ILM' the inner limiting membrane
+        dictParameters: dictionary
+            Parameters from parameters.txt
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        seeds: scalar, int
+            number of seed slices
+        solver: string, optional
+            shortest path solver: 'igraph', 'scipy' or 'sweep' (compare
+            ShortestPath.getShortestPath), default: GRAPHCUT_SOLVER of parameters.txt
+        executor: string, optional
+            'thread' or 'process' (compare runChains), default: AUTO_EXECUTOR
+            of parameters.txt
+        Return
+        ------
+        result: numpy array 2D/3D
+            resulting segmented volume
+
+    """
+    if solver is None:
+        solver = dictParameters.get('GRAPHCUT_SOLVER', 'igraph')
+    if executor is None:
+        executor = dictParameters.get('AUTO_EXECUTOR', 'thread')
+    bits = dictParameters.get('WEIGHT_BITS', 0)
+    n_slices = len(gradient_volume)
+
+    #seed slices and chains
+    bounds, seed_slices = getChunks(n_slices, seeds)
+    paths = {}
+    chains = []
+    for start, end, seed in zip(bounds[:-1], bounds[1:], seed_slices):
+        shortest_path, y_offset = getInitialPath(gradient_volume[seed], scaling, mode, isMatFile, solver, bits)
+        paths[seed] = (shortest_path, y_offset)
+        chains.append((range(seed - 1, start - 1, -1), shortest_path, y_offset))
+        chains.append((range(seed + 1, end), shortest_path, y_offset))
+
+    for slices, (chain_paths, y_offsets) in runChains(gradient_volume, chains, scaling, mode, isMatFile, solver, bits, executor):
+        paths.update(zip(slices, zip(chain_paths, y_offsets)))
+
+    #reconcile the slices where two chunks meet
+    for boundary in bounds[1:-1]:
+        for i in (boundary - 1, boundary):
+            neighbours = [paths[j] for j in (i - 1, i + 1) if 0 <= j < n_slices]
+            shortest_path, y_offset = reconcileSlice(gradient_volume[i], neighbours, scaling, mode, isMatFile, solver, bits)
+            if shortest_path.size != 0:
+                paths[i] = (shortest_path, y_offset)
+        repropagate(gradient_volume, paths, boundary - 1, -1, scaling, mode, isMatFile, solver, bits)
+        repropagate(gradient_volume, paths, boundary, 1, scaling, mode, isMatFile, solver, bits)
+
+    result = np.zeros((len(oct_volume),oct_volume[0].shape[0], oct_volume[0].shape[1]), dtype = "uint8")
+    for i, (shortest_path, y_offset) in paths.items():
+        result[i] = inpaint(oct_volume[i], shortest_path, y_offset, mode, dictParameters)
+    return result
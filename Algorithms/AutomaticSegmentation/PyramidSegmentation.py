@@ -0,0 +1,206 @@
+"""
+PyramidSegmentation: Coarse-to-fine Graph-Cut execution
+-----------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+import cv2
+import Algorithms.AutomaticSegmentation.BuildRPEGraph as gm_rpe
+import Algorithms.AutomaticSegmentation.BuildILMGraph as gm_vitnfl
+from Algorithms.AutomaticSegmentation.GraphCutSegmentation import execute_graphcut
+from Algorithms.AutomaticSegmentation.InpaintSegmentation import inpaint
+from Algorithms.GraphCut import ShortestPath
+from Algorithms.GraphCut.EdgeStencil import getStencilWeights, NEIGHBORHOOD_3
+
+#half width of the full resolution corridor in coarse pixels
+CORRIDOR_RADIUS = 3
+
+def downsampleVolume(volume, factor):
+    """
+        Downsample every slice of a volume (area averaging).
+
+        Parameters
+        ----------
+        volume: numpy array 3D or list of 2D arrays
+            the slices
+        factor: scalar, int
+            downsampling factor of rows and columns
+
+        Return
+        ------
+        coarse_volume: list of numpy arrays 2D
+            the downsampled slices
+    """
+    return [cv2.resize(vol_slice, (vol_slice.shape[1]//factor, vol_slice.shape[0]//factor), interpolation = cv2.INTER_AREA) for vol_slice in volume]
+
+def upsampleSurface(coarse_segmentation, value, factor, width):
+    """
+        Upsample the surface of a coarse segmentation slice to full resolution.
+
+        The surface row of every coarse column is the mean row of the
+        segmented pixels (columns without segmentation are interpolated).
+        Pixel centers are mapped from the coarse to the full resolution grid.
+
+        Parameters
+        ----------
+        coarse_segmentation: numpy array 2D
+            inpainted segmentation of the downsampled slice
+        value: scalar, int
+            value of the segmented layer
+        factor: scalar, int
+            downsampling factor
+        width: scalar, int
+            number of columns at full resolution
+
+        Return
+        ------
+        surface: numpy array 1D, float64
+            surface row of every full resolution column
+    """
+    mask = coarse_segmentation == value
+    counts = mask.sum(axis = 0)
+    rows = (mask*np.arange(mask.shape[0])[:,None]).sum(axis = 0)
+    columns = np.flatnonzero(counts)
+    coarse_surface = rows[columns]/counts[columns]
+
+    x_coarse = (np.arange(width) + 0.5)/factor - 0.5
+    return (np.interp(x_coarse, columns, coarse_surface) + 0.5)*factor - 0.5
+
+def getCorridorBand(_slice, surface, radius):
+    """
+        Extract the weight band of a corridor around a surface.
+
+        Pixels further than radius rows from the surface are set to np.nan,
+        pixels with zero weight stay valid (compare the predecessor bands of
+        getRPEBand and getILMBand). A column is added at the left (-2) and
+        right (+2) border for start and end points.
+
+        Parameters
+        ----------
+        _slice: ndarray
+            weight slice
+        surface: ndarray
+            surface row of every column
+        radius: scalar, int or ndarray
+            half width of the corridor (per column)
+
+        Returns
+        ---------
+        band: ndarray
+            the weight band including border columns
+        y_offset:
+            the top row of the band
+    """
+    y_offset = max(int(np.floor(np.min(surface - radius))), 0)
+    end = min(int(np.ceil(np.max(surface + radius))) + 1, _slice.shape[0])
+
+    slice_buffer = _slice[y_offset:end]
+    inside = np.abs(np.arange(y_offset, end)[:,None] - surface[None,:]) <= radius
+    band = np.where(inside | (slice_buffer == 0), slice_buffer, np.nan)
+    band = cv2.copyMakeBorder(cv2.copyMakeBorder(band, top=0,bottom=0, left=0, right=1, borderType= cv2.BORDER_CONSTANT, value =  2.0), top=0,bottom=0, left=1, right=0, borderType= cv2.BORDER_CONSTANT, value = -2.0)
+    return band, y_offset
+
+def getCorridorPath(gradient_slice, surface, radius, mode, solver, bits = 0):
+    """
+        Calculate the shortest path through the corridor graph of a slice.
+
+        Parameters
+        ----------
+        gradient_slice: numpy array 2D
+            preprocessed gradient slice
+        surface: ndarray
+            upsampled surface row of every column
+        radius: scalar, int or ndarray
+            half width of the corridor (per column)
+        mode: string
+            'RPE', or 'ILM'
+        solver: string
+            'igraph', 'scipy' or 'sweep' (compare ShortestPath.getShortestPath)
+
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+
+        Return
+        ------
+        shortest_path: numpy array 1D
+            shortest path (empty if no path was found)
+        y_offset: scalar
+            the top row of the graph
+    """
+    band, y_offset = getCorridorBand(gradient_slice, surface, radius)
+    if mode == 'RPE':
+        #weights of a slice with predecessor
+        weights = getStencilWeights(band, NEIGHBORHOOD_3, lambda v_i, v_j: gm_rpe.calculateExpWeights(v_i, v_j, surface, bits))
+    else:
+        weights = getStencilWeights(band, NEIGHBORHOOD_3, lambda v_i, v_j: gm_vitnfl.calculateWeights(v_i, v_j, bits))
+    return ShortestPath.getShortestPath(weights, NEIGHBORHOOD_3, solver), y_offset
+
+def execute_pyramid(oct_volume, gradient_volume, scaling, mode, dictParameters, isMatFile, factor, solver = None):
+    """
+        Execute Graph-Cut algorithm coarse-to-fine.
+
+        The layer is segmented on the downsampled gradient volume by
+        execute_graphcut (band offsets and kernels are rescaled by
+        scaling/factor). The coarse surfaces are upsampled and every slice
+        is segmented again at full resolution, restricted to a corridor of
+        CORRIDOR_RADIUS coarse pixels around the upsampled surface. If the
+        corridor contains no path, the upsampled surface is inpainted.
+
+        Parameters
+        ----------
+        oct_volume: numpy array 2D/3D
+            list of original volume slices for inpainting the results
+        gradient_volume: numpy array 2D/3D
+            preprocessed gradient_volume
+        scaling: scalar
+            scale factor for image down or upscaling
+        mode = string
+            mode ='RPE' segments RPE, 'ILM' the inner limiting membrane
+        dictParameters: dictionary
+            Parameters from parameters.txt
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        factor: scalar, int
+            downsampling factor of the coarse level (e.g. 2 or 4)
+        solver: string, optional
+            shortest path solver: 'igraph', 'scipy' or 'sweep' (compare
+            ShortestPath.getShortestPath), default: GRAPHCUT_SOLVER of parameters.txt
+        Return
+        ------
+        result: numpy array 2D/3D
+            resulting segmented volume
+
+    """
+    if solver is None:
+        solver = dictParameters.get('GRAPHCUT_SOLVER', 'igraph')
+    value = dictParameters['RPE_VALUE'] if mode == 'RPE' else dictParameters['ILM_VALUE']
+
+    #coarse level
+    coarse_volume = downsampleVolume(gradient_volume, factor)
+    coarse_result = execute_graphcut(coarse_volume, coarse_volume, scaling/factor, mode, dictParameters, isMatFile, solver)
+
+    #full resolution corridors
+    result = np.zeros((len(oct_volume),oct_volume[0].shape[0], oct_volume[0].shape[1]), dtype = "uint8")
+    radius = CORRIDOR_RADIUS*factor
+    columns = np.arange(oct_volume[0].shape[1])
+    for i in range(len(gradient_volume)):
+        surface = upsampleSurface(coarse_result[i], value, factor, oct_volume[i].shape[1])
+        shortest_path, y_offset = getCorridorPath(gradient_volume[i], surface, radius, mode, solver, dictParameters.get('WEIGHT_BITS', 0))
+        if shortest_path.size == 0:
+            rows = np.clip(np.round(surface).astype(np.int32), 0, result.shape[1] - 1)
+            result[i, rows, columns] = value
+            continue
+        result[i] = inpaint(oct_volume[i], shortest_path, y_offset, mode, dictParameters)
+
+    return result
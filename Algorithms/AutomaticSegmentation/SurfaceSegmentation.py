@@ -0,0 +1,212 @@
+"""
+SurfaceSegmentation: Volumetric optimal-surface Graph-Cut execution
+-----------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+from scipy.sparse import csgraph, csr_matrix
+import Algorithms.AutomaticSegmentation.BuildRPEGraph as gm_rpe
+import Algorithms.AutomaticSegmentation.BuildILMGraph as gm_vitnfl
+
+#maximum row change of the surface between neighboring columns (DELTA_X) and slices (DELTA_Z) at scaling 1
+DELTA_X = 2
+DELTA_Z = 2
+#number of slices solved together and number of slices shared by neighboring slabs
+SLAB_SIZE = 16
+SLAB_OVERLAP = 4
+#maximum number of integer capacity steps per unit of cost
+MAX_SCALE = 1000
+#cost of dark pixels (the Graph-Cut weight exp(6) slows down the maximum flow)
+DARK_COST = np.exp(3.0)
+
+def getSurfaceCosts(gradient_volume, scaling, mode, isMatFile, bits = 0):
+    """
+        Calculate the cost of every pixel of the search region of the surface.
+
+        The search region is the band of the initial slice of the
+        propagation engine (compare getRPEBand and getILMBand). The cost of
+        a pixel is the weight of an edge between two pixels of its intensity
+        (compare calculateExpWeights and calculateWeights), limited to
+        DARK_COST. As every column contains exactly one surface pixel, the
+        limit still excludes dark pixels wherever possible.
+
+        Parameters
+        ----------
+        gradient_volume: numpy array 2D/3D
+            preprocessed gradient_volume
+        scaling: scalar
+            scale factor for image down or upscaling
+        mode: string
+            'RPE', or 'ILM'
+        isMatFile: boolean
+            true if mat file, false if tiff file
+
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+
+        Return
+        ------
+        costs: numpy array 3D, float64, (slices, columns, rows)
+            the pixel costs (columns first)
+        y_offset: scalar
+            the top row of the search region
+    """
+    costs = []
+    for gradient_slice in gradient_volume:
+        if mode == 'RPE':
+            band, y_offset = gm_rpe.getRPEBand(gradient_slice, scaling, None, None, isMatFile)
+            band = band[:,1:-1]
+            costs.append(gm_rpe.calculateExpWeights(band, band, None, bits).T)
+        else:
+            band, y_offset = gm_vitnfl.getILMBand(gradient_slice, scaling, None, None, isMatFile)
+            band = band[:,1:-1]
+            costs.append(gm_vitnfl.calculateWeights(band, band, bits).T)
+    return np.minimum(np.asarray(costs, dtype = np.float64), DARK_COST), y_offset
+
+def getSurface(costs, delta_x, delta_z):
+    """
+        Find the optimal surface of a slab by a single minimum s-t cut.
+
+        Optimal-surface graph (Li et al., 2006): every column (slice z,
+        column x) is a chain of vertices ordered from the bottom row
+        upwards. The weight of a vertex is the difference of its cost and
+        the cost of the vertex beneath, so the weight of the lowest k+1
+        vertices of a column is the cost of row k. Infinite arcs enforce
+        that a vertex is only selected with the vertices beneath it and that
+        the surface changes by at most delta_x (delta_z) rows between
+        neighboring columns (slices). The minimum closed set, i.e. the source
+        set of the minimum s-t cut, is the region beneath the surface of
+        minimum total cost.
+
+        The maximum flow (scipy.sparse.csgraph.maximum_flow, Dinic) needs
+        integer capacities: the costs are rounded to multiples of 1/scale
+        (scale <= MAX_SCALE, such that all capacities fit into int32), so
+        the cost of the surface of a column deviates by at most 0.5/scale.
+
+        Parameters
+        ----------
+        costs: numpy array 3D, float64, (slices, columns, rows)
+            the pixel costs
+        delta_x: scalar, int
+            maximum row change between neighboring columns
+        delta_z: scalar, int
+            maximum row change between neighboring slices
+
+        Return
+        ------
+        surface: numpy array 2D, int, (slices, columns)
+            the row (index of the search region) of the surface
+    """
+    n_slices, n_columns, n_rows = costs.shape
+    size = costs.size
+    #index 0: bottom row
+    costs = costs[:,:,::-1]
+    total = np.abs(np.diff(costs, axis = 2)).sum() + 2*np.abs(costs[:,:,0]).sum()
+    scale = min(MAX_SCALE, (2**30 - 1)/(total + 1.0))
+    weights = np.diff(np.rint(costs*scale).astype(np.int64), axis = 2, prepend = 0)
+    #bottom vertices are selected all or none -> a negative sum favours a non-empty set
+    weights[:,:,0] -= weights[:,:,0].sum()//(n_slices*n_columns) + 1
+    infinity = np.abs(weights).sum() + 1
+
+    ids = np.arange(size).reshape(costs.shape)
+    heights = np.arange(n_rows)
+    edges = [np.column_stack((ids[:,:,1:].ravel(), ids[:,:,:-1].ravel()))]
+    for delta, axis in ((delta_x, 1), (delta_z, 0)):
+        if costs.shape[axis] < 2:
+            continue
+        lower = np.maximum(heights - delta, 0)
+        a = np.take(ids, np.arange(costs.shape[axis] - 1), axis = axis)
+        b = np.take(ids, np.arange(1, costs.shape[axis]), axis = axis)
+        edges.append(np.column_stack((a.ravel(), b[...,lower].ravel())))
+        edges.append(np.column_stack((b.ravel(), a[...,lower].ravel())))
+    n_inner = sum(e.shape[0] for e in edges)
+
+    #terminal arcs: source = size, sink = size + 1
+    weights = weights.ravel()
+    negative = np.flatnonzero(weights < 0)
+    positive = np.flatnonzero(weights > 0)
+    edges.append(np.column_stack((np.full(negative.size, size), negative)))
+    edges.append(np.column_stack((positive, np.full(positive.size, size + 1))))
+    edges = np.concatenate(edges)
+    capacity = np.concatenate((np.full(n_inner, infinity), -weights[negative], weights[positive])).astype(np.int32)
+
+    graph = csr_matrix((capacity, (edges[:,0], edges[:,1])), shape = (size + 2, size + 2))
+    flow = csgraph.maximum_flow(graph, size, size + 1, method = 'dinic').flow
+    #source set: vertices reachable in the residual graph
+    residual = graph - flow
+    residual.data = (residual.data > 0).astype(np.int8)
+    residual.eliminate_zeros()
+    selected = np.zeros(size + 2, dtype = bool)
+    selected[csgraph.breadth_first_order(residual, size, return_predecessors = False)] = True
+
+    #the number of selected vertices of a column is its surface height + 1
+    height = selected[:size].reshape(costs.shape).sum(axis = 2) - 1
+    return n_rows - 1 - np.clip(height, 0, n_rows - 1)
+
+def execute_surface(oct_volume, gradient_volume, scaling, mode, dictParameters, isMatFile):
+    """
+        Execute the volumetric optimal-surface Graph-Cut algorithm.
+
+        Alternative to the slice-by-slice propagation of execute_graphcut:
+        the surface is found by one global minimum cut per slab of
+        SLAB_SIZE slices. Neighboring slabs share SLAB_OVERLAP slices, each
+        slab contributes the slices closer to its own center, which bounds
+        the memory independent of the number of slices.
+
+        Parameters
+        ----------
+        oct_volume: numpy array 2D/3D
+            list of original volume slices for inpainting the results
+        gradient_volume: numpy array 2D/3D
+            preprocessed gradient_volume
+        scaling: scalar
+            scale factor for image down or upscaling
+        mode = string
+            mode ='RPE' segments RPE, 'ILM' the inner limiting membrane
+        dictParameters: dictionary
+            Parameters from parameters.txt
+        isMatFile: boolean
+            true if mat file, false if tiff file
+        Return
+        ------
+        result: numpy array 2D/3D
+            resulting segmented volume
+
+    """
+    value = dictParameters['RPE_VALUE'] if mode == 'RPE' else dictParameters['ILM_VALUE']
+    delta_x = max(int(DELTA_X*scaling),1)
+    delta_z = max(int(DELTA_Z*scaling),1)
+
+    result = np.zeros((len(oct_volume),oct_volume[0].shape[0], oct_volume[0].shape[1]), dtype = "uint8")
+    columns = np.arange(result.shape[2])
+    n_slices = len(gradient_volume)
+    step = max(SLAB_SIZE - SLAB_OVERLAP, 1)
+
+    start = 0
+    while True:
+        end = min(start + SLAB_SIZE, n_slices)
+        costs, y_offset = getSurfaceCosts(gradient_volume[start:end], scaling, mode, isMatFile, dictParameters.get('WEIGHT_BITS', 0))
+        surface = getSurface(costs, delta_x, delta_z) + y_offset
+
+        #keep the slices closer to the center of this slab
+        keep_from = start if start == 0 else start + SLAB_OVERLAP//2
+        keep_to = end if end == n_slices else end - SLAB_OVERLAP//2
+        for i in range(keep_from, keep_to):
+            result[i, surface[i - start], columns] = value
+
+        if end == n_slices:
+            break
+        start += step
+
+    return result
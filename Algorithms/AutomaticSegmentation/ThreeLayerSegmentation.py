@@ -15,10 +15,16 @@ PRLEC Framework for OCT Processing and Visualization
 import numpy as np
 from skimage import io
 import os
+import multiprocessing
+import threading
 from Algorithms.AutomaticSegmentation import GraphWeights
 from Algorithms.AutomaticSegmentation import BruchsSegmentation as BMSeg
 from Algorithms.Flattening.VolumeFlattening import runFlattening, unFlatten
 from Algorithms.AutomaticSegmentation.GraphCutSegmentation import execute_graphcut
+from Algorithms.AutomaticSegmentation.PyramidSegmentation import execute_pyramid
+from Algorithms.AutomaticSegmentation.MultiSeedSegmentation import execute_seeds
+from Algorithms.AutomaticSegmentation.SurfaceSegmentation import execute_surface
+from Algorithms.GraphCut.MemoryBudget import StageMemory
 from FileHandler.ParameterReader import readThreeLayerDict
 
 class LayerSegmentation:
@@ -30,8 +36,16 @@ class LayerSegmentation:
         prior slice is used as input for the next slice, such that the resulting 
         surface is smooth and accurate. The exponential weights are derived from 
         the smoothed gradient images. 
+        
+        In memory budget mode (MEMORY_BUDGET of parameters.txt), the volume 
+        is flattened in place, the weights are streamed where the engine 
+        allows it and not cached, ILM and RPE are segmented one after the 
+        other, the volume is released once both are segmented and the peak 
+        memory of every stage is reported (MEMORY_TRACE: traced with 
+        tracemalloc, slow, instead of sampled). Streamed weights are 
+        reported together with the Graph-Cut.
     """
-    def __init__(self, volume, isMatFile, scaling = 1, flattening_factor = 4, statusText=""):
+    def __init__(self, volume, isMatFile, scaling = 1, flattening_factor = 4, statusText="", pyramid_factor = None):
         """
             Initializing
             
@@ -45,28 +59,61 @@ class LayerSegmentation:
             Optional
             -----------
             scaling: scalar, float
-                up/downscaling factor 
+                up/downscaling factor (rescales band offsets and kernel sizes)
             flattening_factor: scalar, int
                 polynomial degree for flattening
             statusText: string variable StringVar()
                 Used to track progress in GUI
+            pyramid_factor: scalar, int
+                downsampling factor of the coarse-to-fine mode (1: full 
+                resolution only, 2 or 4: segmentation of the downsampled 
+                volume refined in a corridor at full resolution), 
+                default: AUTO_PYRAMID of parameters.txt
             
         """
         self.scaling = scaling
         self.statusText=statusText
         self.dictParameters = readThreeLayerDict()
         self.isMatFile = isMatFile
-        #set volume to 0...1
-        max_value = np.max(volume)
-        self.oct_volume = [vol_slice/max_value for vol_slice in volume]
+        self.pyramid_factor = pyramid_factor
+        if pyramid_factor is None:
+            self.pyramid_factor = self.dictParameters['AUTO_PYRAMID']
+        self.budget = self.dictParameters['MEMORY_BUDGET']
+        if self.budget:
+            self.dictParameters['CACHE_MB'] = 0
+        self.memory = StageMemory(self.budget, self.dictParameters['MEMORY_TRACE'])
+        #set volume to 0...1 (float32 copy, normalised in place)
+        with self.memory.stage('normalisation'):
+            self.oct_volume = np.array(volume, dtype = np.float32)
+            self.oct_volume /= np.max(self.oct_volume)
         #Flatten volume to RPE
+        self.setStatus("Running 3-Layer segmentation...\nFlattening Volume")
+        with self.memory.stage('flattening'):
+            self.oct_volume, self.slice_shifts = runFlattening(self.oct_volume, flattening_factor, inplace = self.budget, two_pass = self.dictParameters['FLATTEN_TWO_PASS'], workers = self.dictParameters['FILTER_WORKERS'])
+    
+    def setStatus(self, text, quiet = False):
+        """
+            Show the progress in the GUI
+            
+            Parameters
+            -----------
+            text: string
+                status message
+                
+            Optional
+            -----------
+            quiet: boolean
+                true to skip the update (e.g. from a worker thread the GUI waits for)
+                
+        """
+        if quiet:
+            return
         try:
-            self.statusText.set("Running 3-Layer segmentation...\nFlattening Volume")
-        except: 
+            self.statusText.set(text)
+        except:
             pass
-        self.oct_volume, self.slice_shifts = runFlattening(self.oct_volume, flattening_factor)
         
-    def run(self, mode):
+    def run(self, mode, engine = None, quiet = False):
         """
             Running segmentation
             
@@ -75,35 +122,64 @@ class LayerSegmentation:
             mode: string 
                 'ILM' or 'RPE'
                 
+            Optional
+            -----------
+            engine: string
+                'propagation' (slice-by-slice Graph-Cut) or 'surface' 
+                (volumetric optimal surface), default: AUTO_ENGINE of parameters.txt
+            quiet: boolean
+                true to run without status updates (compare setStatus)
+                
         """
+        if engine is None:
+            engine = self.dictParameters['AUTO_ENGINE']
+        smoothed = None
         try:
             #Preprocessing volume for GraphCut: Gradient calculation and smoothing
-            try:
-                self.statusText.set("Running 3-Layer segmentation...\nCalculating Graph Weights of "+mode)
-            except:
-                pass
-            smoothed = GraphWeights.runWeightCalculation(self.oct_volume, mode, self.dictParameters,self.isMatFile)
+            self.setStatus("Running 3-Layer segmentation...\nCalculating Graph Weights of "+mode, quiet)
+            #streaming for the slice-by-slice propagation in threads (every slice is read once, center outwards)
+            #and filters of a finite support (tiles)
+            streaming = (self.dictParameters['AUTO_STREAMING'] or self.budget) and engine != 'surface' and self.pyramid_factor <= 1 and self.dictParameters['AUTO_SEEDS'] <= 1 and self.dictParameters['AUTO_EXECUTOR'] != 'process' and self.dictParameters['AUTO_FILTER'] in ('bilateral', 'guided')
+            if not streaming:
+                with self.memory.stage('weights ' + mode):
+                    smoothed = GraphWeights.runWeightCalculation(self.oct_volume, mode, self.dictParameters,self.isMatFile)
 
             #execute graph cut
-            try:
-                self.statusText.set("Running 3-Layer segmentation...\nExecuting GraphCut of "+mode)
-            except:
-                pass
-            result = execute_graphcut(self.oct_volume, smoothed, self.scaling, mode, self.dictParameters,self.isMatFile)
+            self.setStatus("Running 3-Layer segmentation...\nExecuting GraphCut of "+mode, quiet)
+            #streamed weights are calculated while the propagation runs: one stage of the report
+            with self.memory.stage(('weights+graphcut ' if streaming else 'graphcut ') + mode):
+                if streaming:
+                    smoothed = GraphWeights.WeightStream(self.oct_volume, mode, self.dictParameters,self.isMatFile)
+                if engine == 'surface':
+                    result = execute_surface(self.oct_volume, smoothed, self.scaling, mode, self.dictParameters,self.isMatFile)
+                elif self.pyramid_factor > 1:
+                    result = execute_pyramid(self.oct_volume, smoothed, self.scaling, mode, self.dictParameters,self.isMatFile, self.pyramid_factor)
+                elif self.dictParameters['AUTO_SEEDS'] > 1:
+                    result = execute_seeds(self.oct_volume, smoothed, self.scaling, mode, self.dictParameters,self.isMatFile, self.dictParameters['AUTO_SEEDS'])
+                else:
+                    result = execute_graphcut(self.oct_volume, smoothed, self.scaling, mode, self.dictParameters,self.isMatFile)
+                if streaming:
+                    smoothed.close()
+                smoothed = None
+            if self.budget and mode == 'RPE' and hasattr(self, 'ilm_result'):
+                #Bruch's membrane only needs the segmentation
+                self.oct_volume = None
 
             if mode is 'RPE':
                 #Approximate BM from RPE
-                try:
-                    self.statusText.set("Running 3-Layer segmentation...\nCalculating Bruch's Membrane")
-                except:
-                    pass
-                self.bm_result = BMSeg.calculate_bruchs(result, self.dictParameters)
+                self.setStatus("Running 3-Layer segmentation...\nCalculating Bruch's Membrane", quiet)
+                with self.memory.stage('bruchs'):
+                    self.bm_result = BMSeg.calculate_bruchs(result, self.dictParameters)
             elif mode is 'ILM':
                 #set ILM result
-                self.ilm_result = result.copy()
+                self.ilm_result = result
 
         except Exception as e:
             print('Failed', e)
+        finally:
+            #stop the weight producer if the propagation failed
+            if isinstance(smoothed, GraphWeights.WeightStream):
+                smoothed.close()
         
     def getResult(self):
         """
@@ -117,24 +193,45 @@ class LayerSegmentation:
         """
         return np.maximum(self.bm_result, self.ilm_result)
     
-    def runPipeline(self):
+    def runPipeline(self, concurrent = None):
         """
             Running pipeline for all layers
             
+            Optional
+            -----------
+            concurrent: boolean
+                true to segment ILM and RPE (followed by BM) at the same time 
+                in two threads, default: AUTO_CONCURRENT of parameters.txt 
+                (false in memory budget mode)
+            
             Returns
             -----------
             result: ndarray 
                 final three layer segmentation
                 
         """
-        #run ILM segmentation
-        self.run('ILM')
-        #run RPE and BM segmentation
-        self.run('RPE')
+        if concurrent is None:
+            concurrent = self.dictParameters['AUTO_CONCURRENT'] and not self.budget
+        if concurrent:
+            self.setStatus("Running 3-Layer segmentation...\nSegmenting ILM and RPE")
+            #the GUI waits for the threads - status updates from the threads would block
+            threads = [threading.Thread(target = self.run, args = (mode, None, True)) for mode in ('ILM', 'RPE')]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            #run ILM segmentation
+            self.run('ILM')
+            #run RPE and BM segmentation
+            self.run('RPE')
         #catch result
-        result = self.getResult().astype('uint8')
-        #unFlatten result and return it
-        result = unFlatten(result,self.slice_shifts)
+        with self.memory.stage('unflattening'):
+            result = self.getResult().astype('uint8', copy = False)
+            #unFlatten result and return it
+            result = unFlatten(result,self.slice_shifts)
+        if self.budget:
+            print(self.memory.report())
         return result
 
 '''
@@ -159,6 +256,8 @@ Processing C:/tmp/patient5/merged_structural.tiff
 
 if __name__ == '__main__':
     
+    multiprocessing.freeze_support()
+    
     #define please
     isMatFile = False
     
@@ -0,0 +1,204 @@
+"""
+FlattenedVolume: Lazy flattened RGB view of an OCT volume for the GUI planes
+-------------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+from collections import OrderedDict
+import numpy as np
+from Algorithms.Flattening.ShiftField import applyShifts, shiftSlice
+
+#number of planes kept in the cache of a view
+CACHE_PLANES = 8
+
+def getDisplayPlane(plane):
+    """
+        RGB display plane of a volume plane (compare ImportHandler.getOriginalRGBVolume).
+
+        Parameters
+        ----------
+        plane: numpy array 2D
+            plane of the original volume (16 bit range)
+
+        Return
+        ------
+        plane_rgb: numpy array 3D, uint8
+            the plane with three equal channels
+    """
+    plane = (255*np.asarray(plane)/65535.0).astype('uint8')
+    return np.repeat(plane[:,:,None], 3, axis = 2)
+
+class FlattenedVolume:
+    """
+        Flattened RGB display volume computed on demand.
+
+        Behaves like the array of ImportHandler.getOriginalRGBVolume of the
+        flattened volume (rows, slices, columns, 3) for the accesses of the
+        GUI: shape, indexing of single planes and np.swapaxes. Only the
+        original volume and the shift of every A-scan are held, a plane is
+        shifted and converted when requested and kept in a small cache
+        shared by all swapped views. Creating a view does not copy the
+        volume, so (re)setting the flattening does not depend on its size.
+    """
+    def __init__(self, volume_original, shiftedValues = None, planes = CACHE_PLANES):
+        """
+            Initializing
+
+            Parameters
+            ----------
+            volume_original: numpy array 3D
+                the original volume (slices, rows, columns), not copied
+
+            Optional
+            ----------
+            shiftedValues: numpy array 2D, int
+                shift of every A-scan (slices, columns), flattens with
+                the sign of applyShifts (None: not flattened)
+            planes: scalar, int
+                number of cached planes
+        """
+        self.volume_original = volume_original
+        if shiftedValues is not None:
+            shiftedValues = np.asarray(shiftedValues, dtype = np.intp)
+            if not shiftedValues.any():
+                shiftedValues = None
+        self.shiftedValues = shiftedValues
+        #axes of the view in the order of the display volume (rows, slices, columns, channels)
+        self.axes = (0, 1, 2, 3)
+        n_slices, n_rows, n_columns = volume_original.shape
+        self.base_shape = (n_rows, n_slices, n_columns, 3)
+        self.cache = OrderedDict()
+        self.planes = planes
+
+    @property
+    def shape(self):
+        return tuple(self.base_shape[axis] for axis in self.axes)
+
+    @property
+    def ndim(self):
+        return 4
+
+    @property
+    def dtype(self):
+        return np.dtype('uint8')
+
+    def __len__(self):
+        return self.shape[0]
+
+    def swapaxes(self, axis1, axis2):
+        """
+            View with two axes swapped (called by np.swapaxes).
+
+            Parameters
+            ----------
+            axis1: scalar, int
+                first axis
+            axis2: scalar, int
+                second axis
+
+            Return
+            ------
+            view: FlattenedVolume
+                view of the same volume, sharing the cache
+        """
+        axes = list(self.axes)
+        axes[axis1], axes[axis2] = axes[axis2], axes[axis1]
+        view = object.__new__(FlattenedVolume)
+        view.__dict__.update(self.__dict__)
+        view.axes = tuple(axes)
+        return view
+
+    def getPlane(self, axis, index):
+        """
+            Plane of the display volume (cached).
+
+            Parameters
+            ----------
+            axis: scalar, int
+                axis of the display volume (0: en-face, 1: B-scan, 2: YZ plane)
+            index: scalar, int
+                index of the plane
+
+            Return
+            ------
+            plane: numpy array 3D, uint8
+                the plane, remaining axes in the order of the display volume
+        """
+        key = (axis, index)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        volume, shifts = self.volume_original, self.shiftedValues
+        n_slices, n_rows, n_columns = volume.shape
+        if axis == 0:
+            #row index of every A-scan: row y is taken from row (y - shift) mod rows
+            if shifts is None:
+                plane = volume[:,index,:]
+            else:
+                rows = (index - shifts) % n_rows
+                plane = volume[np.arange(n_slices)[:,None], rows, np.arange(n_columns)[None,:]]
+        elif axis == 1:
+            plane = volume[index] if shifts is None else shiftSlice(volume[index], shifts[index])
+        elif axis == 2:
+            if shifts is None:
+                plane = volume[:,:,index].T
+            else:
+                rows = (np.arange(n_rows)[:,None] - shifts[:,index][None,:]) % n_rows
+                plane = volume[np.arange(n_slices)[None,:], rows, index]
+        else:
+            raise IndexError('planes are available along the spatial axes only')
+        plane = getDisplayPlane(plane)
+        plane.setflags(write = False)
+        self.cache[key] = plane
+        while len(self.cache) > self.planes:
+            self.cache.popitem(last = False)
+        return plane
+
+    def __getitem__(self, index):
+        """
+            Indexing like the display array (first index int: one plane on demand).
+        """
+        rest = ()
+        if isinstance(index, tuple):
+            index, rest = index[0], index[1:]
+        if isinstance(index, (int, np.integer)):
+            n = self.shape[0]
+            if not -n <= index < n:
+                raise IndexError('index ' + str(index) + ' is out of bounds for axis 0 with size ' + str(n))
+            axis = self.axes[0]
+            plane = self.getPlane(axis, int(index) % n)
+            #order of the remaining axes of the view
+            remaining = [a for a in range(4) if a != axis]
+            plane = plane.transpose([remaining.index(a) for a in self.axes[1:]])
+            return plane[rest] if rest else plane
+        #sub-block: stack the planes
+        indices = range(self.shape[0])[index]
+        block = np.stack([self[int(i)] for i in indices]) if len(indices) else np.empty((0,) + self.shape[1:], dtype = self.dtype)
+        return block[(slice(None),) + rest] if rest else block
+
+    def __array__(self, dtype = None, copy = None):
+        """
+            Complete display array (materializes the view).
+        """
+        volume = self.volume_original
+        if self.shiftedValues is not None:
+            volume = applyShifts(volume, self.shiftedValues)
+        result = np.empty(self.base_shape, dtype = 'uint8')
+        for z in range(volume.shape[0]):
+            result[:,z] = getDisplayPlane(volume[z])
+        result = result.transpose(self.axes)
+        return result if dtype is None else result.astype(dtype)
+
+    def copy(self):
+        """
+            Complete display array (compare ndarray.copy).
+        """
+        return np.ascontiguousarray(np.asarray(self))
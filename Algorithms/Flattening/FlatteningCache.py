@@ -0,0 +1,119 @@
+"""
+FlatteningCache: Cache of flattening shift maps in memory and on disk
+------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import numpy as np
+from Algorithms.GraphCut.PreprocessingCache import getFingerprint
+
+#number of shift maps kept in memory
+CACHE_ENTRIES = 32
+#file name of a shift map stored next to the volume (Parameters.txt: FLATTEN_CACHE_DISK)
+DISK_NAME = 'flattening_%s.npy'
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+def getKey(stage, volume, *values):
+    """
+        Key of a shift map.
+
+        Parameters
+        ----------
+        stage: string
+            name of the flattening (e.g. 'rpe', 'slowscan')
+        volume: numpy array 3D or list of 2D arrays
+            the volume the shifts are computed from
+        values:
+            all parameters the shifts depend on (degree, sigma, ...)
+
+        Returns
+        ---------
+        key: tuple
+            stage name, fingerprint of the volume and parameters
+    """
+    return (stage, getFingerprint(volume)) + tuple(values)
+
+def getDiskPath(key, directory):
+    """
+        File of a shift map on disk.
+
+        Parameters
+        ----------
+        key: tuple
+            key of the shift map (compare getKey)
+        directory: string
+            directory of the volume
+
+        Returns
+        ---------
+        path: string
+            the file path
+    """
+    return os.path.join(directory, DISK_NAME % hashlib.sha1(repr(key).encode()).hexdigest()[:16])
+
+def clearCache():
+    """
+        Remove all shift maps held in memory.
+    """
+    with _lock:
+        _entries.clear()
+
+def getShifts(key, compute, directory = None):
+    """
+        Look up a shift map in memory and on disk, compute and store it if missing.
+
+        Parameters
+        ----------
+        key: tuple
+            key of the shift map (compare getKey)
+        compute: function
+            computes the shift map (slices, columns) without arguments
+
+        Optional
+        ----------
+        directory: string
+            directory of the volume to read and write the shift map
+            (None: memory only)
+
+        Returns
+        ---------
+        shifts: numpy array 2D, int32
+            the shift map (a copy, may be changed by the caller)
+    """
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+            return _entries[key].copy()
+    shifts = None
+    path = getDiskPath(key, directory) if directory else None
+    if path and os.path.isfile(path):
+        try:
+            shifts = np.load(path)
+        except (OSError, ValueError) as e:
+            print('Flattening cache could not be read:\n', e)
+    if shifts is None:
+        shifts = np.asarray(compute(), dtype = np.int32)
+        if path:
+            try:
+                np.save(path, shifts)
+            except OSError as e:
+                print('Flattening cache could not be written:\n', e)
+    with _lock:
+        _entries[key] = shifts
+        while len(_entries) > CACHE_ENTRIES:
+            _entries.popitem(last = False)
+    return shifts.copy()
@@ -0,0 +1,126 @@
+"""
+PolynomialRansac: Batched RANSAC polynomial fitting of B-scan curves
+-----------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+
+#number of points of a trial fit
+MIN_SAMPLES = 200
+#number of trial fits
+MAX_TRIALS = 100
+#seed of the trial subsets (None: not deterministic)
+RANDOM_STATE = 42
+#number of curves fitted together (bounds the memory of the trial residuals)
+CHUNK_CURVES = 16
+
+def getVandermonde(x, degree, x_range):
+    """
+        Vandermonde matrix of the positions scaled to [-1, 1].
+
+        Parameters
+        ----------
+        x: ndarray
+            the positions
+        degree: scalar, int
+            degree of the polynomial
+        x_range: tuple
+            minimum and maximum position (mapped to -1 and 1)
+
+        Return
+        ------
+        vandermonde: numpy array 2D
+            powers 0 to degree of the scaled positions (positions, degree+1)
+    """
+    x_min, x_max = x_range
+    t = np.asarray(x, dtype = np.float64) - x_min
+    if x_max > x_min:
+        t = 2*t/(x_max - x_min) - 1
+    return t[:,None]**np.arange(degree + 1)
+
+def fitPolynomials(x, curves, degree, min_samples = MIN_SAMPLES, max_trials = MAX_TRIALS, random_state = RANDOM_STATE, chunk = CHUNK_CURVES):
+    """
+        RANSAC polynomial fit of many curves at once (e.g. RPE of all B-scans).
+
+        Replaces sklearn's RANSACRegressor on PolynomialFeatures per curve
+        (same defaults: residual threshold is the median absolute deviation
+        of a curve, the trial with most inliers wins, ties are resolved by
+        the smaller squared error, the inliers are refitted). All curves
+        share the positions, hence the Vandermonde matrix and the random
+        trial subsets: the pseudo-inverse of every trial is computed once
+        and applied to all curves in one product, the residuals of all
+        trials are evaluated together.
+
+        Parameters
+        ----------
+        x: ndarray 1D
+            positions of the points (e.g. columns)
+        curves: numpy array 2D
+            values of every curve at the positions (curves, positions)
+        degree: scalar, int
+            degree of the polynomial
+
+        Optional
+        ----------
+        min_samples: scalar, int
+            number of points of a trial fit (at most the number of positions)
+        max_trials: scalar, int
+            number of trial fits
+        random_state: scalar, int
+            seed of the trial subsets (None: not deterministic)
+        chunk: scalar, int
+            number of curves fitted together
+
+        Return
+        ------
+        xi: ndarray 1D
+            evenly spaced positions between min(x) and max(x)
+        yi: numpy array 2D, float
+            the fitted curves at xi (curves, positions)
+        valid: ndarray 1D, boolean
+            false if no consensus set was found for a curve
+    """
+    x = np.asarray(x).ravel()
+    curves = np.atleast_2d(np.asarray(curves, dtype = np.float64))
+    n_points = x.size
+    x_range = (x.min(), x.max())
+    xi = np.linspace(x_range[0], x_range[1], n_points)
+    vandermonde = getVandermonde(x, degree, x_range)
+    vandermonde_i = getVandermonde(xi, degree, x_range)
+
+    #random trial subsets (trials, samples), shared by all curves
+    rng = np.random.RandomState(random_state)
+    samples = min(int(min_samples), n_points)
+    subsets = np.argsort(rng.rand(max_trials, n_points), axis = 1)[:,:samples]
+    #least squares solution of every trial (trials, degree+1, samples)
+    solvers = np.linalg.pinv(vandermonde[subsets])
+
+    yi = np.empty((curves.shape[0], n_points))
+    valid = np.zeros(curves.shape[0], dtype = bool)
+    for start in range(0, curves.shape[0], max(int(chunk), 1)):
+        y = curves[start:start + chunk]
+        #median absolute deviation as residual threshold
+        threshold = np.median(np.abs(y - np.median(y, axis = 1)[:,None]), axis = 1)
+        coefficients = np.einsum('tks,cts->ctk', solvers, y[:,subsets])
+        residuals = np.abs(np.einsum('ctk,nk->ctn', coefficients, vandermonde) - y[:,None,:])
+        inliers = residuals <= threshold[:,None,None]
+        n_inliers = inliers.sum(axis = 2)
+        error = np.where(inliers, residuals**2, 0).sum(axis = 2)
+        #most inliers, then smallest error
+        error[n_inliers < n_inliers.max(axis = 1)[:,None]] = np.inf
+        best = np.argmin(error, axis = 1)
+        mask = inliers[np.arange(y.shape[0]), best]
+        #refit on the inliers (outliers weighted by zero)
+        refit = np.linalg.pinv(vandermonde[None]*mask[:,:,None]) @ (y*mask)[:,:,None]
+        yi[start:start + chunk] = (vandermonde_i @ refit)[:,:,0]
+        valid[start:start + chunk] = mask.sum(axis = 1) > degree
+    return xi, yi, valid
@@ -0,0 +1,99 @@
+"""
+ShiftField: Vectorised A-scan shifts of OCT volumes for (un)flattening
+-------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+#number of slices shifted together (bounds the memory of the buffer)
+CHUNK_SLICES = 4
+
+def shiftSlice(_slice, shifts, inverse = False):
+    """
+        Circular shift of every column of a slice by its own number of rows.
+
+        Parameters
+        ----------
+        _slice: numpy array 2D
+            the slice (rows, columns)
+        shifts: numpy array 1D, int
+            shift of every column (compare np.roll)
+
+        Optional
+        ----------
+        inverse: boolean
+            true to undo the shifts
+
+        Return
+        ------
+        result: numpy array 2D
+            the shifted slice (new array)
+    """
+    return applyShifts(_slice[None], np.asarray(shifts)[None], inverse)[0]
+
+def applyShifts(volume, shifts, inverse = False, inplace = False, out = None, chunk = CHUNK_SLICES):
+    """
+        Circular shift of every A-scan of a volume by a (slices, columns) shift map.
+
+        Replaces the loops of np.roll over all slices and columns. Column x 
+        of slice z is shifted by shifts[z][x] rows, i.e. row y is taken from
+        row (y - shifts[z][x]) mod rows. Per chunk of slices, the A-scans 
+        are copied twice in a row into a contiguous buffer (A-scans, 2*rows),
+        every shifted A-scan is then a window of this buffer, gathered in 
+        one indexing operation.
+
+        Parameters
+        ----------
+        volume: numpy array 3D or list of 2D arrays
+            the volume (slices, rows, columns)
+        shifts: numpy array 2D or list of lists, int
+            shift of every A-scan (slices, columns)
+
+        Optional
+        ----------
+        inverse: boolean
+            true to undo the shifts (shift by -shifts)
+        inplace: boolean
+            true to write the result into the volume (array or list slices)
+        out: numpy array 3D
+            buffer of the result (ignored if inplace)
+        chunk: scalar, int
+            number of slices shifted together
+
+        Return
+        ------
+        result: numpy array 3D or list of 2D arrays
+            the shifted volume (the volume if inplace, else out or a new array)
+    """
+    n_slices = len(volume)
+    n_rows, n_columns = volume[0].shape
+    shifts = np.asarray(shifts, dtype = np.intp)
+    #start of the window of every A-scan in the doubled buffer
+    starts = (shifts if inverse else -shifts) % n_rows
+    if inplace:
+        out = volume
+    elif out is None:
+        out = np.empty((n_slices, n_rows, n_columns), dtype = volume[0].dtype)
+    chunk = max(int(chunk), 1)
+    for start in range(0, n_slices, chunk):
+        end = min(start + chunk, n_slices)
+        buffer = np.empty((end - start, n_columns, 2*n_rows), dtype = volume[0].dtype)
+        for i in range(start, end):
+            buffer[i - start,:,:n_rows] = volume[i].T
+        buffer[:,:,n_rows:] = buffer[:,:,:n_rows]
+        buffer = buffer.reshape(-1, 2*n_rows)
+        windows = sliding_window_view(buffer, n_rows, axis = 1)
+        block = windows[np.arange(buffer.shape[0]), starts[start:end].reshape(-1)].reshape(end - start, n_columns, n_rows)
+        for i in range(start, end):
+            out[i][...] = block[i - start].T
+    return out
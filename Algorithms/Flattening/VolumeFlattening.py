@@ -14,13 +14,17 @@ PRLEC Framework for OCT Processing and Visualization
 # PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
 import numpy as np
 import cv2
-from sklearn import linear_model
-from sklearn.preprocessing import PolynomialFeatures
-from FileHandler import ImportHandler
+from Algorithms.Flattening.PolynomialRansac import fitPolynomials
+from Algorithms.Flattening.FlattenedVolume import FlattenedVolume
+from Algorithms.Flattening.FlatteningCache import getKey, getShifts
+from Algorithms.Flattening.ShiftField import applyShifts, shiftSlice
+from Algorithms.GraphCut.ParallelSlices import mapSlices
 #sigma for Gaussian filter
 sigma = (4.0,2.0)
+#rows searched above and below the RPE of the prior slice
+BAND_ROWS = 3
 
-def runFlattening(volume, flattening_polynomial):
+def runFlattening(volume, flattening_polynomial, inplace = False, two_pass = False, workers = 1, tolerance = BAND_ROWS, cache_directory = None):
     """
         Flattening an OCT volume based on RPE. 
         
@@ -33,6 +37,16 @@ def runFlattening(volume, flattening_polynomial):
         3) Ransac and curve fit of degree 4
         4) Shift columns and store shifts
         
+        Two-pass mode:
+        1) Gaussian smoothing and brightest pixels of all slices without 
+           the +/-3 pixel constraint (parallel), one batched curve fit
+        2) Consistency pass: slices whose curve jumps from the curve of 
+           the prior slice (median distance of the columns above the 
+           tolerance) are solved again as in 2) and 3) above
+        Consistent slices keep the unconstrained curve, so the result 
+        differs from the sequential mode by the drift of the +/-3 pixel 
+        tracking.
+        
         Parameters
         ----------
         volume: numpy array 2D/3D array
@@ -40,6 +54,23 @@ def runFlattening(volume, flattening_polynomial):
         flattening_polynomial = scalar
             input for polynomial fitting - order of the curve
         
+        Optional
+        ----------
+        inplace: boolean
+            true to write the flattened slices into the input volume 
+            (memory budget mode), instead of new float32 slices
+        two_pass: boolean
+            true to run the two-pass mode
+        workers: scalar, int
+            number of threads of the first pass (0: number of CPU cores, 
+            compare ParallelSlices)
+        tolerance: scalar
+            maximal median distance in rows of the curves of neighboring 
+            slices (two-pass mode)
+        cache_directory: string
+            directory of the volume to store the shifts on disk (compare 
+            FlatteningCache, the shifts are always cached in memory)
+        
         Return
         ------
         shiftedVolume: list of 2D numpy arrays
@@ -52,54 +83,190 @@ def runFlattening(volume, flattening_polynomial):
     #return volumes
     shiftedVolume = []
     shiftedValues = []
-    im_center_y = int(volume[0].shape[0]//2)
+    
+    shiftMap = getShiftMap(volume, flattening_polynomial, two_pass, workers, tolerance, cache_directory)
+    
+    #shifting volume
+    for i, shifts in enumerate(shiftMap.tolist()):
+        slicebuffer = shiftSlice(volume[i], shifts).astype('float32', copy = False)
+        if inplace:
+            volume[i][...] = slicebuffer
+            slicebuffer = volume[i]
+        
+        shiftedValues.append(shifts)
+        shiftedVolume.append(slicebuffer)
 
-    counter = 0
-    prev_y = 0
+    return shiftedVolume, shiftedValues
+
+def getShiftMap(volume, flattening_polynomial, two_pass = False, workers = 1, tolerance = BAND_ROWS, cache_directory = None):
+    """
+        Shifts of every column that flatten the RPE, without shifting the volume.
+        
+        Missing columns of the volume are filled in place (compare 
+        fillMissingColumns). The shifts are cached by content of the 
+        volume and parameters (compare FlatteningCache).
+        
+        Parameters
+        ----------
+        volume: numpy array 3D or list of 2D arrays
+            input oct volume
+        flattening_polynomial = scalar
+            order of the curve
+        
+        Optional
+        ----------
+        two_pass, workers, tolerance, cache_directory:
+            compare runFlattening
+            
+        Return
+        ------
+        shiftMap: numpy array 2D, int32
+            the shift of every column (slices, columns)
+    """
+    im_center_y = int(volume[0].shape[0]//2)
     
     x_idx = np.arange(volume[0].shape[1]).astype(np.int32)
     #fill missing columns with neighbors
     volume = fillMissingColumns(volume)
-    #iterate through slices
-    for i,_slice in enumerate(volume):
-        #blurring - kernelwidth computed from sigmas (0,0)
-        blurred = cv2.GaussianBlur(_slice, (0,0), sigmaX = sigma[0], sigmaY=sigma[1])
-        y_idx = 0
-        # get max of colums
-        if(i == 0):
-            y_idx = np.argmax(blurred, axis = 0)
-        else:
-            for x in range (blurred.shape[1]):
-                blurred[0:int(prev_y[x])-3,x] = 0
-                blurred[int(prev_y[x])+3:blurred.shape[1],x] = 0
-            y_idx = np.argmax(blurred, axis = 0)
-        #ransac outlier removal and polynomial fitting
-        try:
-            degree = flattening_polynomial
-            x_idx, y_idx = ransac_fit(x_idx, y_idx, degree)
-        except:
-            try:
-                degree = flattening_polynomial
-                x_idx, y_idx = ransac_fit(x_idx, y_idx, degree) 
-            except:
-                y_idx = prev_y
+    
+    #RPE curves, cached by content of the volume and parameters
+    key = getKey('rpe', volume, flattening_polynomial, sigma, BAND_ROWS, two_pass, tolerance)
+    return getShifts(key, lambda: im_center_y - np.asarray(getCurves(volume, x_idx, flattening_polynomial, two_pass, workers, tolerance)), cache_directory)
+
+def getCurves(volume, x_idx, flattening_polynomial, two_pass = False, workers = 1, tolerance = BAND_ROWS):
+    """
+        RPE curve of every slice (compare runFlattening)
+        
+        Parameters
+        ----------
+        volume: numpy array 3D or list of 2D arrays
+            the column filled volume
+        x_idx: ndarray
+            column indices
+        flattening_polynomial = scalar
+            order of the curve
+        
+        Optional
+        ----------
+        two_pass: boolean
+            true to run the two-pass mode
+        workers: scalar, int
+            number of threads of the first pass
+        tolerance: scalar
+            maximal median distance in rows of the curves of neighboring 
+            slices (two-pass mode)
             
-        prev_y = y_idx
-        #shifting volume
-        shifts = [-int((y_idx_item - im_center_y)) for y_idx_item in y_idx]
-        slicebuffer = np.zeros((_slice.shape)).astype('float32')
-        for x in range (len(x_idx)):
-            slicebuffer[:,x] = np.roll(volume[i][:,x],shifts[x], axis= 0)
+        Return
+        ------
+        curves: list of ndarrays
+            row of the curve of every column of every slice
+    """
+    curves = []
+    if two_pass:
+        #first pass: unconstrained maxima of all slices, fitted at once
+        y_max = np.array(mapSlices(lambda _slice: np.argmax(getBlurred(_slice), axis = 0), volume, workers))
+        _, fits, valid = fitPolynomials(x_idx, y_max, flattening_polynomial)
+        fits = fits.astype(np.int32)
+        #second pass: solve inconsistent slices again
+        for i in range(len(volume)):
+            if i == 0:
+                y_idx = fits[i] if valid[i] else y_max[i]
+            elif valid[i] and np.median(np.abs(fits[i] - curves[-1])) <= tolerance:
+                y_idx = fits[i]
+            else:
+                y_idx = getCurve(volume[i], x_idx, flattening_polynomial, curves[-1])
+            curves.append(y_idx)
+    else:
+        prev_y = 0
+        for _slice in volume:
+            prev_y = getCurve(_slice, x_idx, flattening_polynomial, prev_y)
+            curves.append(prev_y)
+    return curves
+
+def getBlurred(_slice):
+    """
+        Gaussian smoothing of a slice (kernelwidth computed from sigmas)
         
-        shiftedValues.append(shifts)
-        shiftedVolume.append(slicebuffer)
-        counter += 1
+        Parameters
+        ----------
+        _slice: numpy array 2D
+            the slice
+            
+        Return
+        ------
+        blurred: numpy array 2D
+            the smoothed slice
+    """
+    return cv2.GaussianBlur(_slice, (0,0), sigmaX = sigma[0], sigmaY=sigma[1])
 
-    return shiftedVolume, shiftedValues
+def maskBand(blurred, prev_y, band = BAND_ROWS):
+    """
+        Set all rows outside of the search band of every column to zero
+
+        All rows down to the last one are masked, and the band is clipped
+        at the top for a prior RPE less than band rows from the top.
+
+        Parameters
+        ----------
+        blurred: numpy array 2D
+            the smoothed slice (changed in place)
+        prev_y: ndarray
+            RPE of the prior slice (row of every column)
+        
+        Optional
+        ----------
+        band: scalar, int
+            rows kept above and below the RPE of the prior slice
+            
+        Return
+        ------
+        blurred: numpy array 2D
+            the masked slice
+    """
+    rows = np.arange(blurred.shape[0])[:,None]
+    prev_y = np.asarray(prev_y).astype(np.intp)
+    blurred[(rows < prev_y - band) | (rows >= prev_y + band)] = 0
+    return blurred
+
+def getCurve(_slice, x_idx, flattening_polynomial, prev_y = None):
+    """
+        RPE curve of a slice: brightest pixels in the search band of every
+        column, ransac outlier removal and polynomial fitting
+        
+        Parameters
+        ----------
+        _slice: numpy array 2D
+            the slice
+        x_idx: ndarray
+            column indices
+        flattening_polynomial = scalar
+            order of the curve
+        
+        Optional
+        ----------
+        prev_y: ndarray
+            RPE of the prior slice (0 or None for the first slice: 
+            no search band), returned if the fitting fails
+            
+        Return
+        ------
+        y_idx: ndarray
+            row of the curve of every column
+    """
+    blurred = getBlurred(_slice)
+    if prev_y is not None and np.ndim(prev_y) > 0:
+        maskBand(blurred, prev_y)
+    y_idx = np.argmax(blurred, axis = 0)
+    #ransac outlier removal and polynomial fitting (deterministic, no retry)
+    try:
+        _, y_idx = ransac_fit(x_idx, y_idx, flattening_polynomial)
+    except:
+        y_idx = prev_y
+    return y_idx
 
 def ransac_fit(x, y, degree_in):
     """
-        Ransac fitting helper
+        Ransac fitting helper (compare PolynomialRansac.fitPolynomials)
         
         Parameters
         ----------
@@ -117,19 +284,11 @@ def ransac_fit(x, y, degree_in):
         y_i: ndarray
             data points y_i
     """
-    x_ = x.reshape((-1, 1))
-    y_ = y.reshape((-1, 1))
-
-    xi = np.linspace(min(x), max(x), len(x)).reshape((-1, 1))    
-
-    m = linear_model.RANSACRegressor(linear_model.LinearRegression(), min_samples = 200, max_trials=100, random_state = 42)
-    poly_2 = PolynomialFeatures(degree= degree_in,)
-    x_2 = poly_2.fit_transform(x_)
-    xi_2 = poly_2.fit_transform(xi)
-    m.fit(x_2, y_)
-    yi = m.predict(xi_2)
+    xi, yi, valid = fitPolynomials(x, y, degree_in)
+    if not valid[0]:
+        raise ValueError('RANSAC could not find a valid consensus set')
     
-    return xi.astype(np.int32),yi.astype(np.int32)
+    return xi.astype(np.int32),yi[0].astype(np.int32)
 
 def fillMissingColumns(volume):
     """
@@ -187,11 +346,7 @@ def unFlatten(volume, shiftedValues):
             unflattened volume
     """
     #process all volume_rgb slices
-    for i,_slice in enumerate(volume):
-        for x in range (len(shiftedValues[i])):
-            _slice[:,x] = np.roll(_slice[:,x],-shiftedValues[i][x], axis= 0)
-    
-    return volume
+    return applyShifts(volume, shiftedValues, inverse = True, inplace = True)
 
 def applyFlattening(self, event=None):
     """
@@ -215,11 +370,10 @@ def applyFlattening(self, event=None):
         except:
             self.polynomial_var.set(4)
             self.flattening_polynomial = 4
-        #run algorithm
-        vol, self.shiftedValues = runFlattening(self.volume_original, self.flattening_polynomial)
-        self.shiftedValues = np.asarray(self.shiftedValues).astype('int32')
-        # load as rgb
-        self.volume = ImportHandler.getOriginalRGBVolume(np.asarray(vol))
+        #run algorithm (shifts only, the volume is flattened on demand)
+        self.shiftedValues = getShiftMap(self.volume_original, self.flattening_polynomial, two_pass = self.FLATTEN_TWO_PASS, workers = 0, cache_directory = self.initialdir if self.FLATTEN_CACHE_DISK else None)
+        # rgb planes are flattened on demand
+        self.volume = FlattenedVolume(self.volume_original, self.shiftedValues)
         
         #-shiftedvalues flattens the image (note the minus)
         self.segmentation = unFlatten(self.segmentation,-self.shiftedValues)
@@ -233,8 +387,7 @@ def applyFlattening(self, event=None):
         #reset flattening
         self.buttonFlattening.configure(text="Apply Flattening to RPE", bg=self.btnbackground)
         
-        vol = self.volume_original.copy()
-        self.volume = ImportHandler.getOriginalRGBVolume(np.asarray(vol))
+        self.volume = FlattenedVolume(self.volume_original)
         
         self.segmentation = unFlatten(self.segmentation, self.shiftedValues)
         
@@ -267,14 +420,11 @@ def applyFlatteningBM(self, event=None):
         im_center_y = int(self.segmentation.shape[1]//2)  
         
         self.shiftedValues = np.zeros((self.shiftedValues.shape[0],self.shiftedValues.shape[1])).astype('int32')
-        vol = self.volume_original.copy()
-        for z in range(vol.shape[0]):
+        for z in range(self.segmentation.shape[0]):
             coordinates_bruchs = np.where(self.segmentation[z].transpose() == self.BM_VALUE)[1]
             self.shiftedValues[z,:]= -coordinates_bruchs[:] + im_center_y
-            for x in range (vol.shape[2]):
-                vol[z,:,x] = np.roll(vol[z,:,x],self.shiftedValues[z][x], axis= 0)  
                 
-        self.volume = ImportHandler.getOriginalRGBVolume(np.asarray(vol)) 
+        self.volume = FlattenedVolume(self.volume_original, self.shiftedValues)
         #-shiftedvalues flattens the image (note the minus)
         self.segmentation = unFlatten(self.segmentation, -self.shiftedValues)
         #update planes
@@ -287,8 +437,7 @@ def applyFlatteningBM(self, event=None):
         #reset flattening
         self.buttonFlatteningBM.configure(text="Flatten to Bruch's Membrane", bg=self.btnbackground)
         
-        vol = self.volume_original.copy()
-        self.volume = ImportHandler.getOriginalRGBVolume(np.asarray(vol))
+        self.volume = FlattenedVolume(self.volume_original)
 
         self.segmentation = unFlatten(self.segmentation, self.shiftedValues)
         
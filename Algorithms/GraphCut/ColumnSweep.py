@@ -0,0 +1,190 @@
+"""
+ColumnSweep: Shortest path solver for trellis-shaped Graph-Cut weight bands
+-----------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+
+def getShortestPath(weights, neighborhood):
+    """
+        Shortest path from the top left to the bottom right pixel of a weight band.
+
+        The graph of a weight band is a left-to-right trellis: every edge either
+        moves one column to the right or one row up/down within a column. Hence,
+        the distances are computed column by column (dynamic programming): the
+        right edges of the finished column c initialize column c+1, which is
+        then relaxed along its vertical edges until no distance improves.
+        No graph object is constructed.
+
+        The distances are the same floating point sums as computed by Dijkstra's
+        algorithm on the graph of getEdges, so the paths are identical unless
+        several paths have exactly the same length (e.g. in regions of constant
+        weights). Then, an equally short path may be returned.
+
+        Parameters
+        ----------
+        weights: ndarray, float64, (len(neighborhood)+2, rows, columns)
+            stencil weights of the band (compare EdgeStencil.getStencilWeights)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Returns
+        ---------
+        shortest_path: ndarray, int
+            the vertices (flattened pixel indices) of the shortest path,
+            empty if the bottom right pixel is not reachable
+    """
+    return getShortestPaths(weights[None], neighborhood)[0]
+
+def getShortestPaths(weights, neighborhood):
+    """
+        Shortest paths of a stack of equally shaped weight bands (compare getShortestPath).
+
+        The column sweep is vectorized over the bands, i.e. all bands are
+        solved together column by column.
+
+        Parameters
+        ----------
+        weights: ndarray, float64, (bands, len(neighborhood)+2, rows, columns)
+            stencil weights of the bands (compare EdgeStencil.getStencilWeights)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Returns
+        ---------
+        shortest_paths: list of ndarray, int
+            the vertices (flattened pixel indices) of the shortest path of
+            every band, empty if the bottom right pixel is not reachable
+    """
+    n_right = len(neighborhood)
+    n_bands, _, rows, cols = weights.shape
+    row_idx = np.arange(rows)
+
+    #source row and weight of the right edges, indexed by target row
+    src_rows = row_idx[None,:] - np.asarray(neighborhood)[:,None]
+    src_valid = (src_rows >= 0) & (src_rows < rows)
+    src_rows = np.clip(src_rows, 0, rows - 1)
+    w_right = weights[:, np.arange(n_right)[:,None], src_rows, :]
+    w_right[:, ~src_valid] = np.inf
+    w_right = np.ascontiguousarray(w_right.transpose(3, 0, 1, 2))
+    w_up = np.ascontiguousarray(weights[:, n_right].transpose(2, 0, 1))
+    w_down = np.ascontiguousarray(weights[:, n_right+1].transpose(2, 0, 1))
+
+    #distances and predecessors (flattened pixel index)
+    dist = np.full((cols, n_bands, rows), np.inf)
+    parent = np.full((cols, n_bands, rows), -1, dtype = np.int64)
+
+    dist[0, :, 0] = 0.0
+    for b in range(n_bands):
+        relaxColumnSequential(dist[0, b], parent[0, b], w_up[0, b], w_down[0, b], 0, cols)
+
+    for c in range(cols - 1):
+        candidate = dist[c][:, src_rows] + w_right[c]
+        #first minimum -> stencil order
+        k = candidate.argmin(axis = 1)
+        dist[c+1] = np.take_along_axis(candidate, k[:,None,:], axis = 1)[:,0]
+        parent[c+1] = src_rows[k, row_idx]*cols + c
+
+        #border columns contain long vertical runs
+        if c + 1 == cols - 1:
+            for b in range(n_bands):
+                relaxColumnSequential(dist[c+1, b], parent[c+1, b], w_up[c+1, b], w_down[c+1, b], c + 1, cols)
+        else:
+            relaxColumn(dist[c+1], parent[c+1], w_up[c+1], w_down[c+1], c + 1, cols)
+
+    shortest_paths = []
+    for b in range(n_bands):
+        if not np.isfinite(dist[-1, b, -1]):
+            shortest_paths.append(np.array([], dtype = np.int64))
+            continue
+        #backtracking
+        path = [rows*cols - 1]
+        vertex = parent[-1, b, -1]
+        while vertex >= 0:
+            path.append(vertex)
+            vertex = parent[vertex % cols, b, vertex // cols]
+        shortest_paths.append(np.asarray(path[::-1], dtype = np.int64))
+
+    return shortest_paths
+
+def relaxColumn(dist, parent, w_up, w_down, c, cols):
+    """
+        Relax the vertical edges of a column (vectorized Bellman-Ford).
+
+        Parameters
+        ----------
+        dist: ndarray, (bands, rows)
+            distances of the column, updated in place
+        parent: ndarray, (bands, rows)
+            predecessors of the column, updated in place
+        w_up: ndarray, (bands, rows)
+            weights of the edges from row r to row r-1
+        w_down: ndarray, (bands, rows)
+            weights of the edges from row r to row r+1
+        c: scalar, int
+            column index
+        cols: scalar, int
+            number of columns
+    """
+    while True:
+        #from row r-1 to row r
+        candidate = dist[:,:-1] + w_down[:,:-1]
+        band_down, improved_down = np.nonzero(candidate < dist[:,1:])
+        if improved_down.size:
+            dist[band_down, improved_down + 1] = candidate[band_down, improved_down]
+            parent[band_down, improved_down + 1] = improved_down*cols + c
+        #from row r+1 to row r
+        candidate = dist[:,1:] + w_up[:,1:]
+        band_up, improved_up = np.nonzero(candidate < dist[:,:-1])
+        if improved_up.size:
+            dist[band_up, improved_up] = candidate[band_up, improved_up]
+            parent[band_up, improved_up] = (improved_up + 1)*cols + c
+        elif not improved_down.size:
+            break
+
+def relaxColumnSequential(dist, parent, w_up, w_down, c, cols):
+    """
+        Relax the vertical edges of a column by a downward and an upward sweep.
+
+        Used for the border columns where the path runs along the entire column.
+
+        Parameters
+        ----------
+        dist: ndarray
+            distances of the column, updated in place
+        parent: ndarray
+            predecessors of the column, updated in place
+        w_up: ndarray
+            weights of the edges from row r to row r-1
+        w_down: ndarray
+            weights of the edges from row r to row r+1
+        c: scalar, int
+            column index
+        cols: scalar, int
+            number of columns
+    """
+    d = dist.tolist()
+    p = parent.tolist()
+    w_up = w_up.tolist()
+    w_down = w_down.tolist()
+    for r in range(1, len(d)):
+        candidate = d[r-1] + w_down[r-1]
+        if candidate < d[r]:
+            d[r] = candidate
+            p[r] = (r-1)*cols + c
+    for r in range(len(d) - 2, -1, -1):
+        candidate = d[r+1] + w_up[r+1]
+        if candidate < d[r]:
+            d[r] = candidate
+            p[r] = (r+1)*cols + c
+    dist[:] = d
+    parent[:] = p
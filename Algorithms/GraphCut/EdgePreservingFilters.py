@@ -0,0 +1,230 @@
+"""
+EdgePreservingFilters: Interchangeable smoothing filters for the graph weights
+--------------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+import cv2
+from scipy import ndimage
+from Algorithms.GraphCut.ParallelSlices import mapSlices
+
+#available filters (Parameters.txt: AUTO_FILTER)
+FILTERS = ('bilateral', 'guided', 'domain', 'guided3d')
+#number of iterations of the domain transform (recursive filter)
+DT_ITERATIONS = 3
+
+def getRadius(bf_values):
+    """
+        Radius of the filter window of the bilateral filter values.
+
+        Parameters
+        ----------
+        bf_values: ndarray, int, size 3
+            bilateral filter values (diameter, sigma color, sigma space)
+
+        Returns
+        ---------
+        radius: scalar, int
+            the radius of cv2.bilateralFilter
+    """
+    return int(bf_values[0])//2 if bf_values[0] > 0 else int(round(bf_values[2]*1.5))
+
+def getSupport(bf_values, smoothing = 'bilateral'):
+    """
+        Number of neighboring pixels that change the result of a pixel.
+
+        Parameters
+        ----------
+        bf_values: ndarray, int, size 3
+            bilateral filter values (diameter, sigma color, sigma space)
+
+        Optional
+        ----------
+        smoothing: string
+            'bilateral' or 'guided' (the other filters have an infinite support)
+
+        Returns
+        ---------
+        support: scalar, int
+            the radius of the window (twice the radius for the guided filter)
+    """
+    if smoothing == 'guided':
+        return 2*getRadius(bf_values)
+    return getRadius(bf_values)
+
+def guidedFilter(image, radius, eps):
+    """
+        Self-guided filter (He et al., 2013) of a 2D image.
+
+        Local linear model of the image in every window, calculated with
+        box filters, so the cost does not depend on the radius.
+
+        Parameters
+        ----------
+        image: numpy array 2D, float32
+            the image
+        radius: scalar, int
+            radius of the box filter
+        eps: scalar
+            regularization (the squared intensity difference of an edge)
+
+        Returns
+        ---------
+        result: numpy array 2D, float32
+            the filtered image
+    """
+    size = (2*radius + 1, 2*radius + 1)
+    mean = cv2.boxFilter(image, -1, size)
+    var = cv2.boxFilter(image*image, -1, size) - mean*mean
+    a = var/(var + eps)
+    b = mean - a*mean
+    return cv2.boxFilter(a, -1, size)*image + cv2.boxFilter(b, -1, size)
+
+def guidedFilter3D(volume, radii, eps):
+    """
+        Self-guided filter of a volume (compare guidedFilter).
+
+        Parameters
+        ----------
+        volume: numpy array 3D, float32
+            the volume
+        radii: tuple of int
+            radius of the box filter along every axis
+        eps: scalar
+            regularization (the squared intensity difference of an edge)
+
+        Returns
+        ---------
+        result: numpy array 3D, float32
+            the filtered volume
+    """
+    size = tuple(2*r + 1 for r in radii)
+    mean = ndimage.uniform_filter(volume, size, mode = 'mirror')
+    var = ndimage.uniform_filter(volume*volume, size, mode = 'mirror') - mean*mean
+    a = var/(var + eps)
+    b = mean - a*mean
+    return ndimage.uniform_filter(a, size, mode = 'mirror')*volume + ndimage.uniform_filter(b, size, mode = 'mirror')
+
+def domainTransform(volume, sigma_s, sigma_r, axes, iterations = DT_ITERATIONS):
+    """
+        Domain transform recursive filter (Gastal and Oliveira, 2011).
+
+        The image is filtered by a first order recursive filter along every
+        axis in both directions, the feedback coefficient drops at edges.
+        The loops run along an axis, every step is vectorized over the
+        other axes, so all planes of a volume are filtered together and
+        the cost does not depend on sigma_s.
+
+        Parameters
+        ----------
+        volume: numpy array 3D, float32
+            the volume
+        sigma_s: scalar
+            spatial standard deviation
+        sigma_r: scalar
+            range standard deviation
+        axes: tuple of int
+            the axes filtered (e.g. (1, 2): every B-scan separately)
+
+        Optional
+        ----------
+        iterations: scalar, int
+            number of iterations
+
+        Returns
+        ---------
+        result: numpy array 3D, float32
+            the filtered volume
+    """
+    result = np.asarray(volume, dtype = np.float32)
+    #distance of neighboring pixels in the transformed domain (filtered axis first)
+    distances = [np.ascontiguousarray(np.moveaxis(1 + sigma_s/sigma_r*np.abs(np.diff(result, axis = axis)), axis, 0)) for axis in axes]
+    for i in range(iterations):
+        sigma_i = sigma_s*np.sqrt(3)*2**(iterations - i - 1)/np.sqrt(4**iterations - 1)
+        a = np.exp(-np.sqrt(2)/sigma_i)
+        for axis, distance in zip(axes, distances):
+            feedback = np.power(np.float32(a), distance)
+            #contiguous copy with the filtered axis first
+            view = np.array(np.moveaxis(result, axis, 0), order = 'C')
+            for n in range(1, view.shape[0]):
+                view[n] += feedback[n - 1]*(view[n - 1] - view[n])
+            for n in range(view.shape[0] - 2, -1, -1):
+                view[n] += feedback[n]*(view[n + 1] - view[n])
+            result = np.moveaxis(view, 0, axis)
+    return np.ascontiguousarray(result)
+
+def smoothSlices(slices, bf_values, smoothing = 'bilateral', workers = 1):
+    """
+        Edge-preserving smoothing of every slice of a stack.
+
+        Filters (parameters derived from the bilateral filter values):
+            - 'bilateral': exact cv2.bilateralFilter
+            - 'guided': guided filter, radius of the bilateral filter, eps
+              sigma color squared
+            - 'domain': domain transform, sigma space and sigma color
+        The 3D filter 'guided3d' smooths the volume at once (compare
+        smoothVolume) and is not available per slice.
+
+        Parameters
+        ----------
+        slices: numpy array 3D
+            the slices
+        bf_values: ndarray, int, size 3
+            bilateral filter values (diameter, sigma color, sigma space)
+
+        Optional
+        ----------
+        smoothing: string
+            'bilateral' (default), 'guided' or 'domain'
+        workers: scalar, int
+            number of filter threads (0: number of CPU cores, compare ParallelSlices)
+
+        Returns
+        ---------
+        result: list of numpy arrays 2D
+            the filtered slices
+    """
+    if smoothing == 'bilateral':
+        return mapSlices(lambda _slice: cv2.bilateralFilter(_slice, bf_values[0], bf_values[1], bf_values[2]), slices, workers)
+    elif smoothing == 'guided':
+        radius = getRadius(bf_values)
+        eps = float(bf_values[1])**2
+        return mapSlices(lambda _slice: guidedFilter(_slice, radius, eps), slices, workers)
+    elif smoothing == 'domain':
+        return list(domainTransform(slices, bf_values[2], bf_values[1], (1, 2)))
+    raise ValueError('unknown smoothing filter: ' + str(smoothing))
+
+def smoothVolume(volume, bf_enface, bf_bscan):
+    """
+        3D guided filter replacing the en-face and the B-scan filter.
+
+        The window covers the en-face radius across the slices, the B-scan
+        radius across the rows and the larger one across the columns.
+
+        Parameters
+        ----------
+        volume: numpy array 3D, float32, (slices, rows, columns)
+            the volume
+        bf_enface: ndarray, int, size 3
+            en-face bilateral filter values
+        bf_bscan: ndarray, int, size 3
+            B-scan bilateral filter values
+
+        Returns
+        ---------
+        result: numpy array 3D, float32
+            the filtered volume
+    """
+    r_enface = getRadius(bf_enface)
+    r_bscan = getRadius(bf_bscan)
+    eps = float(max(bf_enface[1], bf_bscan[1]))**2
+    return guidedFilter3D(np.asarray(volume, dtype = np.float32), (r_enface, r_bscan, max(r_enface, r_bscan)), eps)
@@ -0,0 +1,238 @@
+"""
+EdgeStencil: Vectorized edge-list construction for Graph-Cut segmentation
+---------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+
+w_min = 1e-5
+
+#row steps of the edges to the right neighbors (3-neighborhood, 7-neighborhood and 9-neighborhood)
+NEIGHBORHOOD_3 = (0, -1, 1)
+NEIGHBORHOOD_7 = (0, -1, 1, -2, 2, -3, 3)
+NEIGHBORHOOD_9 = (0, -1, 1, -2, 2, -3, 3, -4, 4)
+
+def getOffsets(sx, neighborhood):
+    """
+        Vertex index offsets of the stencil.
+
+        The first entries are the edges to the right neighbors (one per row
+        step of the neighborhood), followed by the vertical edges to the pixel
+        above and beneath.
+
+        Parameters
+        ----------
+        sx: scalar, int
+            width of the weight band (including border columns)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Returns
+        ---------
+        offsets: ndarray, int
+            the vertex index offsets
+    """
+    return np.array([step*sx + 1 for step in neighborhood] + [-sx, sx], dtype = np.int64)
+
+def getStencilWeights(band, neighborhood, weight_function):
+    """
+        Compute the weights of all stencil edges of a weight band in bulk.
+
+        For every valid (not np.nan) pixel, there are edges to the right
+        neighbors given by the neighborhood (if the pixel is not located at
+        the right border) and vertical edges to the pixels above and beneath.
+        Pixels with a value outside -1...1 are border pixels and connected
+        vertically with w_min. The per-pixel builder (getEdgesReference) sets
+        border pixels to zero after visiting them, hence an edge pointing to
+        an already visited border pixel sees the value zero.
+
+        Parameters
+        ----------
+        band: ndarray, 2D
+            weight band, invalid pixels are np.nan
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+        weight_function: function
+            vectorized weight function f(values_v_i, values_v_j)
+
+        Returns
+        ---------
+        weights: ndarray, float64, (len(neighborhood)+2, rows, columns)
+            the edge weights of each stencil entry (compare getOffsets),
+            missing edges are np.inf
+    """
+    rows, sx = band.shape
+    slice_1D = band.ravel()
+    size = slice_1D.size
+    valid = ~np.isnan(slice_1D)
+    border = valid & ((slice_1D > 1.0) | (slice_1D < -1.0))
+
+    offsets = getOffsets(sx, neighborhood)
+    n_right = len(neighborhood)
+
+    v_i = np.arange(size)
+    v_j = v_i[None,:] + offsets[:,None]
+
+    mask = valid[None,:] & (v_j >= 0) & (v_j < size)
+    mask[:n_right] &= ((v_i + 1) % sx != 0)[None,:]
+    mask &= valid[np.clip(v_j, 0, size - 1)]
+
+    weights = np.full(mask.shape, np.inf)
+    #vertical edges of border pixels
+    fixed = mask.copy()
+    fixed[:n_right] = False
+    fixed &= border[None,:]
+    weights[fixed] = w_min
+
+    mask &= ~fixed
+    v_j = v_j[mask]
+    v_i = np.broadcast_to(v_i[None,:], mask.shape)[mask]
+    #border pixels visited before are zero
+    values_v_j = np.where(border[v_j] & (v_j < v_i), slice_1D.dtype.type(0), slice_1D[v_j])
+    weights[mask] = weight_function(slice_1D[v_i], values_v_j)
+
+    return weights.reshape((offsets.size, rows, sx))
+
+def getEdges(slice_1D, sx, neighborhood, weight_function):
+    """
+        Construct edge list and weights of a flattened weight band in bulk.
+
+        Produces exactly the edges (and their order) of the per-pixel builder
+        getEdgesReference: for every vertex, the edges to the right neighbors
+        are listed first, followed by the vertical edges.
+
+        Parameters
+        ----------
+        slice_1D: ndarray
+            flattened weight band, invalid pixels are np.nan
+        sx: scalar, int
+            width of the weight band (including border columns)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+        weight_function: function
+            vectorized weight function f(values_v_i, values_v_j)
+
+        Returns
+        ---------
+        edges: ndarray, int, (N,2)
+            the edges (v_i, v_j)
+        weights: ndarray, float64
+            the edge weights
+
+    """
+    weights = getStencilWeights(slice_1D.reshape((-1, sx)), neighborhood, weight_function)
+    weights = weights.reshape((weights.shape[0], -1))
+
+    #row-major selection keeps the order of the per-pixel builder
+    v_i, k = np.nonzero(np.isfinite(weights.T))
+    v_j = v_i + getOffsets(sx, neighborhood)[k]
+
+    return np.column_stack((v_i, v_j)), weights[k, v_i]
+
+def getBlockEdges(weights, neighborhood):
+    """
+        Construct the edges of a stack of equally shaped weight bands in bulk.
+
+        The bands form one block-diagonal graph: band b occupies the vertices
+        b*rows*columns ... (b+1)*rows*columns-1. Edges are ordered by band,
+        then like getEdges.
+
+        Parameters
+        ----------
+        weights: ndarray, float64, (bands, len(neighborhood)+2, rows, columns)
+            stencil weights of the bands (compare getStencilWeights)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Returns
+        ---------
+        edges: ndarray, int, (N,2)
+            the edges (v_i, v_j)
+        weights: ndarray, float64
+            the edge weights
+    """
+    n_bands, n_stencil, rows, sx = weights.shape
+    size = rows*sx
+    weights = weights.reshape((n_bands, n_stencil, size))
+
+    band, v_i, k = np.nonzero(np.isfinite(weights.transpose(0, 2, 1)))
+    v_j = v_i + getOffsets(sx, neighborhood)[k]
+
+    return np.column_stack((band*size + v_i, band*size + v_j)), weights[band, k, v_i]
+
+def getEdgesReference(slice_1D, sx, neighborhood, weight_function):
+    """
+        Construct edge list and weights pixel by pixel (reference builder).
+
+        Note: border pixels of slice_1D are set to zero.
+
+        Parameters
+        ----------
+        slice_1D: ndarray
+            flattened weight band, invalid pixels are np.nan
+        sx: scalar, int
+            width of the weight band (including border columns)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+        weight_function: function
+            scalar weight function f(value_v_i, value_v_j)
+
+        Returns
+        ---------
+        edge_list: list of tuples
+            the edges (v_i, v_j)
+        weight_list: list
+            the edge weights
+
+    """
+    edge_list = []
+    weight_list = []
+
+    for idx in range(slice_1D.size):
+        if np.isnan(slice_1D[idx]):
+            continue
+
+        v_i = idx
+
+        #pixel is not at the right boundary of the image -> has right neighbors
+        if((v_i+1) % sx != 0 ):
+            for step in neighborhood:
+                v_j = v_i + step*sx +1
+                if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
+                    edge_list.append((v_i, v_j))
+                    weight_list.append(weight_function(slice_1D[v_i],slice_1D[v_j]))
+
+        #pixel is located at the left/right boundary -> zero weights
+        if(slice_1D[v_i] > 1.0 or slice_1D[v_i] < -1.0):
+            slice_1D[v_i] = 0.0
+            v_j = v_i - sx
+            if (v_j >= 0 and v_j < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
+                edge_list.append((v_i, v_j))
+                weight_list.append(w_min)
+            v_j = v_i + sx
+            if (v_j >= 0 and v_j < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
+                edge_list.append((v_i, v_j))
+                weight_list.append(w_min)
+
+        else:
+            #not a boundary pixel
+            v_j = v_i - sx
+            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
+                edge_list.append((v_i, v_j))
+                weight_list.append(weight_function(slice_1D[v_i],slice_1D[v_j]))
+
+            v_j = v_i + sx
+            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
+                edge_list.append((v_i, v_j))
+                weight_list.append(weight_function(slice_1D[v_i],slice_1D[v_j]))
+
+    return edge_list, weight_list
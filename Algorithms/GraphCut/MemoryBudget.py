@@ -0,0 +1,168 @@
+"""
+MemoryBudget: Peak memory report of the stages of a segmentation pipeline
+---------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+from contextlib import contextmanager
+import os
+import sys
+import threading
+import tracemalloc
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#seconds between two samples of the resident memory during a stage
+SAMPLE_INTERVAL = 0.01
+
+def getRSS():
+    """
+        Resident memory of the process.
+
+        Uses psutil if installed, /proc on Linux otherwise.
+
+        Return
+        ------
+        rss: scalar, int
+            resident memory in bytes (None: not available)
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def getMaxRSS():
+    """
+        Peak resident memory of the process since its start.
+
+        Return
+        ------
+        rss: scalar, int
+            peak resident memory in bytes (None: not available)
+    """
+    if resource is None:
+        return None
+    #kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*(1 if sys.platform == 'darwin' else 1024)
+
+class StageMemory:
+    """
+        Peak memory of every stage of a pipeline (memory budget mode).
+
+        By default, the resident memory of the process is sampled every
+        SAMPLE_INTERVAL seconds during a stage (cheap, all memory of the
+        process is counted, including the input volume). The peak
+        resident memory of the process (getrusage) replaces the sampled
+        peak if it was exceeded during the stage. With trace, the memory
+        allocated during a stage is traced with tracemalloc instead
+        (numpy and OpenCV arrays included, exact but several times
+        slower). Tracing is started and stopped by every stage. Stages
+        must not overlap: the measurement covers the whole process. A
+        disabled report only runs the stages.
+    """
+    def __init__(self, enabled = True, trace = False):
+        """
+            Initializing.
+
+            Optional
+            ----------
+            enabled: boolean
+                false to run the stages without measurement
+            trace: boolean
+                true to trace the allocations of every stage with
+                tracemalloc instead of sampling the resident memory
+        """
+        self.enabled = enabled
+        self.trace = trace
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+            Measure the peak memory of a stage (with statement).
+
+            Parameters
+            ----------
+            name: string
+                name of the stage
+        """
+        if not self.enabled:
+            yield
+            return
+        if self.trace:
+            with self.traceStage(name):
+                yield
+        else:
+            with self.sampleStage(name):
+                yield
+
+    @contextmanager
+    def traceStage(self, name):
+        """
+            Trace the allocations of a stage with tracemalloc.
+        """
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            self.stages[name] = tracemalloc.get_traced_memory()[1]
+            if started:
+                tracemalloc.stop()
+
+    @contextmanager
+    def sampleStage(self, name):
+        """
+            Sample the resident memory of a stage in a background thread.
+        """
+        samples = [getRSS()]
+        stop = threading.Event()
+        def sample():
+            while not stop.wait(SAMPLE_INTERVAL):
+                samples.append(getRSS())
+        sampler = threading.Thread(target = sample, name = 'StageMemory ' + name, daemon = True)
+        max_rss = getMaxRSS()
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            samples.append(getRSS())
+            peak = max([rss for rss in samples if rss is not None], default = None)
+            max_rss_stage = getMaxRSS()
+            if max_rss_stage is not None and max_rss_stage > max_rss:
+                #the peak of the process was reached during the stage
+                peak = max_rss_stage if peak is None else max(peak, max_rss_stage)
+            self.stages[name] = peak
+
+    def report(self):
+        """
+            Peak memory of all stages.
+
+            Return
+            ------
+            report: string
+                one line per stage, peak in MB
+        """
+        kind = 'traced' if self.trace else 'resident'
+        return '\n'.join('%-24s peak %-8s %9.1f MB' % (name, kind, peak/2**20) if peak is not None else '%-24s peak %-8s       n/a' % (name, kind) for name, peak in self.stages.items())
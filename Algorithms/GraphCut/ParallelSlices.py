@@ -0,0 +1,92 @@
+"""
+ParallelSlices: Thread-pool execution of per-slice image filters
+-------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+from concurrent.futures import ThreadPoolExecutor
+import os
+import cv2
+
+def getWorkers(workers):
+    """
+        Number of worker threads.
+
+        Parameters
+        ----------
+        workers: scalar, int
+            requested number of workers (None or 0: number of CPU cores)
+
+        Returns
+        ---------
+        workers: scalar, int
+            the number of workers (at least 1)
+    """
+    if not workers:
+        return os.cpu_count() or 1
+    return max(int(workers), 1)
+
+def mapSlices(function, slices, workers = 1):
+    """
+        Apply a function to every slice in a thread pool.
+
+        The slices are split into one chunk of consecutive slices per
+        worker. The results are in the order of the slices and do not
+        depend on the number of workers. Scales with the number of cores
+        if the function releases the GIL (OpenCV filters).
+
+        Parameters
+        ----------
+        function: function
+            f(_slice), applied to every slice
+        slices: numpy array 3D or list of 2D arrays
+            the slices
+
+        Optional
+        ----------
+        workers: scalar, int
+            number of worker threads (None or 0: number of CPU cores)
+
+        Returns
+        ---------
+        results: list
+            result of every slice
+    """
+    workers = min(getWorkers(workers), max(len(slices), 1))
+    if workers == 1:
+        return [function(_slice) for _slice in slices]
+    size = -(-len(slices)//workers)
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        chunks = pool.map(lambda start: [function(_slice) for _slice in slices[start:start + size]], range(0, len(slices), size))
+        return [result for chunk in chunks for result in chunk]
+
+def bilateralSlices(slices, bf_values, workers = 1):
+    """
+        Bilateral filter every slice in a thread pool (compare mapSlices).
+
+        Parameters
+        ----------
+        slices: numpy array 3D or list of 2D arrays
+            the slices
+        bf_values: ndarray, int, size 3
+            bilateral filter values (diameter, sigma color, sigma space)
+
+        Optional
+        ----------
+        workers: scalar, int
+            number of worker threads (None or 0: number of CPU cores)
+
+        Returns
+        ---------
+        results: list of ndarrays
+            the filtered slices
+    """
+    return mapSlices(lambda _slice: cv2.bilateralFilter(_slice, bf_values[0], bf_values[1], bf_values[2]), slices, workers)
@@ -0,0 +1,120 @@
+"""
+PreprocessingCache: Shared cache of smoothed volumes for the graph weights
+-----------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+from collections import OrderedDict
+import hashlib
+import threading
+import numpy as np
+
+#default memory limit of the cache in MB (Parameters.txt: CACHE_MB, 0 disables the cache)
+CACHE_MB = 1024
+
+_entries = OrderedDict()
+_pending = {}
+_lock = threading.Lock()
+
+def getFingerprint(volume):
+    """
+        Fingerprint of the content of a volume.
+
+        Parameters
+        ----------
+        volume: numpy array 3D or list of 2D arrays
+            the volume
+
+        Returns
+        ---------
+        fingerprint: string
+            hash of shape, data type and values of all slices
+    """
+    h = hashlib.sha1()
+    for _slice in volume:
+        _slice = np.ascontiguousarray(_slice)
+        h.update(str((_slice.shape, _slice.dtype.str)).encode())
+        h.update(_slice)
+    return h.hexdigest()
+
+def getNbytes():
+    """
+        Memory held by the cache.
+
+        Returns
+        ---------
+        nbytes: scalar, int
+            size of all cached volumes in bytes
+    """
+    with _lock:
+        return sum(value.nbytes for value in _entries.values())
+
+def clearCache():
+    """
+        Remove all cached volumes.
+    """
+    with _lock:
+        _entries.clear()
+
+def getCached(key, compute, cache_mb = CACHE_MB):
+    """
+        Look up a volume in the cache, compute and store it if missing.
+
+        The least recently used volumes are removed when the cache exceeds
+        cache_mb. Cached volumes are read-only, as they are shared between
+        all callers. If several threads request the same key at the same
+        time, it is computed once.
+
+        Parameters
+        ----------
+        key: tuple
+            stage name, fingerprint of the input volume and filter values
+        compute: function
+            computes the volume (numpy array) without arguments
+
+        Optional
+        ----------
+        cache_mb: scalar
+            memory limit of the cache in MB (0: no caching)
+
+        Returns
+        ---------
+        volume: ndarray
+            the (read-only) volume
+    """
+    if not cache_mb:
+        return compute()
+    while True:
+        with _lock:
+            if key in _entries:
+                _entries.move_to_end(key)
+                return _entries[key]
+            event = _pending.get(key)
+            if event is None:
+                event = _pending[key] = threading.Event()
+                break
+        #computed by another thread
+        event.wait()
+
+    try:
+        value = np.asarray(compute())
+        value.setflags(write = False)
+        with _lock:
+            limit = cache_mb*2**20
+            if value.nbytes <= limit:
+                _entries[key] = value
+                while sum(entry.nbytes for entry in _entries.values()) > limit:
+                    _entries.popitem(last = False)
+        return value
+    finally:
+        with _lock:
+            del _pending[key]
+        event.set()
@@ -0,0 +1,164 @@
+"""
+ShortestPath: Interchangeable shortest path solvers for Graph-Cut segmentation
+-------------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+from igraph import Graph
+import numpy as np
+from scipy.sparse import csgraph, csr_matrix
+from Algorithms.GraphCut import ColumnSweep, TopologyCache
+from Algorithms.GraphCut.EdgeStencil import getBlockEdges
+
+#available solvers (Parameters.txt: GRAPHCUT_SOLVER)
+SOLVERS = ('igraph', 'scipy', 'sweep')
+
+def getShortestPath(weights, neighborhood, solver = 'igraph'):
+    """
+        Shortest path from the top left to the bottom right pixel of a weight band.
+
+        All solvers operate on the stencil weights of the band:
+            - 'igraph': Dijkstra of igraph on the graph of the cached topology
+            - 'scipy': Dijkstra of scipy.sparse.csgraph on the CSR adjacency of
+              the cached topology (igraph if there are negative weights)
+            - 'sweep': column-sweep dynamic programming (ColumnSweep)
+        The graph solvers only create vertices for the valid pixels of thin 
+        corridors (TopologyCache.getCompactGraph), the path is translated
+        back to the pixels of the band.
+        If several paths have exactly the same length, the solvers may return
+        different (equally short) paths.
+
+        Parameters
+        ----------
+        weights: ndarray, float64, (len(neighborhood)+2, rows, columns)
+            stencil weights of the band (compare EdgeStencil.getStencilWeights)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Optional
+        ----------
+        solver: string
+            'igraph' (default), 'scipy' or 'sweep'
+
+        Returns
+        ---------
+        shortest_path: ndarray, int
+            the vertices (flattened pixel indices) of the shortest path,
+            empty if the bottom right pixel is not reachable
+    """
+    if solver == 'igraph':
+        graph, index = TopologyCache.getCompactGraph(weights, neighborhood)
+        return index[np.asarray(graph.get_shortest_paths(v = 0, to = index.size - 1, weights = 'weight'), dtype = np.int64).flatten()]
+
+    elif solver == 'scipy':
+        graph, index = TopologyCache.getCSRGraph(weights, neighborhood)
+        if graph.data.size and graph.data.min() < 0:
+            #Bellman-Ford of csgraph is too slow for weight bands
+            return getShortestPath(weights, neighborhood, 'igraph')
+        _, predecessors = csgraph.dijkstra(graph, indices = 0, return_predecessors = True)
+        return index[backtrack(predecessors, 0, index.size - 1)]
+
+    elif solver == 'sweep':
+        return ColumnSweep.getShortestPath(weights, neighborhood)
+
+    raise ValueError('unknown Graph-Cut solver: ' + str(solver))
+
+def getShortestPaths(weights, neighborhood, solver = 'igraph'):
+    """
+        Shortest paths of a stack of equally shaped weight bands in one call.
+
+        The bands are solved together instead of one after another:
+            - 'igraph': one block-diagonal graph with an additional source 
+              vertex connected to the top left pixel of every band (weight 0),
+              solved by a single Dijkstra run
+            - 'scipy': one block-diagonal CSR graph solved by a single 
+              multi-source Dijkstra run (csgraph.dijkstra, min_only; igraph
+              if there are negative weights)
+            - 'sweep': column sweep vectorized over the bands
+        Only the valid pixels get a vertex (compare getShortestPath). The 
+        paths equal the ones of getShortestPath unless several paths have
+        exactly the same length.
+
+        Parameters
+        ----------
+        weights: ndarray, float64, (bands, len(neighborhood)+2, rows, columns)
+            stencil weights of the bands (compare EdgeStencil.getStencilWeights)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Optional
+        ----------
+        solver: string
+            'igraph' (default), 'scipy' or 'sweep'
+
+        Returns
+        ---------
+        shortest_paths: list of ndarray, int
+            the vertices (flattened pixel indices of the band) of the shortest 
+            path of every band, empty if the bottom right pixel is not reachable
+    """
+    n_bands = weights.shape[0]
+    size = weights[0,0].size
+    sources = np.arange(n_bands)*size
+    targets = sources + size - 1
+
+    if solver == 'sweep':
+        return ColumnSweep.getShortestPaths(weights, neighborhood)
+
+    elif solver == 'igraph':
+        edges, edge_weights = getBlockEdges(weights, neighborhood)
+        #single source vertex (index bands*rows*columns) connected to all bands
+        edges = np.concatenate((edges, np.column_stack((np.full(n_bands, n_bands*size), sources))))
+        edges, index = TopologyCache.compactVertices(edges, n_bands*size + 1, np.concatenate((sources, targets)))
+        g = Graph(n = index.size, edges = edges, directed = True)
+        g.es['weight'] = np.concatenate((edge_weights, np.zeros(n_bands)))
+        paths = g.get_shortest_paths(v = index.size - 1, to = np.searchsorted(index, targets), weights = 'weight')
+        return [index[np.asarray(path[1:], dtype = np.int64)] - source for path, source in zip(paths, sources)]
+
+    elif solver == 'scipy':
+        edges, edge_weights = getBlockEdges(weights, neighborhood)
+        if edge_weights.size and edge_weights.min() < 0:
+            return getShortestPaths(weights, neighborhood, 'igraph')
+        edges, index = TopologyCache.compactVertices(edges, n_bands*size, np.concatenate((sources, targets)))
+        #edges are ordered by start vertex
+        indptr = np.searchsorted(edges[:,0], np.arange(index.size + 1))
+        graph = csr_matrix((edge_weights, edges[:,1], indptr), shape = (index.size, index.size))
+        compact_sources = np.searchsorted(index, sources)
+        compact_targets = np.searchsorted(index, targets)
+        _, predecessors, _ = csgraph.dijkstra(graph, indices = compact_sources, min_only = True, return_predecessors = True)
+        return [index[backtrack(predecessors, c_source, c_target)] - source for c_source, c_target, source in zip(compact_sources, compact_targets, sources)]
+
+    raise ValueError('unknown Graph-Cut solver: ' + str(solver))
+
+def backtrack(predecessors, source, target):
+    """
+        Backtrack a shortest path from the predecessors of a csgraph solver.
+
+        Parameters
+        ----------
+        predecessors: ndarray
+            predecessor of every vertex (negative: none)
+        source: scalar, int
+            start vertex
+        target: scalar, int
+            end vertex
+
+        Returns
+        ---------
+        shortest_path: ndarray, int
+            the vertices of the shortest path, empty if the target is not reachable
+    """
+    if target != source and predecessors[target] < 0:
+        return np.array([], dtype = np.int64)
+    path = [target]
+    while path[-1] != source:
+        path.append(predecessors[path[-1]])
+    return np.asarray(path[::-1], dtype = np.int64)
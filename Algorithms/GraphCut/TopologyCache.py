@@ -0,0 +1,324 @@
+"""
+TopologyCache: Reusable graph topology of Graph-Cut weight bands
+-----------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+from collections import namedtuple
+from functools import lru_cache
+from igraph import Graph
+import numpy as np
+from scipy.sparse import csr_matrix
+from Algorithms.GraphCut.EdgeStencil import getOffsets
+
+#maximum number of cached band shapes
+CACHE_SIZE = 64
+#band heights are rounded up to a multiple of ROW_BUCKET
+ROW_BUCKET = 16
+
+Topology = namedtuple('Topology', ['offsets', 'indptr', 'indices', 'sources', 'stencil'])
+
+@lru_cache(maxsize = CACHE_SIZE)
+def getTopology(rows, cols, neighborhood):
+    """
+        Full stencil topology of a weight band of the given shape.
+
+        Contains every edge of the stencil that stays inside the band, no
+        matter if the pixels are valid. Neighboring B-scans share the band
+        shape, so the topology is computed once and only the weights and
+        the validity of the edges change from slice to slice. The arrays
+        are read-only.
+
+        As the vertices are numbered row by row, the topology of a band with
+        fewer rows is a prefix of the CSR adjacency (edges leaving the band
+        at the bottom have to be removed).
+
+        Parameters
+        ----------
+        rows: scalar, int
+            height of the weight band
+        cols: scalar, int
+            width of the weight band (including border columns)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Returns
+        ---------
+        topology: Topology
+            offsets: vertex index offsets of the stencil (compare EdgeStencil.getOffsets)
+            indptr, indices: CSR adjacency (edges ordered by v_i, then stencil entry)
+            sources, stencil: start vertex and stencil entry of every edge
+    """
+    size = rows*cols
+    offsets = getOffsets(cols, neighborhood)
+    n_right = len(neighborhood)
+
+    v_i = np.arange(size)
+    v_j = v_i[:,None] + offsets[None,:]
+    mask = (v_j >= 0) & (v_j < size)
+    mask[:,:n_right] &= ((v_i + 1) % cols != 0)[:,None]
+
+    #row-major selection -> edges ordered by v_i, then stencil entry
+    sources, stencil = np.nonzero(mask)
+    indices = v_j[sources, stencil]
+    indptr = np.concatenate(([0], np.cumsum(mask.sum(axis = 1))))
+
+    for array in (offsets, indptr, indices, sources, stencil):
+        array.setflags(write = False)
+    return Topology(offsets, indptr, indices, sources, stencil)
+
+@lru_cache(maxsize = CACHE_SIZE)
+def getTemplateGraph(rows, cols, neighborhood):
+    """
+        Directed igraph graph of the full stencil topology (compare getTopology).
+
+        The graph must not be modified (copy it).
+
+        Parameters
+        ----------
+        rows: scalar, int
+            height of the weight band
+        cols: scalar, int
+            width of the weight band (including border columns)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Returns
+        ---------
+        graph: graph
+            the unweighted graph with the edges in CSR order
+    """
+    topology = getTopology(rows, cols, neighborhood)
+    return Graph(n = rows*cols, edges = np.column_stack((topology.sources, topology.indices)), directed = True)
+
+def getEdgeWeights(weights, neighborhood):
+    """
+        Weights of the cached topology edges of a weight band.
+
+        The topology of the next larger band height (multiple of ROW_BUCKET) is
+        used. Only the edges leaving the rows of the band are considered.
+
+        Parameters
+        ----------
+        weights: ndarray, float64, (len(neighborhood)+2, rows, columns)
+            stencil weights of the band (compare EdgeStencil.getStencilWeights)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Returns
+        ---------
+        topology: Topology
+            the cached topology
+        edge_weights: ndarray, float64
+            weights of the first topology edges (CSR order)
+        valid: ndarray, bool
+            false for the edges of invalid pixels and the edges leaving the band
+    """
+    _, rows, cols = weights.shape
+    size = rows*cols
+    capacity = -(-rows // ROW_BUCKET)*ROW_BUCKET
+    topology = getTopology(capacity, cols, tuple(neighborhood))
+
+    n_edges = topology.indptr[size]
+    edge_weights = weights.reshape((weights.shape[0], -1))[topology.stencil[:n_edges], topology.sources[:n_edges]]
+    valid = np.isfinite(edge_weights) & (topology.indices[:n_edges] < size)
+    return topology, edge_weights, valid
+
+def compactVertices(edges, n_vertices, terminals):
+    """
+        Renumber the vertices of an edge list densely.
+
+        Only vertices incident to an edge and the terminals get an ID. The
+        numbering keeps the order of the original vertices, so an edge list
+        ordered by the start vertex stays ordered.
+
+        Parameters
+        ----------
+        edges: ndarray, int, (N,2)
+            the edges (v_i, v_j)
+        n_vertices: scalar, int
+            number of original vertices
+        terminals: list of int
+            vertices that keep an ID in any case (e.g. start and end point)
+
+        Returns
+        ---------
+        edges: ndarray, int, (N,2)
+            the edges in compact IDs
+        index: ndarray, int
+            original vertex of every compact ID (ascending)
+    """
+    used = np.zeros(n_vertices, dtype = bool)
+    used[edges.ravel()] = True
+    used[terminals] = True
+    index = np.flatnonzero(used)
+    return np.searchsorted(index, edges), index
+
+def getCompactEdges(weights, neighborhood):
+    """
+        Edges of a weight band between the valid pixels in compact IDs.
+
+        Parameters
+        ----------
+        weights: ndarray, float64, (len(neighborhood)+2, rows, columns)
+            stencil weights of the band (compare EdgeStencil.getStencilWeights)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Returns
+        ---------
+        edges: ndarray, int, (N,2)
+            the edges in compact IDs (CSR order)
+        edge_weights: ndarray, float64
+            the edge weights
+        index: ndarray, int
+            pixel of every compact ID, the first and last ID are the top 
+            left and bottom right pixel
+    """
+    size = weights[0].size
+    topology, edge_weights, valid = getEdgeWeights(weights, neighborhood)
+    n_edges = valid.size
+    edges = np.column_stack((topology.sources[:n_edges][valid], topology.indices[:n_edges][valid]))
+    edges, index = compactVertices(edges, size, [0, size - 1])
+    return edges, edge_weights[valid], index
+
+def getGraph(weights, neighborhood):
+    """
+        Construct the weighted graph of a weight band from the cached topology.
+
+        Edges with infinite stencil weight (invalid pixels) and the surplus
+        rows are removed from a copy of the cached graph. If most edges are
+        invalid, the valid edges are added to an empty graph instead. Either
+        way, the edges keep their order, so the graph equals the one
+        constructed from EdgeStencil.getEdges.
+
+        Parameters
+        ----------
+        weights: ndarray, float64, (len(neighborhood)+2, rows, columns)
+            stencil weights of the band (compare EdgeStencil.getStencilWeights)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Returns
+        ---------
+        g: graph
+            the weighted graph (edge attribute 'weight')
+    """
+    size = weights[0].size
+    topology, edge_weights, valid = getEdgeWeights(weights, neighborhood)
+    n_edges = valid.size
+
+    #sparse bands (e.g. thin corridors): cheaper to add the valid edges
+    if 2*np.count_nonzero(valid) < topology.sources.size:
+        edges = np.column_stack((topology.sources[:n_edges][valid], topology.indices[:n_edges][valid]))
+        g = Graph(n = size, edges = edges, directed = True)
+        g.es['weight'] = edge_weights[valid]
+        return g
+
+    return copyTemplateGraph(weights.shape, neighborhood, edge_weights, valid)
+
+def copyTemplateGraph(shape, neighborhood, edge_weights, valid):
+    """
+        Construct the weighted graph of a weight band from a copy of the 
+        cached graph (compare getGraph).
+
+        Parameters
+        ----------
+        shape: tuple
+            shape of the stencil weights of the band
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+        edge_weights: ndarray, float64
+            weights of the first topology edges (compare getEdgeWeights)
+        valid: ndarray, bool
+            false for the edges to be removed (compare getEdgeWeights)
+
+        Returns
+        ---------
+        g: graph
+            the weighted graph (edge attribute 'weight')
+    """
+    _, rows, cols = shape
+    size = rows*cols
+    n_edges = valid.size
+    g = getTemplateGraph(-(-rows // ROW_BUCKET)*ROW_BUCKET, cols, tuple(neighborhood)).copy()
+    invalid = np.flatnonzero(~valid)
+    if invalid.size or n_edges < g.ecount():
+        g.delete_edges(np.concatenate((invalid, np.arange(n_edges, g.ecount()))).tolist())
+    if size < g.vcount():
+        g.delete_vertices(range(size, g.vcount()))
+    g.es['weight'] = edge_weights[valid]
+    return g
+
+def getCompactGraph(weights, neighborhood):
+    """
+        Construct the weighted graph of the valid pixels of a weight band.
+
+        Pixels outside the corridor (np.nan) get no vertex, so the size of
+        the graph scales with the corridor instead of the band. Bands where
+        most edges are valid are constructed from the cached graph (compare
+        getGraph) and keep all vertices.
+
+        Parameters
+        ----------
+        weights: ndarray, float64, (len(neighborhood)+2, rows, columns)
+            stencil weights of the band (compare EdgeStencil.getStencilWeights)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Returns
+        ---------
+        g: graph
+            the weighted graph (edge attribute 'weight')
+        index: ndarray, int
+            pixel of every vertex (translates paths back to the band), the
+            first and last vertex are the top left and bottom right pixel
+    """
+    size = weights[0].size
+    topology, edge_weights, valid = getEdgeWeights(weights, neighborhood)
+    if 2*np.count_nonzero(valid) >= topology.sources.size:
+        return copyTemplateGraph(weights.shape, neighborhood, edge_weights, valid), np.arange(size)
+
+    n_edges = valid.size
+    edges = np.column_stack((topology.sources[:n_edges][valid], topology.indices[:n_edges][valid]))
+    edges, index = compactVertices(edges, size, [0, size - 1])
+    g = Graph(n = index.size, edges = edges, directed = True)
+    g.es['weight'] = edge_weights[valid]
+    return g, index
+
+def getCSRGraph(weights, neighborhood):
+    """
+        Construct the weighted graph of the valid pixels of a weight band as 
+        sparse CSR matrix.
+
+        Input for scipy.sparse.csgraph. Entry (v_i, v_j) is the weight of the
+        edge from v_i to v_j (explicit zeros are edges). Only valid pixels get
+        a vertex (compare getCompactGraph).
+
+        Parameters
+        ----------
+        weights: ndarray, float64, (len(neighborhood)+2, rows, columns)
+            stencil weights of the band (compare EdgeStencil.getStencilWeights)
+        neighborhood: tuple
+            row steps of the edges to the right neighbors
+
+        Returns
+        ---------
+        graph: csr_matrix, (vertices, vertices)
+            the weighted adjacency matrix
+        index: ndarray, int
+            pixel of every vertex, the first and last vertex are the top 
+            left and bottom right pixel
+    """
+    edges, edge_weights, index = getCompactEdges(weights, neighborhood)
+    #edges are ordered by start vertex
+    indptr = np.searchsorted(edges[:,0], np.arange(index.size + 1))
+    return csr_matrix((edge_weights, edges[:,1], indptr), shape = (index.size, index.size)), index
@@ -0,0 +1,108 @@
+"""
+WeightTable: Exponential edge weights from a lookup table of quantised intensities
+------------------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+#
+# Accuracy of the quantised weights (Parameters.txt: WEIGHT_BITS)
+# ----------------------------------------------------------------
+# The exponential weights of the RPE, ILM and refinement graphs are
+# exp(2 - (v_i + v_j) + w_min) (and exp(2 - v_i + w_min) for edges to the
+# border columns). With b bits, intensities are rounded to multiples of
+# 1/L, L = 2**b - 1, i.e. each by at most 1/(2L). The exponent of a weight
+# changes by at most 1/L, so every quantised weight w' satisfies
+#     exp(-1/L) <= w'/w <= exp(1/L)
+# and so does the cost of every path. The path found with quantised weights
+# costs at most exp(2/L) times the exact shortest path:
+#     12 bit: |relative path cost deviation| <= 2.4e-4, suboptimality <= 4.9e-4
+#     16 bit: |relative path cost deviation| <= 1.5e-5, suboptimality <= 3.1e-5
+# Constant weights (w_min, exp(6)) are not affected.
+from functools import lru_cache
+import numpy as np
+
+w_min = 1e-5
+
+#supported quantisation depths (0: exact weights)
+BITS = (0, 12, 16)
+
+@lru_cache(maxsize = None)
+def getExpTable(bits):
+    """
+        Lookup table of exp(2 - s/L + w_min) for all quantised pair-sums s.
+
+        Intensities of weight bands lie in -2...2 (border columns: -2/+2), the
+        pair-sums of the exponential weights in -2...2 (border edges
+        contribute a single intensity). The table is read-only.
+
+        Parameters
+        ----------
+        bits: scalar, int
+            quantisation depth of the intensities
+
+        Returns
+        ---------
+        table: ndarray, float64, (4L+1)
+            weight of the pair-sum s at index s + 2L
+    """
+    levels = 2**bits - 1
+    table = np.exp(2.0 - np.arange(-2*levels, 2*levels + 1)/levels + w_min)
+    table.setflags(write = False)
+    return table
+
+def quantise(values, bits):
+    """
+        Quantise intensities to integer multiples of 1/(2**bits - 1).
+
+        Parameters
+        ----------
+        values: ndarray
+            intensities (-2...2)
+        bits: scalar, int
+            quantisation depth
+
+        Returns
+        ---------
+        quantised: ndarray, int32
+            the quantised intensities (-2L...2L)
+    """
+    levels = 2**bits - 1
+    return np.rint(np.clip(values, -2.0, 2.0)*levels).astype(np.int32)
+
+def expWeights(values_v_i, values_v_j, bits = 0):
+    """
+        Exponential weights exp(2 - (v_i + v_j) + w_min).
+
+        Exact for bits = 0, else looked up from the table of the quantised
+        pair-sums (see the bound at the top of the module).
+
+        Parameters
+        ----------
+        values_v_i: ndarray
+            first pixels' intensities
+        values_v_j: ndarray or scalar
+            second pixels' intensities (0 for the edges to the border columns)
+
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth: 0 (exact, default), 12 or 16
+
+        Returns
+        ---------
+        weights: ndarray
+            the edge weights
+    """
+    if not bits:
+        return np.exp(2.0 - (values_v_i + values_v_j) + w_min)
+    levels = 2**bits - 1
+    index = quantise(values_v_i, bits) + quantise(values_v_j, bits) + 2*levels
+    return getExpTable(bits)[np.clip(index, 0, 4*levels)]
@@ -15,6 +15,9 @@ PRLEC Framework for OCT Processing and Visualization
 from igraph import *
 import numpy as np
 import cv2
+from Algorithms.GraphCut import ShortestPath, TopologyCache
+from Algorithms.GraphCut.EdgeStencil import getEdgesReference, getStencilWeights, NEIGHBORHOOD_9
+from Algorithms.GraphCut.WeightTable import expWeights
 import scipy.signal as sp
 from FileHandler.ParameterReader import readManRefParameters
 #min value for graph weights
@@ -71,7 +74,7 @@ def propagateRPE(volumeOriginal, segmentation, segmentation_original, saved_slic
     part_volume = volumeOriginal[rect_correction[2]-1:rect_correction[3]+1,:,rect_correction[0]-1:rect_correction[1]+2]
     part_volume = part_volume/np.max(part_volume)
     part_volume = np.swapaxes(part_volume, axis1=0, axis2=2)
-    cropped_segmentation = np.zeros((rect_correction[3] - rect_correction[2] + 2, segmentation.shape[1], rect_correction[1] - rect_correction[0] + 3)).astype('uint8')
+    cropped_segmentation = np.zeros((rect_correction[3] - rect_correction[2] + 2, segmentation.shape[1], rect_correction[1] - rect_correction[0] + 3), dtype = 'uint8')
     
     for key,value in saved_slices.items():
         cropped_segmentation[key-rect_correction[2]+1, :,:] = value[:,rect_correction[0]-1:rect_correction[1]+2].astype('uint8')
@@ -89,9 +92,11 @@ def propagateRPE(volumeOriginal, segmentation, segmentation_original, saved_slic
 
     #Graph-Cut, if too little number of lines for region
     if(mode is 'high'):
-        for i in range(1,cropped_segmentation.shape[0]-1):
-                graph, endnode = getGraph(part_volume[i], cropped_segmentation[i],dictParameters)
-                shortest_path = np.asarray(graph.get_shortest_paths(v=0, to=endnode, weights = 'weight'))
+        #solve all slices of the rectangle at once (slices are independent)
+        weights = [getWeights(part_volume[i], cropped_segmentation[i],dictParameters)[0] for i in range(1,cropped_segmentation.shape[0]-1)]
+        if weights:
+            shortest_paths = ShortestPath.getShortestPaths(np.stack(weights), NEIGHBORHOOD_9, dictParameters['GRAPHCUT_SOLVER'])
+            for i, shortest_path in enumerate(shortest_paths, 1):
                 cropped_segmentation[i] = inpaint(cropped_segmentation[i],shortest_path,dictParameters)
 
     cropped_segmentation = np.swapaxes(cropped_segmentation, axis1=2, axis2=0) 
@@ -155,11 +160,13 @@ def connectpoints(cropped_segmentation,mode,dictParameters):
         cropped_segmentation[k] = buffer_slice
     return cropped_segmentation
 
-def getGraph(_slice, shortest_path,dictParameters):
+def getBand(_slice, shortest_path,dictParameters):
     """ 
-        Construct Graph for Manual BM Refinement.
+        Extract the weight band for Manual RPE Refinement.
         
-        7-neighborhood.
+        Only pixels of the inpainted connecting lines are valid, all others are 
+        np.nan. A column is added at the left (-2) and right (+2) border for 
+        start and end points.
         
         Parameters
         ----------
@@ -172,10 +179,8 @@ def getGraph(_slice, shortest_path,dictParameters):
             
         Returns
         ---------
-        g: graph
-            resulting graph
-        endpoint: scalar
-            endpoint of graph
+        band: ndarray
+            the weight band including border columns
     """ 
     slice_copy = _slice.copy()
     buffer_result = np.zeros((_slice.shape[0],_slice.shape[1]+2))
@@ -192,95 +197,78 @@ def getGraph(_slice, shortest_path,dictParameters):
     buffer_result[:,0] = -2
     buffer_result[:,-1] = 2
 
+    return buffer_result
+
+def getGraph(_slice, shortest_path,dictParameters, reference = False):
+    """ 
+        Construct Graph for Manual BM Refinement.
+        
+        7-neighborhood.
+        
+        Parameters
+        ----------
+        _slice: ndarray
+            calcualted weights
+        shortest_path: ndarray
+            shortest path from predecessor
+        dictParameters: dictionary
+            Parameters from parameter.txt
+            
+        Optional
+        ----------
+        reference: boolean
+            true to construct the edges pixel by pixel (reference builder)
+            
+        Returns
+        ---------
+        g: graph
+            resulting graph
+        endpoint: scalar
+            endpoint of graph
+    """ 
+    if not reference:
+        weights, endnode = getWeights(_slice, shortest_path, dictParameters)
+        return TopologyCache.getGraph(weights, NEIGHBORHOOD_9), endnode
+    
     #2-D to 1-D conversion
+    buffer_result = getBand(_slice, shortest_path, dictParameters)
     slice_1D = buffer_result.flatten()
     
     # set up a graph where every pixel is a node (edges are transitions in between)
     g = Graph(directed=True)
     g.add_vertices(slice_1D.size)
     
-    sx = buffer_result.shape[1]
-    edge_list = []
-    weight_list = []
-
-    for idx in range(slice_1D.size):
-        if np.isnan(slice_1D[idx]):
-            continue
-    
-        v_i = idx
-        #7-pixel neighborhood, to increase/decrease, change here
-        if((v_i+1) % sx != 0 ):
-            v_j = v_i +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeightExp(slice_1D[v_i],slice_1D[v_j]))
-                
-            v_j = v_i - sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeightExp(slice_1D[v_i],slice_1D[v_j]))
-
-            v_j = v_i + sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeightExp(slice_1D[v_i],slice_1D[v_j]))
-                
-            v_j = v_i - 2*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeightExp(slice_1D[v_i],slice_1D[v_j]))
-
-            v_j = v_i + 2*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeightExp(slice_1D[v_i],slice_1D[v_j]))
-                
-            v_j = v_i - 3*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeightExp(slice_1D[v_i],slice_1D[v_j]))
-
-            v_j = v_i + 3*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeightExp(slice_1D[v_i],slice_1D[v_j]))
-                
-            v_j = v_i - 4*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeightExp(slice_1D[v_i],slice_1D[v_j]))
-
-            v_j = v_i + 4*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeightExp(slice_1D[v_i],slice_1D[v_j]))
-
-        if(slice_1D[v_i] > 1.0 or slice_1D[v_i] < -1.0):
-            slice_1D[v_i] = 0.0
-            v_j = v_i - sx
-            if (v_j >= 0 and v_j < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(w_min)
-            v_j = v_i + sx
-            if (v_j >= 0 and v_j < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(w_min)
-            
-        else:
-            v_j = v_i - sx
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeightExp(slice_1D[v_i],slice_1D[v_j]))
-                
-            v_j = v_i + sx
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateWeightExp(slice_1D[v_i],slice_1D[v_j]))
+    edge_list, weight_list = getEdgesReference(slice_1D, buffer_result.shape[1], NEIGHBORHOOD_9, calculateWeightExp)
                 
     g.add_edges(edge_list)
     g.es['weight'] = weight_list
 
     return g, slice_1D.size-1
+
+def getWeights(_slice, shortest_path,dictParameters):
+    """ 
+        Calculate the stencil weights for Manual RPE Refinement (9-neighborhood).
+        
+        Input for the shortest path solvers (compare ShortestPath.getShortestPath).
+        
+        Parameters
+        ----------
+        _slice: ndarray
+            calcualted weights
+        shortest_path: ndarray
+            shortest path from predecessor
+        dictParameters: dictionary
+            Parameters from parameter.txt
+            
+        Returns
+        ---------
+        weights: ndarray
+            the stencil weights of the weight band
+        endpoint: scalar
+            endpoint of graph
+    """ 
+    band = getBand(_slice, shortest_path, dictParameters)
+    return getStencilWeights(band, NEIGHBORHOOD_9, lambda v_i, v_j: calculateWeightsExp(v_i, v_j, dictParameters.get('WEIGHT_BITS', 0))), band.size-1
         
 def calculateWeightExp(value_v_i, value_v_j):    
     """ 
@@ -303,6 +291,29 @@ def calculateWeightExp(value_v_i, value_v_j):
     else:
         return np.exp(2.0 - (value_v_i + value_v_j) + w_min)
     
+def calculateWeightsExp(values_v_i, values_v_j, bits = 0):    
+    """ 
+        Calculate the exponential weights for arrays of edges (compare calculateWeightExp).
+        
+        Parameters
+        ----------
+        values_v_i: ndarray
+            intensities at vertices vi
+        values_v_j: ndarray
+            intensities at vertices vj
+            
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+            
+        Returns
+        ---------
+        weights: ndarray
+            weights between vi and vj
+    """ 
+    return np.where((values_v_j > 1.0) | (values_v_j < -1.0), expWeights(values_v_i, 0, bits), expWeights(values_v_i, values_v_j, bits))
+    
 def inpaint(_slice, shortest_path,dictParameters):
     """ 
         Inpaint path into segmentation.
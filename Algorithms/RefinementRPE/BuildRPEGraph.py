@@ -15,34 +15,36 @@ PRLEC Framework for OCT Processing and Visualization
 from igraph import *
 import numpy as np
 import cv2
+from Algorithms.GraphCut import TopologyCache
+from Algorithms.GraphCut.WeightTable import expWeights
+from Algorithms.GraphCut.EdgeStencil import getEdgesReference, getStencilWeights, NEIGHBORHOOD_9
 # added to weights to avoid division by zero (called system stability)
 w_min = 1e-5
 
-def getRPEGraph(_slice, shortest_path, scaling, y_offset):
+def getRPEBand(_slice, shortest_path, scaling, y_offset):
     """ 
-        Construct the undirected, weighted RPE graph from the calculated.
+        Extract the weight band of the RPE graph.
         
-        For the initial slice (center), an extensive calculation is conducted.
-        Afterwards, the shortest path of the predecessor is dilated to
-        speed up the process. Invalid edges are set to np.nan
+        For the initial slice (center), a fixed region around the flattened RPE 
+        is extracted. Afterwards, the shortest path of the predecessor is dilated 
+        to speed up the process. Invalid pixels are set to np.nan. A column is 
+        added at the left (-2) and right (+2) border for start and end points.
         
         Parameters
         ----------
         _slice: ndarray
             weight slice
-        scaling: scalar
-            scaling factor for calculation
         shortest_path: ndarray
             the shortest path from the predecessor
+        scaling: scalar
+            scaling factor for calculation
         y_offset: scalar
             the top row extracted from the predecessor
             
         Returns
         ---------
-        g: graph
-            the resulting segmentation
-        endpoint: scalar, int
-            the endpoint of the graph
+        band: ndarray
+            the weight band including border columns
         y_offset:
             the top row extracted from the predecessor
             
@@ -59,7 +61,7 @@ def getRPEGraph(_slice, shortest_path, scaling, y_offset):
         
         slice_buffer = cv2.copyMakeBorder(cv2.copyMakeBorder(slice_buffer, top=0,bottom=0, left=0, right=1, borderType= cv2.BORDER_CONSTANT, value =  2.0), top=0,bottom=0, left=1, right=0, borderType= cv2.BORDER_CONSTANT, value = -2.0)
         slice_buffer = np.where(slice_buffer == -1, np.nan , slice_buffer)
-        slice_1D = slice_buffer.flatten()
+        return slice_buffer, start_slice
     #has predecessor
     else:
         slice_buffer = _slice.copy()
@@ -75,7 +77,7 @@ def getRPEGraph(_slice, shortest_path, scaling, y_offset):
         min_y = np.amin(path_y[int(start_x):int(end_x)])
         max_y = np.amax(path_y[int(start_x):int(end_x)])
     
-        buffer_result = np.zeros((slice_buffer.shape)).astype(np.float32)
+        buffer_result = np.zeros((slice_buffer.shape), dtype = np.float32)
         buffer_result[path_y, path_x] = 1.0
         #dilate shortest path from predecessor
         kernel = np.maximum(int(10*scaling),2)
@@ -89,103 +91,96 @@ def getRPEGraph(_slice, shortest_path, scaling, y_offset):
         buffer_result[:,-1] = 2
     
         buffer_result = np.where(buffer_result == -1, np.nan , buffer_result)
-        slice_1D = buffer_result.flatten()
-    # construct graph
-    g = Graph(directed=True)
-    g.add_vertices(slice_1D.size)
-    
-    sx = slice_buffer.shape[1]
-    edge_list = []
-    weight_list = []
+        return buffer_result, min_y - y_offset
 
-    #construct with 9-neighborhood
-    for idx in range(slice_1D.size):
-        if np.isnan(slice_1D[idx]):
-            continue
-    
-        v_i = idx
+def getRPEGraph(_slice, shortest_path, scaling, y_offset, bits = 0, reference = False):
+    """ 
+        Construct the undirected, weighted RPE graph from the calculated.
         
-        #pixel is not at the right boundary of the image -> has right neighbors
-        if((v_i+1) % sx != 0 ):
-            v_j = v_i +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
-            v_j = v_i - sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
-            v_j = v_i + sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-                
-            v_j = v_i - 2*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
-            v_j = v_i + 2*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-                
-            v_j = v_i - 3*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
-            v_j = v_i + 3*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-                
-            v_j = v_i - 4*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
-            v_j = v_i + 4*sx +1
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
-                    
-        #pixel is located at the left/right boundary -> zero weights
-        if(slice_1D[v_i] > 1.0 or slice_1D[v_i] < -1.0):
-            slice_1D[v_i] = 0.0
-            v_j = v_i - sx
-            if (v_j >= 0 and v_j < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(w_min)
-            v_j = v_i + sx
-            if (v_j >= 0 and v_j < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(w_min)
+        For the initial slice (center), an extensive calculation is conducted.
+        Afterwards, the shortest path of the predecessor is dilated to
+        speed up the process. Invalid edges are set to np.nan
+        
+        Parameters
+        ----------
+        _slice: ndarray
+            weight slice
+        scaling: scalar
+            scaling factor for calculation
+        shortest_path: ndarray
+            the shortest path from the predecessor
+        y_offset: scalar
+            the top row extracted from the predecessor
             
-        else:
-            #not a boundary pixel
-            v_j = v_i - sx
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
-                
-            v_j = v_i + sx
-            if (v_j  >= 0 and v_j  < slice_1D.shape[0] and np.isnan(slice_1D[v_j]) == False):
-                edge_list.append((v_i, v_j))
-                weight_list.append(calculateExpWeight(slice_1D[v_i],slice_1D[v_j],shortest_path))
-
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+        reference: boolean
+            true to construct the edges pixel by pixel (reference builder)
+            
+        Returns
+        ---------
+        g: graph
+            the resulting segmentation
+        endpoint: scalar, int
+            the endpoint of the graph
+        y_offset:
+            the top row extracted from the predecessor
+            
+    """   
+    if not reference:
+        weights, endnode, y_offset = getRPEWeights(_slice, shortest_path, scaling, y_offset, bits)
+        return TopologyCache.getGraph(weights, NEIGHBORHOOD_9), endnode, y_offset
+    
+    band, y_offset = getRPEBand(_slice, shortest_path, scaling, y_offset)
+    slice_1D = band.flatten()
+    # construct graph with 9-neighborhood
+    g = Graph(directed=True)
+    g.add_vertices(slice_1D.size)
+    
+    edge_list, weight_list = getEdgesReference(slice_1D, band.shape[1], NEIGHBORHOOD_9, lambda v_i, v_j: calculateExpWeight(v_i, v_j, shortest_path))
                 
     g.add_edges(edge_list)
     g.es['weight'] = weight_list
     
-    if shortest_path is None:
-        return g, slice_1D.shape[0]-1, start_slice
-    else:
-        return g, slice_1D.size-1, min_y - y_offset
+    return g, slice_1D.size-1, y_offset
+
+def getRPEWeights(_slice, shortest_path, scaling, y_offset, bits = 0):
+    """ 
+        Calculate the stencil weights of the RPE graph (9-neighborhood).
+        
+        Input for the shortest path solvers (compare ShortestPath.getShortestPath).
+        
+        Parameters
+        ----------
+        _slice: ndarray
+            weight slice
+        shortest_path: ndarray
+            the shortest path from the predecessor
+        scaling: scalar
+            scaling factor for calculation
+        y_offset: scalar
+            the top row extracted from the predecessor
+            
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+            
+        Returns
+        ---------
+        weights: ndarray
+            the stencil weights of the weight band
+        endpoint: scalar, int
+            the endpoint of the graph
+        y_offset:
+            the top row extracted from the predecessor
+            
+    """   
+    band, y_offset = getRPEBand(_slice, shortest_path, scaling, y_offset)
+    weights = getStencilWeights(band, NEIGHBORHOOD_9, lambda v_i, v_j: calculateExpWeights(v_i, v_j, shortest_path, bits))
+    return weights, band.size-1, y_offset
 
 def calculateExpWeight(value_v_i, value_v_j,shortest_path):
     """ 
@@ -213,4 +208,34 @@ def calculateExpWeight(value_v_i, value_v_j,shortest_path):
     elif shortest_path is not None and (value_v_j == 0 or value_v_i == 0):
         return np.exp(6.0)
     else:
-        return np.exp(2.0 - (value_v_i + value_v_j) + w_min)
\ No newline at end of file
+        return np.exp(2.0 - (value_v_i + value_v_j) + w_min)
+
+def calculateExpWeights(values_v_i, values_v_j, shortest_path, bits = 0):
+    """ 
+        Exponential weight calculation for arrays of edges (compare calculateExpWeight).
+        
+        Parameters
+        ----------
+        values_v_i: ndarray
+            first pixels' intensities
+        values_v_j: ndarray
+            second pixels' intensities
+        shortest_path: ndarray
+            when initial slice (shortest path = None), different behavior
+            
+        Optional
+        ----------
+        bits: scalar, int
+            quantisation depth of the weight lookup table (0: exact, compare WeightTable)
+            
+        Returns
+        ----------
+        weights: ndarray
+            the edge weights
+    """
+    if shortest_path is None:
+        dark = (values_v_j < 0.4) | (values_v_i < 0.4)
+    else:
+        dark = (values_v_j == 0) | (values_v_i == 0)
+    weights = np.where(dark, np.exp(6.0), expWeights(values_v_i, values_v_j, bits))
+    return np.where((values_v_j > 1.0) | (values_v_j < -1.0), expWeights(values_v_i, 0, bits), weights)
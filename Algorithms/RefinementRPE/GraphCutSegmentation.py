@@ -13,25 +13,41 @@ PRLEC Framework for OCT Processing and Visualization
 # Copyright (C) 2018-2019 - Daniel Stromer
 # PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
 import numpy as np
-from igraph import *
 import threading
 import Algorithms.RefinementRPE.BuildRPEGraph as gm_rpe
 from Algorithms.RefinementRPE.InpaintSegmentation import inpaint
-shortestPath={}
-y_offset_dict = {}
+from Algorithms.GraphCut import ShortestPath
+from Algorithms.GraphCut.EdgeStencil import NEIGHBORHOOD_9
 
-class thread_pipeline (threading.Thread):
+class PropagationContext:
     """
-        Threaded Graph-Cut pipeline for RPE Refinement
+        State of one Graph-Cut propagation run (one per execute_graphcut 
+        call, such that several volumes can be refined concurrently).
         
-        Global Parameters
+        The dicts are indexed by the direction: 1 (down) and -1 (up).
+        
+        Attributes
         ----------------
         shortestPath: dict
             storing the latest shortest path as input for next iteration
         y_offset_dict: dict
             storing the latest y_offset as input for next iteration -> runtime minimization
     """
-    def __init__(self, threadID ,volume_slice, gradient_slice, prior_shortest_path, scaling, UPORDOWN, mode, dictParameters):
+    def __init__(self):
+        """
+            Initializing empty state.
+        """
+        self.shortestPath = {}
+        self.y_offset_dict = {}
+
+class thread_pipeline (threading.Thread):
+    """
+        Threaded Graph-Cut pipeline for RPE Refinement
+        
+        The state of the run (latest shortest path and y_offset per 
+        direction) is read from and stored to a PropagationContext.
+    """
+    def __init__(self, threadID ,volume_slice, gradient_slice, prior_shortest_path, scaling, UPORDOWN, mode, dictParameters, context, solver = 'igraph'):
         """
             Initializing Pipeline.
             
@@ -54,8 +70,16 @@ class thread_pipeline (threading.Thread):
                 'RPE', or 'ILM'
             dictParameters: dictionary
                 parameters from parameters.txt
+            context: PropagationContext
+                state of the run
+            
+            Optional
+            ----------
+            solver: string
+                'igraph', 'scipy' or 'sweep' (compare ShortestPath.getShortestPath)
         """
         threading.Thread.__init__(self)
+        self.context = context
         self.threadID = threadID
         self.volume_slice = volume_slice
         self.gradient_slice = gradient_slice
@@ -64,6 +88,7 @@ class thread_pipeline (threading.Thread):
         self.scaling = scaling
         self.mode = mode
         self.dictParameters = dictParameters
+        self.solver = solver
         
     def run(self):
         """
@@ -84,14 +109,14 @@ class thread_pipeline (threading.Thread):
         """
         
         #restore y_offset
-        y_offset = y_offset_dict[-1]
+        y_offset = self.context.y_offset_dict[-1]
         if('down' is self.UPORDOWN):
-            y_offset = y_offset_dict[1]
+            y_offset = self.context.y_offset_dict[1]
         
         #Calculate Graph and shortest path
-        graph, endnode, y_offset = gm_rpe.getRPEGraph(self.gradient_slice, self.prior_shortest_path, self.scaling, y_offset)
+        weights, endnode, y_offset = gm_rpe.getRPEWeights(self.gradient_slice, self.prior_shortest_path, self.scaling, y_offset, self.dictParameters.get('WEIGHT_BITS', 0))
             
-        shortest_path = np.asarray(graph.get_shortest_paths(v=0, to=endnode, weights = 'weight'))
+        shortest_path = ShortestPath.getShortestPath(weights, NEIGHBORHOOD_9, self.solver)
         if(shortest_path.size == 0):
             shortest_path = self.prior_shortest_path
         #Inpaint segmentation  
@@ -99,14 +124,14 @@ class thread_pipeline (threading.Thread):
 
         #storage variables for next iteration
         if('down' is self.UPORDOWN):
-            shortestPath[1] = shortest_path.flatten()
-            y_offset_dict[1] = y_offset
+            self.context.shortestPath[1] = shortest_path.flatten()
+            self.context.y_offset_dict[1] = y_offset
         else:
-            shortestPath[-1] = shortest_path.flatten()
-            y_offset_dict[-1] = y_offset
+            self.context.shortestPath[-1] = shortest_path.flatten()
+            self.context.y_offset_dict[-1] = y_offset
 
     
-def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters):
+def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters, solver = None):
     """
         Execute Graph-Cut algorithm.
         
@@ -122,6 +147,9 @@ def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters)
             mode ='RPE' segments RPE, 'ILM' the inner limiting membrane
         dictParameters: dictionary
             parameters from parameters.txt
+        solver: string, optional
+            shortest path solver: 'igraph', 'scipy' or 'sweep' (compare 
+            ShortestPath.getShortestPath), default: GRAPHCUT_SOLVER of parameters.txt
         Return
         ------
         result: numpy array 2D/3D
@@ -129,8 +157,13 @@ def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters)
         
     """
     
+    if solver is None:
+        solver = dictParameters.get('GRAPHCUT_SOLVER', 'igraph')
+    
+    context = PropagationContext()
+    
     #result array
-    result = np.zeros((len(oct_volume),oct_volume[0].shape[0], oct_volume[0].shape[1])).astype("uint8")
+    result = np.zeros((len(oct_volume),oct_volume[0].shape[0], oct_volume[0].shape[1]), dtype = "uint8")
 
     index = 0
     center_slice = int(len(gradient_volume)/2)
@@ -145,18 +178,18 @@ def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters)
         #process initial slice (central)
         if index == 0:
             #compute graph and shortest path
-            initial_graph, endnode, y_offset = gm_rpe.getRPEGraph(gradient_volume[center_slice], None, scaling,None )
+            weights, endnode, y_offset = gm_rpe.getRPEWeights(gradient_volume[center_slice], None, scaling,None, dictParameters.get('WEIGHT_BITS', 0))
             
-            shortestPath[1] = np.asarray(initial_graph.get_shortest_paths(v=0, to=endnode, weights = 'weight')).flatten()  
-            shortestPath[-1] = shortestPath[1]
+            context.shortestPath[1] = ShortestPath.getShortestPath(weights, NEIGHBORHOOD_9, solver)
+            context.shortestPath[-1] = context.shortestPath[1]
             
-            if(shortestPath[1].size == 0):
+            if(context.shortestPath[1].size == 0):
                 raise Exception('no path found')
             #store offset
-            y_offset_dict[1] = y_offset
-            y_offset_dict[-1] = y_offset
+            context.y_offset_dict[1] = y_offset
+            context.y_offset_dict[-1] = y_offset
             #inpaint shortest path
-            result[center_slice] = inpaint(oct_volume[center_slice],shortestPath[1], y_offset, mode, dictParameters)
+            result[center_slice] = inpaint(oct_volume[center_slice],context.shortestPath[1], y_offset, mode, dictParameters)
             #unflatten slice
             index += 1
             continue
@@ -164,11 +197,11 @@ def execute_graphcut(oct_volume, gradient_volume, scaling, mode, dictParameters)
         #run through volume
         threads = []
         if (center_slice-index) >= 0:
-            thread = thread_pipeline((center_slice-index),oct_volume[(center_slice-index)], gradient_volume[(center_slice-index)], shortestPath[1],scaling, 'down', mode, dictParameters)
+            thread = thread_pipeline((center_slice-index),oct_volume[(center_slice-index)], gradient_volume[(center_slice-index)], context.shortestPath[1],scaling, 'down', mode, dictParameters, context, solver)
             thread.start()
             threads.append(thread)
         if (center_slice+index) < len(gradient_volume):
-            thread = thread_pipeline((center_slice+index),oct_volume[(center_slice+index)], gradient_volume[(center_slice+index)], shortestPath[-1],scaling, 'up', mode, dictParameters)
+            thread = thread_pipeline((center_slice+index),oct_volume[(center_slice+index)], gradient_volume[(center_slice+index)], context.shortestPath[-1],scaling, 'up', mode, dictParameters, context, solver)
             thread.start()
             threads.append(thread)
         
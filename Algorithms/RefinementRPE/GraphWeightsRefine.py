@@ -14,14 +14,16 @@ PRLEC Framework for OCT Processing and Visualization
 # PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
 import numpy as np
 import cv2
+from Algorithms.GraphCut.PreprocessingCache import getCached, getFingerprint, CACHE_MB
+from Algorithms.GraphCut.ParallelSlices import bilateralSlices
 
-def runWeightCalculation(volume, segmentation, dictParameters):
+def runWeightCalculation(volume, segmentation, dictParameters, workers = None):
     """
         Calculating gradients for all slices of the volume
         
         The volume is bilateral filtered in the en-face plane. After smoothing each slice with BF, 
         each B-scan is filtered again and area above the ILm and CC area beneath Bruch's Membrane 
-        is excluded.
+        is excluded. The smoothed volumes are cached (PreprocessingCache).
         
         Parameters
         ----------
@@ -30,20 +32,31 @@ def runWeightCalculation(volume, segmentation, dictParameters):
         segmentation: ndarray 
             segmentation volume
         
+        Optional
+        ----------
+        workers: scalar, int
+            number of filter threads (0: number of CPU cores, compare 
+            ParallelSlices), default: FILTER_WORKERS of parameters.txt
+        
         Return
         ------
         volume_res: list of ndarrays
             list of volume slices that were processed
         
     """
-    
+    if workers is None:
+        workers = dictParameters.get('FILTER_WORKERS', 1)
     bf_enface = dictParameters['REF_RPE_BF_ENFACE']
+    bf_bscan = dictParameters['REF_RPE_BF_BSCAN']
+    cache_mb = dictParameters.get('CACHE_MB', CACHE_MB)
+    #no fingerprint (hash of the volume) if the cache is disabled
+    key = (getFingerprint(volume) if cache_mb else None, tuple(int(v) for v in bf_enface))
 
-    volume_smoothed = np.swapaxes(volume, axis1 = 1, axis2 = 0)
-    volume_smoothed = np.array([cv2.bilateralFilter(_slice,bf_enface[0],bf_enface[1],bf_enface[2]) for _slice in volume_smoothed])
-    volume_smoothed = np.swapaxes(volume_smoothed, axis1 = 0, axis2 = 1)
+    volume_smoothed = getCached(('enface',) + key, lambda: smoothEnface(volume, bf_enface, workers), cache_mb)
+    volume_smoothed = getCached(('bscan',) + key + (tuple(int(v) for v in bf_bscan),), lambda: bilateralSlices(volume_smoothed, bf_bscan, workers), cache_mb)
     
-    volume_res = [calculateGradients(_slice, i, segmentation,dictParameters) for i,_slice in enumerate(volume_smoothed)]
+    volume_smoothed = np.asarray(volume_smoothed)
+    volume_res = list(np.where(getMask(segmentation, dictParameters), -1, volume_smoothed).astype(volume_smoothed.dtype, copy = False))
     
     return volume_res
 
@@ -66,13 +79,99 @@ def calculateGradients(_slice, i, segmentation,dictParameters):
             resulting gradient image
     """
     bf_bscan = dictParameters['REF_RPE_BF_BSCAN']
-    result = cv2.bilateralFilter(_slice,bf_bscan[0],bf_bscan[1],bf_bscan[2])
+    return maskSlice(cv2.bilateralFilter(_slice,bf_bscan[0],bf_bscan[1],bf_bscan[2]), i, segmentation, dictParameters)
+
+def smoothEnface(volume, bf_enface, workers = 1):
+    """
+        Bilateral filter the en-face planes of the volume
+        
+        Parameters
+        ----------
+        volume: ndarray
+            oct input volume
+        bf_enface: ndarray, int, size 3
+            bilateral filter values
+        
+        Optional
+        ----------
+        workers: scalar, int
+            number of filter threads (0: number of CPU cores)
+        
+        Return
+        ------
+        volume_smoothed: ndarray
+            the smoothed volume
+    """
+    volume_smoothed = np.swapaxes(volume, axis1 = 1, axis2 = 0)
+    volume_smoothed = np.array(bilateralSlices(volume_smoothed, bf_enface, workers))
+    return np.swapaxes(volume_smoothed, axis1 = 0, axis2 = 1)
 
-    y_coord_BM = np.where(segmentation[i].transpose() == dictParameters['BM_VALUE'])[1]
-    y_coord_ILM = np.where(segmentation[i].transpose() == dictParameters['ILM_VALUE'])[1]
+def getMask(segmentation, dictParameters):
+    """
+        Area above the ILM and beneath Bruch's membrane of all slices
+        
+        One row index comparison broadcast over the volume. A column 
+        without ILM (BM) is not masked above the ILM (beneath the BM).
+        
+        Parameters
+        ----------
+        segmentation: ndarray
+            segmentation volume (slices, rows, columns)
+        dictParameters: dictionary
+            Parameters from parameters.txt
+        
+        Return
+        ------
+        mask: numpy array 3D, bool
+            true for the excluded pixels
+    """
+    segmentation = np.asarray(segmentation)
+    n_rows = segmentation.shape[1]
+    rows = np.arange(n_rows).reshape(1, -1, 1)
+    #first labelled row of every column (slices, 1, columns)
+    y_coord_ILM = getLabelRows(segmentation, dictParameters['ILM_VALUE'], -1)
+    y_coord_BM = getLabelRows(segmentation, dictParameters['BM_VALUE'], n_rows)
+    return (rows <= y_coord_ILM) | (rows >= y_coord_BM)
 
-    for x in range(segmentation[i].shape[1]):
-        result[0:y_coord_ILM[x]+1,x] = -1
-        result[y_coord_BM[x]:segmentation[i].shape[1]+1,x] = -1
+def getLabelRows(segmentation, value, missing):
+    """
+        First row of a label in every column of all slices
+        
+        Parameters
+        ----------
+        segmentation: ndarray
+            segmentation volume (slices, rows, columns)
+        value: scalar, int
+            the label
+        missing: scalar, int
+            row of columns without the label
+        
+        Return
+        ------
+        rows: numpy array 3D, int, (slices, 1, columns)
+            the rows of the label
+    """
+    is_label = segmentation == value
+    rows = is_label.argmax(axis = 1)[:,None,:]
+    return np.where(np.take_along_axis(is_label, rows, axis = 1), rows, missing)
 
-    return result
\ No newline at end of file
+def maskSlice(result, i, segmentation, dictParameters):
+    """
+        Exclude the area above the ILM and beneath Bruch's membrane of a 
+        B-scan filtered slice
+        
+        Parameters
+        ----------
+        result: ndarray 
+            B-scan filtered slice
+        i: scalar
+            current slice
+        segmentation: ndarray
+            segmentation volume
+        
+        Return
+        ------
+        result: numpy array 2D
+            resulting gradient image
+    """
+    return np.where(getMask(segmentation[i:i+1], dictParameters)[0], -1, result).astype(result.dtype, copy = False)
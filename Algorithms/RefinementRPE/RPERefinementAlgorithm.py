@@ -15,6 +15,8 @@ PRLEC Framework for OCT Processing and Visualization
 import numpy as np
 from Algorithms.RefinementRPE import GraphWeightsRefine
 from Algorithms.RefinementRPE.GraphCutSegmentation import execute_graphcut
+from Algorithms.GraphCut.MemoryBudget import StageMemory
+from Algorithms.Flattening.ShiftField import applyShifts
 import warnings
 from FileHandler.ParameterReader import readRPERefinementDict
 warnings.filterwarnings("ignore")
@@ -31,6 +33,8 @@ class RPERefinementClass:
         Parameter used from Parameters text:
             - REF_RPE_BF_ENFACE: En-Face smoothing bilateral filter values
             - REF_RPE_BF_BSCAN : B-scan smoothing bilateral filter values
+            - MEMORY_BUDGET: no weight cache and peak memory report per stage
+            - MEMORY_TRACE: peak memory traced with tracemalloc (slow) instead of sampled
     """
     def __init__(self, volume, segmentation, shiftedValues, scaling = 1):
         """
@@ -49,10 +53,14 @@ class RPERefinementClass:
             
         """
         self.scaling = scaling
-        max_value = np.max(volume)
-        vol = volume.copy()
         #get parameters from parameters text
         self.dictParameters = readRPERefinementDict()
+        self.budget = self.dictParameters['MEMORY_BUDGET']
+        if self.budget:
+            self.dictParameters['CACHE_MB'] = 0
+        self.memory = StageMemory(self.budget, self.dictParameters['MEMORY_TRACE'])
+        #float32 copy, normalised in place after flattening
+        vol = np.array(volume, dtype = np.float32)
         
         im_center_y = int(segmentation.shape[1]//2)  
         self.shiftedValues = shiftedValues.astype('int32')
@@ -60,14 +68,11 @@ class RPERefinementClass:
         for z in range(vol.shape[0]):
             coordinates_bruchs = np.where(segmentation[z].transpose() == self.dictParameters['BM_VALUE'])[1]
             self.shiftedValues[z,:]= -coordinates_bruchs[:] + im_center_y
-            for x in range (vol.shape[2]):
-                vol[z,:,x] = np.roll(vol[z,:,x],self.shiftedValues[z][x], axis= 0)  
-                   
-        for z in range(segmentation.shape[0]):
-            for x in range (segmentation.shape[2]):          
-                segmentation[z,:,x] = np.roll(segmentation[z,:,x],self.shiftedValues[z][x], axis= 0)
+        applyShifts(vol, self.shiftedValues, inplace = True)
+        applyShifts(segmentation, self.shiftedValues, inplace = True)
         
-        self.oct_volume = [vol_slice/max_value for vol_slice in vol]
+        vol /= np.max(vol)
+        self.oct_volume = vol
 
         self.segmentation = segmentation
         
@@ -77,8 +82,11 @@ class RPERefinementClass:
         """        
         try:
             #Calculate graph weights and run multi-threaded pipeline
-            smoothed = GraphWeightsRefine.runWeightCalculation(self.oct_volume, self.segmentation, self.dictParameters)
-            self.result = execute_graphcut(self.oct_volume, smoothed, self.scaling, 'RPE', self.dictParameters)
+            with self.memory.stage('weights'):
+                smoothed = GraphWeightsRefine.runWeightCalculation(self.oct_volume, self.segmentation, self.dictParameters)
+            with self.memory.stage('graphcut'):
+                self.result = execute_graphcut(self.oct_volume, smoothed, self.scaling, 'RPE', self.dictParameters)
+                del smoothed
         except Exception as e:
             print('Failed:', e)
         
@@ -95,11 +103,9 @@ class RPERefinementClass:
         self.result = np.where(self.segmentation == self.dictParameters['ILM_VALUE'], self.dictParameters['ILM_VALUE'], self.result)
         
         #flatten
-        for z in range(self.result.shape[0]):
-            for x in range (self.result.shape[2]):          
-                self.result[z,:,x] = np.roll(self.result[z,:,x],-self.shiftedValues[z][x], axis= 0)
+        applyShifts(self.result, self.shiftedValues, inverse = True, inplace = True)
                 
-        self.shiftedValues =np.zeros((self.shiftedValues.shape[0], self.shiftedValues.shape[1])).astype('int32')
+        self.shiftedValues =np.zeros((self.shiftedValues.shape[0], self.shiftedValues.shape[1]), dtype = 'int32')
         return self.result
     
     def runPipeline(self):
@@ -112,4 +118,8 @@ class RPERefinementClass:
                 inpainted BM, RPE and ILM layer
         """     
         self.run()
-        return self.getResult().astype('uint8')
\ No newline at end of file
+        with self.memory.stage('result'):
+            result = self.getResult().astype('uint8', copy = False)
+        if self.budget:
+            print(self.memory.report())
+        return result
\ No newline at end of file
@@ -14,12 +14,12 @@ PRLEC Framework for OCT Processing and Visualization
 # PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
 import numpy as np
 import cv2
-from sklearn import linear_model
-from sklearn.preprocessing import PolynomialFeatures
+from Algorithms.Flattening.PolynomialRansac import fitPolynomials
+from Algorithms.Flattening.FlatteningCache import getKey, getShifts
 #sigma for Gaussian filter
 sigma = (6.0,3.0)
 
-def runSlowScanRegistration(volume, flattening_polynomial):
+def runSlowScanRegistration(volume, flattening_polynomial, cache_directory = None):
     """
         Flattening an OCT volume in slow-scan direction.
         
@@ -27,53 +27,77 @@ def runSlowScanRegistration(volume, flattening_polynomial):
         of each A-scan stored. The resulting pints are ransac-filtered
         and fitted by a polynomial of 2nd order. Finally the B-scan center
         index is extracted the entire B-scan shifted, such that the center 
-        A-scan is located in the axial center.
+        A-scan is located in the axial center. The shifts are cached 
+        (compare FlatteningCache).
+        
+        Optional
+        ----------
+        cache_directory: string
+            directory of the volume to store the shifts on disk
         
     """
     #return volumes
     shiftedVolume = []
     shiftedValues = []
-    
-    im_center_y = int(volume[0].shape[0]//2)
 
-    counter = 0
-    prev_y = 0
-
-    x_idx = np.arange(volume[0].shape[1]).astype(np.int32)
     #fill missing columns with neighbors
     volume = fillMissingColumns(volume).astype('float32')
-
+    key = getKey('slowscan', volume, flattening_polynomial, sigma)
+    shiftMap = getShifts(key, lambda: getRegistrationShifts(volume, flattening_polynomial), cache_directory)
+    
     #iterate through slices
-    for i,_slice in enumerate(volume):
-        #Gaussian blurring
-        blurred = cv2.GaussianBlur(_slice, (0,0), sigmaX = sigma[0], sigmaY=sigma[1])
-        # max of each A-scan
-        y_idx = np.argmax(blurred, axis = 0)
-        #outlier removal
-        try:
-            degree = flattening_polynomial
-            x_idx, y_idx = ransac_fit(x_idx, y_idx, degree)
-        except:
-            try:
-                degree = flattening_polynomial
-                x_idx, y_idx = ransac_fit(x_idx, y_idx, degree) 
-            except:
-                y_idx = prev_y
-        #get center y and translate volume
-        fit_center_y = y_idx[y_idx.size//2]
-        roll_value = np.zeros((y_idx.size)).astype('int32') + (im_center_y-fit_center_y)
+    for _slice, roll_value in zip(volume, shiftMap):
         new_slice = np.roll(_slice,roll_value[0], axis= 0)
         #store B-scan and shifts
         shiftedValues.append(roll_value)
         shiftedVolume.append(new_slice)
-        counter += 1
-        prev_y = y_idx
         
     return shiftedVolume, shiftedValues
 
+def getRegistrationShifts(volume, flattening_polynomial):
+    """
+        Shift of every B-scan in slow-scan direction (compare runSlowScanRegistration)
+        
+        Parameters
+        ----------
+        volume: numpy array 3D
+            column filled volume
+        flattening_polynomial: scalar
+            degree of the polynomial
+            
+        Return
+        ------
+        shiftedValues: list of ndarrays
+            shift of every A-scan (equal for all A-scans of a B-scan)
+    """
+    shiftedValues = []
+    im_center_y = int(volume[0].shape[0]//2)
+    prev_y = 0
+    x_idx = np.arange(volume[0].shape[1]).astype(np.int32)
+
+    #max of each A-scan of the Gaussian blurred B-scans
+    y_max = np.array([np.argmax(cv2.GaussianBlur(_slice, (0,0), sigmaX = sigma[0], sigmaY=sigma[1]), axis = 0) for _slice in volume])
+    #outlier removal and fitting of all B-scans at once
+    _, y_fit, valid = fitPolynomials(x_idx, y_max, flattening_polynomial)
+    y_fit = y_fit.astype(np.int32)
+    
+    for i in range(len(volume)):
+        if valid[i]:
+            y_idx = y_fit[i]
+        elif i > 0:
+            y_idx = prev_y
+        else:
+            y_idx = y_max[i]
+        #get center y
+        fit_center_y = y_idx[y_idx.size//2]
+        shiftedValues.append(np.zeros((y_idx.size)).astype('int32') + (im_center_y-fit_center_y))
+        prev_y = y_idx
+        
+    return shiftedValues
+
 def ransac_fit(x, y, degree_in):
     """
-        Ransac fitting helper
+        Ransac fitting helper (compare PolynomialRansac.fitPolynomials)
         
         Parameters
         ----------
@@ -91,19 +115,11 @@ def ransac_fit(x, y, degree_in):
         y_i: ndarray
             data points y_i
     """
-    x_ = x.reshape((-1, 1))
-    y_ = y.reshape((-1, 1))
-
-    xi = np.linspace(min(x), max(x), len(x)).reshape((-1, 1))    
-
-    m = linear_model.RANSACRegressor(linear_model.LinearRegression(), min_samples = 200, max_trials=100, random_state = 42)
-    poly_2 = PolynomialFeatures(degree= degree_in,)
-    x_2 = poly_2.fit_transform(x_)
-    xi_2 = poly_2.fit_transform(xi)
-    m.fit(x_2, y_)
-    yi = m.predict(xi_2)
+    xi, yi, valid = fitPolynomials(x, y, degree_in)
+    if not valid[0]:
+        raise ValueError('RANSAC could not find a valid consensus set')
     
-    return xi.astype(np.int32),yi.astype(np.int32)
+    return xi.astype(np.int32),yi[0].astype(np.int32)
 
 def fillMissingColumns(volume):
     """
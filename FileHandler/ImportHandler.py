@@ -20,8 +20,9 @@ from Visualization.Heatmap import calculateHeatmap
 from Algorithms.SlowScanRegistration import RPEBasedRegistration
 import scipy.io
 from FileHandler import ImportMatFilesHelper
+from Algorithms.Flattening.ShiftField import applyShifts
 
-def loadVolume(directory, path=None, OCTA = False, merged = True, flattening_polynomial = 4):
+def loadVolume(directory, path=None, OCTA = False, merged = True, flattening_polynomial = 4, disk_cache = False):
     """ 
         Load volume from '.tif' stack
         
@@ -37,6 +38,8 @@ def loadVolume(directory, path=None, OCTA = False, merged = True, flattening_pol
             volume merged
         flattening_polynomial: scalar
             degree for flattening
+        disk_cache: bool, optional
+            True to store the slow scan shifts next to the volume
             
         Returns
         ----------
@@ -69,13 +72,13 @@ def loadVolume(directory, path=None, OCTA = False, merged = True, flattening_pol
 
     try:
         if merged == False:
-            vol, shifts = RPEBasedRegistration.runSlowScanRegistration(vol, 2)
+            vol, shifts = RPEBasedRegistration.runSlowScanRegistration(vol, 2, initialdir if disk_cache else None)
     except Exception as e:
         print("Slow scan registration did not work")
     volume_original = vol.copy()
     
     vol = np.swapaxes(np.asarray(vol), axis1 = 0, axis2 = 1)
-    vol_rgb = np.zeros((vol.shape[0],vol.shape[1],vol.shape[2],3)).astype('uint8')
+    vol_rgb = np.zeros((vol.shape[0],vol.shape[1],vol.shape[2],3), dtype = 'uint8')
     vol_b = (255*vol/65535.0).astype('uint8')
     vol_rgb[:,:,:,0] = vol_b[:,:,:]
     vol_rgb[:,:,:,1] = vol_b[:,:,:]
@@ -104,9 +107,7 @@ def loadGroundtruthVolume(directory, shiftedValues):
     filename =  filedialog.askopenfilename(initialdir = directory,title = "Select file",filetypes = (("tif files","*.tif"),("all files","*.*")))
     
     vol = io.imread(filename).astype('int32')
-    for z in range(vol.shape[0]):
-        for x in range (vol.shape[2]):
-            vol[z,:,x] = np.roll(vol[z,:,x], shiftedValues[z][x], axis= 0)
+    applyShifts(vol, shiftedValues, inplace = True)
     
     return vol
 
@@ -125,7 +126,7 @@ def getOriginalRGBVolume(volume):
 
     """ 
     vol_b = np.swapaxes(np.asarray(volume), axis1 = 0, axis2 = 1)
-    vol_rgb = np.zeros((vol_b.shape[0],vol_b.shape[1],vol_b.shape[2],3)).astype('uint8')
+    vol_rgb = np.zeros((vol_b.shape[0],vol_b.shape[1],vol_b.shape[2],3), dtype = 'uint8')
     vol_b = (255*vol_b/65535.0).astype('uint8')
     
     vol_rgb[:,:,:,0] = vol_b[:,:,:]
@@ -167,9 +168,7 @@ def loadCompleteSegmentation(directory, shifts, path=None):
     
     try:
         shifts = shifts.astype('int32')
-        for z in range(segmentation.shape[0]):
-            for x in range (segmentation.shape[2]):
-                segmentation[z,:,x] = np.roll(segmentation[z,:,x],shifts[z][x], axis= 0)
+        applyShifts(segmentation, shifts, inplace = True)
     except Exception as e:
         print('No volume loaded',e)
 
@@ -203,9 +202,7 @@ def loadCompleteSegmentationFromMat(isMatFile, shifts, path=None, layer_values=N
 
     try:
         shifts = shifts.astype('int32')
-        for z in range(segmentation.shape[0]):
-            for x in range (segmentation.shape[2]):
-                segmentation[z,:,x] = np.roll(segmentation[z,:,x],shifts[z][x], axis= 0)
+        applyShifts(segmentation, shifts, inplace = True)
     except Exception as e:
         print('No volume loaded',e)
 
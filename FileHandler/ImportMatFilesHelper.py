@@ -19,7 +19,7 @@ def loadmatfiles_segmentation(filename,layer_values):
     vol_layers = dict['layerMaps']
     
     try: 
-        seg_vol = np.zeros((vol.shape[2],vol.shape[0],vol.shape[1])).astype('float32')
+        seg_vol = np.zeros((vol.shape[2],vol.shape[0],vol.shape[1]), dtype = 'float32')
     except Exception as e:
         print(e)
     
@@ -38,6 +38,8 @@ def readGlobalParameters(self):
     ilm_found = False
     bm_found = False
     self.SMALLWINDOW=False
+    self.FLATTEN_TWO_PASS=False
+    self.FLATTEN_CACHE_DISK=False
     with open(os.path.dirname(os.path.abspath(sys.argv[0]))+"\\parameters.txt") as f:
         for line in f:
             if '#' in line:
@@ -54,6 +56,10 @@ def readGlobalParameters(self):
             elif 'SMALLWINDOW' in line: 
                 if 'True' in line or 'true' in line or 'TRUE' in line:
                     self.SMALLWINDOW=True
+            elif 'FLATTEN_TWO_PASS' in line: 
+                self.FLATTEN_TWO_PASS='true' in line.split('=')[1].lower()
+            elif 'FLATTEN_CACHE_DISK' in line: 
+                self.FLATTEN_CACHE_DISK='true' in line.split('=')[1].lower()
     if not bm_found:
         print('No BM Value found! Assuming 255!')
         self.BM_VALUE=255
@@ -100,6 +106,34 @@ def readThreeLayerDict():
                 dictParameters['AUTO_RPE_BF_ENFACE']=np.array(line.split('=')[1].split(',')).flatten().astype('int32')
             elif 'AUTO_RPE_BF_BSCAN' in line:
                 dictParameters['AUTO_RPE_BF_BSCAN']=np.array(line.split('=')[1].split(',')).flatten().astype('int32')
+            elif 'GRAPHCUT_SOLVER' in line:
+                dictParameters['GRAPHCUT_SOLVER']=line.split('=')[1].strip()
+            elif 'WEIGHT_BITS' in line:
+                dictParameters['WEIGHT_BITS']=int(line.split('=')[1])
+            elif 'AUTO_PYRAMID' in line:
+                dictParameters['AUTO_PYRAMID']=int(line.split('=')[1])
+            elif 'AUTO_ENGINE' in line:
+                dictParameters['AUTO_ENGINE']=line.split('=')[1].strip()
+            elif 'AUTO_EXECUTOR' in line:
+                dictParameters['AUTO_EXECUTOR']=line.split('=')[1].strip()
+            elif 'AUTO_SEEDS' in line:
+                dictParameters['AUTO_SEEDS']=int(line.split('=')[1])
+            elif 'AUTO_CONCURRENT' in line:
+                dictParameters['AUTO_CONCURRENT']='true' in line.split('=')[1].lower()
+            elif 'AUTO_STREAMING' in line:
+                dictParameters['AUTO_STREAMING']='true' in line.split('=')[1].lower()
+            elif 'CACHE_MB' in line:
+                dictParameters['CACHE_MB']=int(line.split('=')[1])
+            elif 'FILTER_WORKERS' in line:
+                dictParameters['FILTER_WORKERS']=int(line.split('=')[1])
+            elif 'MEMORY_BUDGET' in line:
+                dictParameters['MEMORY_BUDGET']='true' in line.split('=')[1].lower()
+            elif 'MEMORY_TRACE' in line:
+                dictParameters['MEMORY_TRACE']='true' in line.split('=')[1].lower()
+            elif 'AUTO_FILTER' in line:
+                dictParameters['AUTO_FILTER']=line.split('=')[1].strip()
+            elif 'FLATTEN_TWO_PASS' in line:
+                dictParameters['FLATTEN_TWO_PASS']='true' in line.split('=')[1].lower()
     if not bm_found:
         print('No BM Value found! Assuming 255!')
         dictParameters['BM_VALUE'] = 255
@@ -109,6 +143,34 @@ def readThreeLayerDict():
     if not rpe_found:
         print('No RPE Value found!Assuming 64!')
         dictParameters['RPE_VALUE'] = 64
+    if 'GRAPHCUT_SOLVER' not in dictParameters:
+        dictParameters['GRAPHCUT_SOLVER'] = 'igraph'
+    if 'WEIGHT_BITS' not in dictParameters:
+        dictParameters['WEIGHT_BITS'] = 0
+    if 'AUTO_PYRAMID' not in dictParameters:
+        dictParameters['AUTO_PYRAMID'] = 1
+    if 'AUTO_ENGINE' not in dictParameters:
+        dictParameters['AUTO_ENGINE'] = 'propagation'
+    if 'AUTO_EXECUTOR' not in dictParameters:
+        dictParameters['AUTO_EXECUTOR'] = 'thread'
+    if 'AUTO_SEEDS' not in dictParameters:
+        dictParameters['AUTO_SEEDS'] = 1
+    if 'AUTO_CONCURRENT' not in dictParameters:
+        dictParameters['AUTO_CONCURRENT'] = False
+    if 'AUTO_STREAMING' not in dictParameters:
+        dictParameters['AUTO_STREAMING'] = False
+    if 'CACHE_MB' not in dictParameters:
+        dictParameters['CACHE_MB'] = 1024
+    if 'FILTER_WORKERS' not in dictParameters:
+        dictParameters['FILTER_WORKERS'] = 0
+    if 'MEMORY_BUDGET' not in dictParameters:
+        dictParameters['MEMORY_BUDGET'] = False
+    if 'MEMORY_TRACE' not in dictParameters:
+        dictParameters['MEMORY_TRACE'] = False
+    if 'AUTO_FILTER' not in dictParameters:
+        dictParameters['AUTO_FILTER'] = 'bilateral'
+    if 'FLATTEN_TWO_PASS' not in dictParameters:
+        dictParameters['FLATTEN_TWO_PASS'] = False
     return dictParameters
  
 def readRPERefinementDict():
@@ -143,6 +205,18 @@ def readRPERefinementDict():
                 dictParameters['REF_RPE_BF_ENFACE']=np.array(line.split('=')[1].split(',')).flatten().astype('int32')
             elif 'REF_RPE_BF_BSCAN' in line:
                 dictParameters['REF_RPE_BF_BSCAN']=np.array(line.split('=')[1].split(',')).flatten().astype('int32')
+            elif 'GRAPHCUT_SOLVER' in line:
+                dictParameters['GRAPHCUT_SOLVER']=line.split('=')[1].strip()
+            elif 'WEIGHT_BITS' in line:
+                dictParameters['WEIGHT_BITS']=int(line.split('=')[1])
+            elif 'CACHE_MB' in line:
+                dictParameters['CACHE_MB']=int(line.split('=')[1])
+            elif 'FILTER_WORKERS' in line:
+                dictParameters['FILTER_WORKERS']=int(line.split('=')[1])
+            elif 'MEMORY_BUDGET' in line:
+                dictParameters['MEMORY_BUDGET']='true' in line.split('=')[1].lower()
+            elif 'MEMORY_TRACE' in line:
+                dictParameters['MEMORY_TRACE']='true' in line.split('=')[1].lower()
     if not bm_found:
         print('No BM Value found! Assuming 255!')
         dictParameters['BM_VALUE'] = 255
@@ -152,6 +226,18 @@ def readRPERefinementDict():
     if not rpe_found:
         print('No RPE Value found!Assuming 64!')
         dictParameters['RPE_VALUE'] = 64
+    if 'GRAPHCUT_SOLVER' not in dictParameters:
+        dictParameters['GRAPHCUT_SOLVER'] = 'igraph'
+    if 'WEIGHT_BITS' not in dictParameters:
+        dictParameters['WEIGHT_BITS'] = 0
+    if 'CACHE_MB' not in dictParameters:
+        dictParameters['CACHE_MB'] = 1024
+    if 'FILTER_WORKERS' not in dictParameters:
+        dictParameters['FILTER_WORKERS'] = 0
+    if 'MEMORY_BUDGET' not in dictParameters:
+        dictParameters['MEMORY_BUDGET'] = False
+    if 'MEMORY_TRACE' not in dictParameters:
+        dictParameters['MEMORY_TRACE'] = False
     return dictParameters
  
 def readManRefParameters():
@@ -199,6 +285,10 @@ def readManRefParameters():
                 dictParameters['MAN_RPE_THICKNESS']=int(line.split('=')[1])
             elif 'MAN_BM_THICKNESS' in line: 
                 dictParameters['MAN_BM_THICKNESS']=int(line.split('=')[1])
+            elif 'GRAPHCUT_SOLVER' in line:
+                dictParameters['GRAPHCUT_SOLVER']=line.split('=')[1].strip()
+            elif 'WEIGHT_BITS' in line:
+                dictParameters['WEIGHT_BITS']=int(line.split('=')[1])
     if not bm_found:
         print('No BM Value found! Assuming 255!')
         dictParameters['BM_VALUE']  = 255
@@ -208,5 +298,9 @@ def readManRefParameters():
     if not rpe_found:
         print('No RPE Value found!Assuming 64!')
         dictParameters['RPE_VALUE'] = 64
+    if 'GRAPHCUT_SOLVER' not in dictParameters:
+        dictParameters['GRAPHCUT_SOLVER'] = 'igraph'
+    if 'WEIGHT_BITS' not in dictParameters:
+        dictParameters['WEIGHT_BITS'] = 0
         
     return dictParameters
\ No newline at end of file
@@ -23,6 +23,7 @@ from FileHandler import ExportHandler, ImportHandler
 from Algorithms.AutomaticSegmentation import ThreeLayerSegmentation
 from Algorithms.RefinementRPE import RPERefinementAlgorithm
 from Algorithms.Flattening.VolumeFlattening import unFlatten
+from Algorithms.Flattening.FlattenedVolume import FlattenedVolume
 from GUI_Classes.OptionsPane import createOptionMenu
 from GUI_Classes.CanvasXZ import createCanvasXZ
 from GUI_Classes.CanvasXY import createCanvasXY
@@ -50,9 +51,9 @@ class GUI:
             Initializing the GUI 
         """    
         #empty basic volumes for initial loader
-        self.volume          = np.zeros((500,500,500)).astype('uint8') 
-        self.volume_original = np.zeros((500,500,500)).astype('uint8')
-        self.segmentation    = np.zeros((500,500,500)).astype('uint8')
+        self.volume          = np.zeros((500,500,500), dtype = 'uint8') 
+        self.volume_original = np.zeros((500,500,500), dtype = 'uint8')
+        self.segmentation    = np.zeros((500,500,500), dtype = 'uint8')
         self.heatmap_rpe_bruchs  = np.zeros((500,500)).astype('uint8')
         self.heatmap_original    = np.zeros((500,500,3)).astype('uint8')
         self.metric_map          = np.zeros((500,500)).astype('uint8')
@@ -190,15 +191,11 @@ class GUI:
             if(np.count_nonzero(self.segmentation) != 0):
                 im_center_y = int(self.segmentation.shape[1]//2)  
                 self.shiftedValues = self.shiftedValues.astype('int32')
-                vol = self.volume_original.copy()
-                
-                for z in range(vol.shape[0]):
+                for z in range(self.segmentation.shape[0]):
                     coordinates_bruchs = np.where(self.segmentation[z].transpose() == self.BM_VALUE)[1]
                     self.shiftedValues[z,:]= -coordinates_bruchs[:] + im_center_y
-                    for x in range (vol.shape[2]):
-                        vol[z,:,x] = np.roll(vol[z,:,x],self.shiftedValues[z][x], axis= 0)  
                         
-                self.volume = ImportHandler.getOriginalRGBVolume(np.asarray(vol))   
+                self.volume = FlattenedVolume(self.volume_original, self.shiftedValues)
                 #note the minus: -shiftedvalues flattens the image
                 self.segmentation = unFlatten(self.segmentation,-self.shiftedValues)
                 #update volumes
@@ -213,21 +210,18 @@ class GUI:
                 self.corr_active= True
             #Volume not flattened and no base-segmentation exists
             else:
-                self.segmentation = np.zeros((self.volume.shape[1],self.volume.shape[0],self.volume.shape[2])).astype('uint8')
+                self.segmentation = np.zeros((self.volume.shape[1],self.volume.shape[0],self.volume.shape[2]), dtype = 'uint8')
                 im_center_y = int(self.segmentation.shape[1]//2)  
                 
                 for z in range(self.segmentation.shape[0]):
                     self.segmentation[z,im_center_y,:] = self.BM_VALUE
                     
                 self.shiftedValues = self.shiftedValues.astype('int32')
-                vol = self.volume_original.copy()
-                for z in range(vol.shape[0]):
+                for z in range(self.segmentation.shape[0]):
                     coordinates_bruchs = np.where(self.segmentation[z].transpose() == self.BM_VALUE)[1]
                     self.shiftedValues[z,:]= -coordinates_bruchs[:] + im_center_y
-                    for x in range (vol.shape[2]):
-                        vol[z,:,x] = np.roll(vol[z,:,x],self.shiftedValues[z][x], axis= 0)  
                         
-                self.volume = ImportHandler.getOriginalRGBVolume(np.asarray(vol))
+                self.volume = FlattenedVolume(self.volume_original, self.shiftedValues)
                 #note the minus: -shiftedvalues flattens the image
                 self.segmentation = unFlatten(self.segmentation,-self.shiftedValues)
                 #update volumes
@@ -374,10 +368,10 @@ class GUI:
         try:   
 
             if merged is False:
-                self.initialdir,self.shiftedValuesSlowScan,self.volume_original,self.volume = ImportHandler.loadVolume(self.initialdir, path, OCTA, merged, self.flattening_polynomial)
+                self.initialdir,self.shiftedValuesSlowScan,self.volume_original,self.volume = ImportHandler.loadVolume(self.initialdir, path, OCTA, merged, self.flattening_polynomial, self.FLATTEN_CACHE_DISK)
                 self.shiftedValues = np.zeros((self.shiftedValuesSlowScan.shape[0],self.shiftedValuesSlowScan.shape[1]))
             else:
-                self.initialdir,self.shiftedValues,self.volume_original,self.volume = ImportHandler.loadVolume(self.initialdir, path, OCTA, merged, self.flattening_polynomial)
+                self.initialdir,self.shiftedValues,self.volume_original,self.volume = ImportHandler.loadVolume(self.initialdir, path, OCTA, merged, self.flattening_polynomial, self.FLATTEN_CACHE_DISK)
                 self.shiftedValuesSlowScan = None
             
             self.resetSegmentation()
@@ -435,7 +429,7 @@ class GUI:
         
         self.disableDataButtons()
         
-        self.segmentation = np.zeros((self.volume.shape[1],self.volume.shape[0],self.volume.shape[2])).astype('uint8')
+        self.segmentation = np.zeros((self.volume.shape[1],self.volume.shape[0],self.volume.shape[2]), dtype = 'uint8')
         self.heatmapType = 'Drusen'
         self.heatmap_rpe_bruchs = np.zeros((self.volume.shape[1],self.volume.shape[2])).astype('int32')
         self.updateSegmentation()
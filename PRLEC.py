@@ -12,6 +12,7 @@ PRLEC Framework for OCT Processing and Visualization
 # @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
 # Copyright (C) 2018-2019 - Daniel Stromer
 # PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import multiprocessing
 from GUI_Classes import Framework
 from tkinter import *
 
@@ -19,6 +20,8 @@ if __name__ == '__main__':
     """ 
         Start GUI
     """
+    #worker processes of the Graph-Cut chains re-enter here in the frozen executable
+    multiprocessing.freeze_support()
     root = Tk()
     rle_gui = Framework.GUI()
     rle_gui.start_explore_mode(root)
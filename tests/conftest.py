@@ -0,0 +1,77 @@
+"""
+conftest: Shared synthetic data of the Graph-Cut tests
+--------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from igraph import Graph
+from Algorithms.AutomaticSegmentation import BuildRPEGraph, BuildILMGraph
+from Algorithms.GraphCut.EdgeStencil import getEdgesReference, NEIGHBORHOOD_3
+
+def makeWeightSlice(rows = 400, cols = 60, seed = 0):
+    """
+        Synthetic weight slice: noise with a bright layer beneath and above the center.
+    """
+    rng = np.random.RandomState(seed)
+    _slice = rng.uniform(0.0, 0.6, (rows, cols)).astype(np.float32)
+    x = np.arange(cols)
+    rpe = (rows//2 + 4*np.sin(x/9.0)).astype(int)
+    ilm = (rows//2 - rows*9//40 + 6*np.cos(x/12.0)).astype(int)
+    _slice[rpe, x] = 0.95
+    _slice[ilm, x] = 0.9
+    _slice[rng.rand(rows, cols) < 0.01] = 0
+    return _slice
+
+def getReferencePath(band, weight_function):
+    """
+        Shortest path of a band on the graph of the per-pixel builder.
+    """
+    slice_1D = band.flatten()
+    edges, weights = getEdgesReference(slice_1D, band.shape[1], NEIGHBORHOOD_3, weight_function)
+    g = Graph(n = slice_1D.size, edges = edges, directed = True)
+    g.es['weight'] = weights
+    return np.asarray(g.get_shortest_paths(v = 0, to = slice_1D.size - 1, weights = 'weight')[0], dtype = np.int64)
+
+def getSyntheticBands(seed = 0):
+    """
+        RPE and ILM weight bands of an initial slice and of a slice with predecessor.
+
+        Returns
+        ---------
+        bands: list of tuples
+            (name, band, scalar weight function, vectorized weight function)
+    """
+    _slice = makeWeightSlice(seed = seed)
+    bands = []
+
+    band, y_offset = BuildRPEGraph.getRPEBand(_slice, 1, None, 0, False)
+    bands.append(('rpe_initial', band, lambda v_i, v_j: BuildRPEGraph.calculateExpWeight(v_i, v_j, None), lambda v_i, v_j: BuildRPEGraph.calculateExpWeights(v_i, v_j, None)))
+    path = getReferencePath(band, bands[-1][2])
+    band, _ = BuildRPEGraph.getRPEBand(makeWeightSlice(seed = seed + 1), 1, path, y_offset, False)
+    bands.append(('rpe_corridor', band, lambda v_i, v_j: BuildRPEGraph.calculateExpWeight(v_i, v_j, path), lambda v_i, v_j: BuildRPEGraph.calculateExpWeights(v_i, v_j, path)))
+
+    band, y_offset = BuildILMGraph.getILMBand(_slice, 0.5, None, 0, False)
+    bands.append(('ilm_initial', band, BuildILMGraph.calculateWeight, BuildILMGraph.calculateWeights))
+    path = getReferencePath(band, BuildILMGraph.calculateWeight)
+    band, _ = BuildILMGraph.getILMBand(makeWeightSlice(seed = seed + 1), 0.5, path, y_offset, False)
+    bands.append(('ilm_corridor', band, BuildILMGraph.calculateWeight, BuildILMGraph.calculateWeights))
+    return bands
+
+@pytest.fixture(scope = 'module')
+def synthetic_bands():
+    return getSyntheticBands()
@@ -0,0 +1,64 @@
+"""
+test_column_sweep: Column-sweep shortest paths against the graph solvers
+--------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+from Algorithms.GraphCut import ColumnSweep, ShortestPath
+from Algorithms.GraphCut.EdgeStencil import getStencilWeights, getOffsets, NEIGHBORHOOD_3
+from Algorithms.AutomaticSegmentation import BuildILMGraph
+
+def getPathCost(weights, path, neighborhood = NEIGHBORHOOD_3):
+    """
+        Sum of the stencil weights along a path (fails on missing edges).
+    """
+    offsets = list(getOffsets(weights.shape[2], neighborhood))
+    flat = weights.reshape((weights.shape[0], -1))
+    cost = 0.0
+    for v_i, v_j in zip(path[:-1], path[1:]):
+        weight = flat[offsets.index(v_j - v_i), v_i]
+        assert np.isfinite(weight)
+        cost += weight
+    return cost
+
+def getBandWeights(synthetic_bands):
+    return [(name, getStencilWeights(band, NEIGHBORHOOD_3, vector_function)) for name, band, _, vector_function in synthetic_bands]
+
+def test_sweep_equals_igraph(synthetic_bands):
+    for name, weights in getBandWeights(synthetic_bands):
+        path = ColumnSweep.getShortestPath(weights, NEIGHBORHOOD_3)
+        path_igraph = ShortestPath.getShortestPath(weights, NEIGHBORHOOD_3, 'igraph')
+        assert path[0] == 0 and path[-1] == weights[0].size - 1, name
+        assert np.isclose(getPathCost(weights, path), getPathCost(weights, path_igraph), rtol = 1e-12, atol = 0), name
+        #ties are unlikely in random weights: same vertex sequence
+        assert np.array_equal(path, path_igraph), name
+
+def test_sweep_ties_equal_cost():
+    #constant weights: many paths of the same length
+    band = np.full((30, 40), 0.5, dtype = np.float32)
+    band[:,0] = -2
+    band[:,-1] = 2
+    weights = getStencilWeights(band, NEIGHBORHOOD_3, BuildILMGraph.calculateWeights)
+    path = ColumnSweep.getShortestPath(weights, NEIGHBORHOOD_3)
+    for solver in ('igraph', 'scipy'):
+        path_solver = ShortestPath.getShortestPath(weights, NEIGHBORHOOD_3, solver)
+        assert path[0] == path_solver[0] and path[-1] == path_solver[-1]
+        assert np.isclose(getPathCost(weights, path), getPathCost(weights, path_solver), rtol = 1e-12, atol = 0)
+
+def test_batched_sweep_equals_single(synthetic_bands):
+    name, band, _, vector_function = synthetic_bands[0]
+    stack = np.stack([getStencilWeights(np.where(np.isnan(band), band, np.clip(band + shift, -2, 2)), NEIGHBORHOOD_3, vector_function) for shift in (0.0, 0.01, -0.02)])
+    paths = ColumnSweep.getShortestPaths(stack, NEIGHBORHOOD_3)
+    paths_igraph = ShortestPath.getShortestPaths(stack, NEIGHBORHOOD_3, 'igraph')
+    for weights, path, path_igraph in zip(stack, paths, paths_igraph):
+        assert np.array_equal(path, ColumnSweep.getShortestPath(weights, NEIGHBORHOOD_3))
+        assert np.isclose(getPathCost(weights, path), getPathCost(weights, path_igraph), rtol = 1e-12, atol = 0)
@@ -0,0 +1,54 @@
+"""
+test_concurrent_propagation: Concurrent Graph-Cut runs against sequential runs
+--------------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from Algorithms.AutomaticSegmentation import GraphCutSegmentation
+from Algorithms.RefinementRPE import GraphCutSegmentation as RefinementGraphCut
+from conftest import makeWeightSlice
+
+#parameters of Parameters.txt used by execute_graphcut and inpaint
+PARAMETERS = {'RPE_VALUE': 64, 'ILM_VALUE': 127, 'BM_VALUE': 255, 'WEIGHT_BITS': 0, 'GRAPHCUT_SOLVER': 'igraph', 'AUTO_EXECUTOR': 'thread'}
+
+def makeGradientVolume(slices = 7, seed = 0):
+    """
+        Synthetic gradient volume: every slice holds the same layers with new noise.
+    """
+    return np.stack([makeWeightSlice(rows = 200, cols = 40, seed = seed*100 + i) for i in range(slices)])
+
+def getJobs():
+    """
+        Automatic (RPE, ILM) and refinement runs on different volumes and solvers.
+    """
+    jobs = []
+    for seed, (mode, scaling, solver) in enumerate([('RPE', 1, 'igraph'), ('ILM', 0.5, 'igraph'), ('RPE', 1, 'sweep'), ('ILM', 0.5, 'scipy')]):
+        volume = makeGradientVolume(seed = seed)
+        jobs.append((GraphCutSegmentation.execute_graphcut, (volume, volume, scaling, mode, PARAMETERS, False, solver, 'thread')))
+    for seed in (4, 5):
+        volume = makeGradientVolume(seed = seed)
+        jobs.append((RefinementGraphCut.execute_graphcut, (volume, volume, 1, 'RPE', PARAMETERS, 'igraph')))
+    return jobs
+
+def test_concurrent_equals_sequential():
+    jobs = getJobs()
+    sequential = [function(*arguments) for function, arguments in jobs]
+    for result in sequential:
+        #one path pixel per column in every slice
+        assert np.all(np.count_nonzero(result, axis = 1) >= 1)
+    #every job twice, all at the same time
+    with ThreadPoolExecutor(max_workers = 2*len(jobs)) as pool:
+        futures = [pool.submit(function, *arguments) for function, arguments in jobs + jobs]
+        concurrent = [future.result() for future in futures]
+    for i, result in enumerate(concurrent):
+        assert np.array_equal(result, sequential[i % len(jobs)]), i
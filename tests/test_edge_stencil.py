@@ -0,0 +1,61 @@
+"""
+test_edge_stencil: Vectorized edge lists against the per-pixel reference builder
+----------------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+import pytest
+from igraph import Graph
+from Algorithms.GraphCut.EdgeStencil import getEdges, getEdgesReference, NEIGHBORHOOD_3, NEIGHBORHOOD_7, NEIGHBORHOOD_9
+from Algorithms.AutomaticSegmentation import BuildRPEGraph, BuildILMGraph
+from conftest import makeWeightSlice
+
+def getPath(edges, weights, n_vertices):
+    g = Graph(n = n_vertices, edges = [tuple(edge) for edge in edges], directed = True)
+    g.es['weight'] = list(weights)
+    return g.get_shortest_paths(v = 0, to = n_vertices - 1, weights = 'weight')[0]
+
+def test_edges_equal_reference(synthetic_bands):
+    for name, band, scalar_function, vector_function in synthetic_bands:
+        edges, weights = getEdges(band.flatten(), band.shape[1], NEIGHBORHOOD_3, vector_function)
+        edges_ref, weights_ref = getEdgesReference(band.flatten(), band.shape[1], NEIGHBORHOOD_3, scalar_function)
+        assert np.array_equal(edges, np.asarray(edges_ref).reshape((-1, 2))), name
+        assert np.array_equal(weights, np.asarray(weights_ref)), name
+
+def test_paths_equal_reference(synthetic_bands):
+    for name, band, scalar_function, vector_function in synthetic_bands:
+        edges, weights = getEdges(band.flatten(), band.shape[1], NEIGHBORHOOD_3, vector_function)
+        edges_ref, weights_ref = getEdgesReference(band.flatten(), band.shape[1], NEIGHBORHOOD_3, scalar_function)
+        path = getPath(edges, weights, band.size)
+        assert len(path) > 0, name
+        assert path == getPath(edges_ref, weights_ref, band.size), name
+
+@pytest.mark.parametrize('neighborhood', [NEIGHBORHOOD_3, NEIGHBORHOOD_7, NEIGHBORHOOD_9])
+def test_neighborhoods_equal_reference(neighborhood):
+    band = makeWeightSlice(rows = 40, cols = 30, seed = 3)
+    band[np.random.RandomState(4).rand(*band.shape) < 0.2] = np.nan
+    band[:,0] = -2
+    band[:,-1] = 2
+    edges, weights = getEdges(band.flatten(), band.shape[1], neighborhood, BuildILMGraph.calculateWeights)
+    edges_ref, weights_ref = getEdgesReference(band.flatten(), band.shape[1], neighborhood, BuildILMGraph.calculateWeight)
+    assert np.array_equal(edges, np.asarray(edges_ref).reshape((-1, 2)))
+    assert np.array_equal(weights, np.asarray(weights_ref))
+
+def test_graph_builders_equal_reference():
+    _slice = makeWeightSlice(seed = 5)
+    for build in (BuildRPEGraph.getRPEGraph, BuildILMGraph.getILMGraph):
+        scaling = 1 if build is BuildRPEGraph.getRPEGraph else 0.5
+        g, end, _ = build(_slice, scaling, None, 0, False)
+        g_ref, end_ref, _ = build(_slice, scaling, None, 0, False, reference = True)
+        assert end == end_ref
+        path = g.get_shortest_paths(v = 0, to = end, weights = 'weight')[0]
+        assert path == g_ref.get_shortest_paths(v = 0, to = end_ref, weights = 'weight')[0]
@@ -0,0 +1,52 @@
+"""
+test_manual_correction: End-to-end propagation of manual ILM corrections
+--------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+import pytest
+from Algorithms.ManualCorrection import GraphCutILM
+
+#parameters of Parameters.txt (the reader expects the file next to the executable)
+MAN_PARAMETERS = {'RPE_VALUE': 64, 'ILM_VALUE': 127, 'BM_VALUE': 255, 'MAN_ILM_BF_BSCAN': np.array([5,3,3]), 'MAN_RPE_BF_BSCAN': np.array([7,5,5]),
+                  'MAN_ILM_MEDIAN': 11, 'MAN_RPE_MEDIAN': 9, 'MAN_BM_MEDIAN': 31, 'MAN_ILM_THICKNESS': 3, 'MAN_RPE_THICKNESS': 5, 'MAN_BM_THICKNESS': 2,
+                  'GRAPHCUT_SOLVER': 'igraph', 'WEIGHT_BITS': 0}
+
+def makeCorrectionCase(slices = 24, rows = 120, cols = 80, seed = 0):
+    """
+        Synthetic volume with a bright retina below the ILM and its segmentation.
+    """
+    rng = np.random.RandomState(seed)
+    z, x = np.meshgrid(np.arange(slices), np.arange(cols), indexing = 'ij')
+    ilm = (50 + 4*np.sin(x/15.0 + z/6.0)).astype(int)
+    rows_idx = np.arange(rows)[None,:,None]
+    #float32 like ImportHandler.loadVolume
+    volume = (np.where(rows_idx >= ilm[:,None,:], 30000.0, 5000.0) + rng.normal(0, 500, (slices, rows, cols))).astype('float32')
+    segmentation = np.zeros((slices, rows, cols), dtype = 'uint8')
+    segmentation[z, ilm, x] = MAN_PARAMETERS['ILM_VALUE']
+    return volume, segmentation, ilm
+
+@pytest.mark.parametrize('mode, spacing', [('high', 8), ('low', 2)])
+def test_propagate_ilm(monkeypatch, mode, spacing):
+    monkeypatch.setattr(GraphCutILM, 'readManRefParameters', lambda: dict(MAN_PARAMETERS))
+    volume, segmentation, ilm = makeCorrectionCase()
+    rect_correction = (10, 69, 4, 20)
+    saved_slices = {key: segmentation[key] for key in range(rect_correction[2], rect_correction[3] + 1, spacing)}
+    result = GraphCutILM.propagateILM(volume, segmentation, segmentation.copy(), saved_slices, rect_correction, mode)
+
+    assert result.shape == (rect_correction[3] - rect_correction[2] + 2, volume.shape[1], rect_correction[1] - rect_correction[0] + 3)
+    #every column of the propagated slices holds one ILM pixel close to the truth
+    for i in range(1, result.shape[0] - 1):
+        for x in range(1, result.shape[2] - 1):
+            rows = np.where(result[i,:,x] == MAN_PARAMETERS['ILM_VALUE'])[0]
+            assert rows.size >= 1
+            assert np.abs(rows - ilm[rect_correction[2] - 1 + i, rect_correction[0] - 1 + x]).min() <= 3
@@ -0,0 +1,54 @@
+"""
+test_memory_budget: Peak memory report of the pipeline stages
+---------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import threading
+import tracemalloc
+import numpy as np
+import pytest
+from Algorithms.GraphCut.MemoryBudget import StageMemory, getRSS
+
+def allocate(megabytes):
+    array = np.ones(megabytes*2**20, dtype = np.uint8)
+    return int(array.sum())
+
+@pytest.mark.skipif(getRSS() is None, reason = 'resident memory not available')
+def test_sampled_peak():
+    memory = StageMemory()
+    with memory.stage('allocation'):
+        allocate(64)
+    assert memory.stages['allocation'] >= 64*2**20
+    assert 'allocation' in memory.report()
+    #the sampler is stopped with the stage
+    assert not any(thread.name.startswith('StageMemory') for thread in threading.enumerate())
+
+def test_traced_peak():
+    memory = StageMemory(trace = True)
+    with memory.stage('allocation'):
+        allocate(16)
+    assert 16*2**20 <= memory.stages['allocation'] < 32*2**20
+    assert not tracemalloc.is_tracing()
+
+def test_trace_stops_on_error():
+    memory = StageMemory(trace = True)
+    with pytest.raises(ValueError):
+        with memory.stage('failing'):
+            raise ValueError()
+    assert not tracemalloc.is_tracing()
+    assert 'failing' in memory.stages
+
+def test_disabled():
+    memory = StageMemory(False)
+    with memory.stage('allocation'):
+        allocate(1)
+    assert memory.stages == {} and memory.report() == ''
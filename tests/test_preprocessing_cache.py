@@ -0,0 +1,48 @@
+"""
+test_preprocessing_cache: Fingerprints of the cached weight calculation
+-------------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+import pytest
+from Algorithms.AutomaticSegmentation import GraphWeights
+from Algorithms.RefinementRPE import GraphWeightsRefine
+from Algorithms.GraphCut.PreprocessingCache import getFingerprint
+
+#parameters of Parameters.txt used by both weight calculations
+PARAMETERS = {'AUTO_ILM_BF_ENFACE': np.array([9,5,5]), 'AUTO_ILM_BF_BSCAN': np.array([7,5,5]), 'AUTO_RPE_BF_ENFACE': np.array([9,5,5]),
+              'AUTO_RPE_BF_BSCAN': np.array([7,5,5]), 'REF_RPE_BF_ENFACE': np.array([9,5,5]), 'REF_RPE_BF_BSCAN': np.array([7,5,5]),
+              'RPE_VALUE': 64, 'ILM_VALUE': 127, 'BM_VALUE': 255, 'FILTER_WORKERS': 1, 'AUTO_FILTER': 'bilateral'}
+
+def makeCase(slices = 6, rows = 60, cols = 30, seed = 0):
+    volume = np.random.RandomState(seed).uniform(0, 1, (slices, rows, cols)).astype(np.float32)
+    segmentation = np.zeros((slices, rows, cols), dtype = np.uint8)
+    segmentation[:, 10] = PARAMETERS['ILM_VALUE']
+    segmentation[:, 40] = PARAMETERS['BM_VALUE']
+    return volume, segmentation
+
+def runBoth(cache_mb):
+    volume, segmentation = makeCase(seed = cache_mb)
+    parameters = dict(PARAMETERS, CACHE_MB = cache_mb)
+    GraphWeights.runWeightCalculation(volume, 'ILM', parameters, False)
+    GraphWeightsRefine.runWeightCalculation(volume, segmentation, parameters)
+
+@pytest.mark.parametrize('cache_mb, hashed', [(0, 0), (64, 2)])
+def test_fingerprint_only_with_cache(monkeypatch, cache_mb, hashed):
+    calls = []
+    def fingerprint(volume):
+        calls.append(1)
+        return getFingerprint(volume)
+    monkeypatch.setattr(GraphWeights, 'getFingerprint', fingerprint)
+    monkeypatch.setattr(GraphWeightsRefine, 'getFingerprint', fingerprint)
+    runBoth(cache_mb)
+    assert len(calls) == hashed
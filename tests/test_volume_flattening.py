@@ -0,0 +1,86 @@
+"""
+test_volume_flattening: RPE flattening shifts and search band
+---------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import tracemalloc
+import numpy as np
+from Algorithms.Flattening import VolumeFlattening
+from Algorithms.Flattening.FlatteningCache import clearCache
+
+def makeFlatteningVolume(slices = 8, rows = 120, cols = 100, seed = 0):
+    """
+        Synthetic uint8 volume with a bright curved RPE.
+    """
+    rng = np.random.RandomState(seed)
+    volume = rng.randint(0, 40, (slices, rows, cols)).astype(np.uint8)
+    x = np.arange(cols)
+    for z in range(slices):
+        rpe = (rows//2 + 10*np.sin(x/30.0 + z/10.0)).astype(int)
+        for offset in (-1, 0, 1):
+            volume[z, rpe + offset, x] = 220
+    return volume
+
+def test_shift_map_equals_run_flattening():
+    clearCache()
+    volume = makeFlatteningVolume()
+    _, shiftedValues = VolumeFlattening.runFlattening(volume.copy(), 4)
+    clearCache()
+    shiftMap = VolumeFlattening.getShiftMap(volume.copy(), 4)
+    assert shiftMap.dtype == np.int32
+    assert np.array_equal(shiftMap, np.asarray(shiftedValues))
+
+def test_cached_shift_map_does_not_shift_volume():
+    clearCache()
+    volume = makeFlatteningVolume(slices = 16, rows = 200, cols = 200)
+    shiftMap = VolumeFlattening.getShiftMap(volume, 4)
+    tracemalloc.start()
+    try:
+        assert np.array_equal(VolumeFlattening.getShiftMap(volume, 4), shiftMap)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    #no flattened copy of the volume (float32: 4x the uint8 volume)
+    assert peak < volume.nbytes
+
+def maskBandLoop(blurred, prev_y):
+    """
+        Search band of the per-column loop runFlattening used before maskBand.
+    """
+    for x in range (blurred.shape[1]):
+        blurred[0:int(prev_y[x])-3,x] = 0
+        blurred[int(prev_y[x])+3:blurred.shape[1],x] = 0
+    return blurred
+
+def test_mask_band_equals_loop():
+    rng = np.random.RandomState(1)
+    for rows, cols in ((60, 60), (80, 200)):
+        blurred = rng.uniform(0.1, 1, (rows, cols)).astype(np.float32)
+        prev_y = rng.randint(3, rows - 3, cols)
+        assert np.array_equal(VolumeFlattening.maskBand(blurred.copy(), prev_y), maskBandLoop(blurred.copy(), prev_y))
+
+def test_mask_band_more_rows_than_columns():
+    #the loop stopped masking at the row index of the column count
+    blurred = np.ones((64, 32), dtype = np.float32)
+    prev_y = np.full(32, 10)
+    masked = VolumeFlattening.maskBand(blurred.copy(), prev_y)
+    assert not masked[32:].any()
+    assert maskBandLoop(blurred.copy(), prev_y)[32:].all()
+    assert np.array_equal(np.nonzero(masked.any(axis = 1))[0], np.arange(7, 13))
+
+def test_mask_band_near_top():
+    #prev_y < 3: the loop's stop int(prev_y)-3 wrapped and zeroed most of the column
+    blurred = np.ones((40, 40), dtype = np.float32)
+    prev_y = np.full(40, 1)
+    masked = VolumeFlattening.maskBand(blurred.copy(), prev_y)
+    assert np.array_equal(np.nonzero(masked.any(axis = 1))[0], np.arange(0, 4))
+    assert not maskBandLoop(blurred.copy(), prev_y)[:4].all()
@@ -0,0 +1,54 @@
+"""
+test_weight_stream: Streamed graph weights against the weight list
+--------------------------------------------------------------------
+PRLEC Framework for OCT Processing and Visualization
+"""
+# This framework evolved from a collaboration of:
+# - Research Laboratory of Electronics, Massachusetts Institute of Technology, Cambdrige, MA, US
+# - Pattern Recognition Lab, Friedrich-Alexander-Universitaet Erlangen-Nuernberg, Germany
+# - Department of Biomedical Engineering, Peking University, Beijing, China
+# - New England Eye Center, Tufts Medical Center, Boston, MA, US
+# v1.0: Updated on Mar 20, 2019
+# @author: Daniel Stromer - EMAIL:daniel.stromer@fau.de
+# Copyright (C) 2018-2019 - Daniel Stromer
+# PRLE is developed as an Open Source project under the GNU General Public License (GPL) v3.0.
+import numpy as np
+import pytest
+from Algorithms.AutomaticSegmentation import GraphWeights
+
+#parameters of Parameters.txt used by the weight calculation
+PARAMETERS = {'AUTO_ILM_BF_ENFACE': np.array([9,5,5]), 'AUTO_ILM_BF_BSCAN': np.array([7,5,5]), 'AUTO_RPE_BF_ENFACE': np.array([9,5,5]),
+              'AUTO_RPE_BF_BSCAN': np.array([7,5,5]), 'FILTER_WORKERS': 1, 'AUTO_FILTER': 'bilateral', 'CACHE_MB': 0}
+
+def makeVolume(slices = 12, rows = 80, cols = 40, seed = 0):
+    return np.random.RandomState(seed).uniform(0, 1, (slices, rows, cols)).astype(np.float32)
+
+def getPropagationOrder(n_slices):
+    center = int(n_slices/2)
+    order = [center]
+    for index in range(1, n_slices):
+        order += [i for i in (center - index, center + index) if 0 <= i < n_slices]
+    return order
+
+def test_stream_equals_list():
+    volume = makeVolume()
+    stream = GraphWeights.WeightStream(volume, 'ILM', PARAMETERS, False, tile = 3)
+    expected = GraphWeights.runWeightCalculation(volume, 'ILM', PARAMETERS, False)
+    for index in getPropagationOrder(len(volume)):
+        #the en-face filter runs on tiles: equal up to float rounding
+        assert np.allclose(stream[index], expected[index], rtol = 0, atol = 1e-5), index
+    stream.close()
+    stream.producer.join(timeout = 10)
+    assert not stream.producer.is_alive()
+
+def test_close_stops_producer():
+    volume = makeVolume(slices = 30)
+    stream = GraphWeights.WeightStream(volume, 'RPE', PARAMETERS, False, tile = 2, window = 2)
+    #consumer stops after the central slice, the producer waits for a free slot
+    stream[int(len(volume)/2)]
+    stream.close()
+    stream.producer.join(timeout = 10)
+    assert not stream.producer.is_alive()
+    assert stream.ready == {}
+    with pytest.raises(ValueError):
+        stream[0]